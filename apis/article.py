@@ -1,3 +1,4 @@
+import asyncio
 import threading
 import time
 from uuid import uuid4
@@ -10,9 +11,10 @@ from core.models.article import Article,ArticleBase
 from sqlalchemy import and_, or_, desc
 from .base import success_response, error_response
 from core.config import cfg
-from apis.base import format_search_kw
+from core.search import search_articles
 from core.print import print_warning, print_info, print_error, print_success
-from core.cache import clear_cache_pattern
+from core.cache import clear_cache_pattern, invalidate_cache_tags, cache_tag
+from core.feed_stats import reconcile_feed_stats
 from tools.fix import fix_article
 from driver.wxarticle import WXArticleFetcher
 router = APIRouter(prefix=f"/articles", tags=["文章管理"])
@@ -98,10 +100,8 @@ def _run_refresh_article_task(task_id: str, article_id: str):
         article.updated_at_millis = now_millis
         session.commit()
 
-        clear_cache_pattern("articles_list")
-        clear_cache_pattern("article_detail")
-        clear_cache_pattern("home_page")
-        clear_cache_pattern("tag_detail")
+        # 只清除包含这篇文章的页面；状态变化会影响同公众号的列表和统计
+        invalidate_cache_tags(cache_tag("article", article_id), cache_tag("mp", article.mp_id))
 
         _set_refresh_task(task_id, {
             "task_id": task_id,
@@ -149,6 +149,8 @@ async def clean_orphan_articles(
         clear_cache_pattern("articles_list")
         clear_cache_pattern("home_page")
         clear_cache_pattern("tag_detail")
+        # 批量删除不会触发统计事件，后台重新校正公众号文章统计
+        threading.Thread(target=reconcile_feed_stats, daemon=True).start()
         
         return success_response({
             "message": "清理无效文章成功",
@@ -190,10 +192,8 @@ async def toggle_article_read_status(
         article.is_read = 1 if is_read else 0
         session.commit()
         
-        # 清除相关缓存
-        clear_cache_pattern("articles_list")
-        clear_cache_pattern("article_detail")
-        clear_cache_pattern("tag_detail")
+        # 清除包含这篇文章的页面缓存
+        invalidate_cache_tags(cache_tag("article", article_id))
         
         return success_response({
             "message": f"文章已标记为{'已读' if is_read else '未读'}",
@@ -233,9 +233,7 @@ async def toggle_article_favorite_status(
         article.is_favorite = 1 if is_favorite else 0
         session.commit()
 
-        clear_cache_pattern("articles_list")
-        clear_cache_pattern("article_detail")
-        clear_cache_pattern("tag_detail")
+        invalidate_cache_tags(cache_tag("article", article_id))
 
         return success_response({
             "message": "文章已收藏" if is_favorite else "已取消收藏",
@@ -303,9 +301,8 @@ async def get_articles(
         if only_favorite:
             query = query.filter(Article.is_favorite == 1)
         if search:
-            query = query.filter(
-               format_search_kw(search)
-            )
+            # 全文索引可用时按相关度排序，发布时间为次要排序
+            query = search_articles(query, search)
         
         # 获取总数
         total = query.count()
@@ -435,7 +432,8 @@ async def get_article_detail(
                     message="文章不存在"
                 )
             )
-        return success_response(fix_article(article))
+        # 生成 content_html 时在线程中等待转换进程池，不阻塞事件循环
+        return success_response(await asyncio.to_thread(fix_article, article))
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -471,6 +469,7 @@ async def delete_article(
         if cfg.get("article.true_delete", False):
             session.delete(article)
         session.commit()
+        invalidate_cache_tags(cache_tag("article", article_id), cache_tag("mp", article.mp_id))
         
         return success_response(None, message="文章已标记为删除")
     except Exception as e:
@@ -517,7 +516,7 @@ async def get_next_article(
                     message="没有下一篇文章"
                 )
             )
-        return success_response(fix_article(next_article))
+        return success_response(await asyncio.to_thread(fix_article, next_article))
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -563,7 +562,7 @@ async def get_prev_article(
                     message="没有上一篇文章"
                 )
             )
-        return success_response(fix_article(prev_article))
+        return success_response(await asyncio.to_thread(fix_article, prev_article))
     except HTTPException as e:
         raise e
     except Exception as e:
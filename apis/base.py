@@ -24,7 +24,7 @@ def error_response(code: int, message: str, data=None):
     }
 from sqlalchemy import and_,or_
 from core.models import Article
+from core.search import search_condition
 def format_search_kw(keyword: str):
-    words = keyword.replace("-"," ").replace("|"," ").split(" ")
-    rule = or_(*[Article.title.like(f"%{w}%") for w in words])
-    return rule
\ No newline at end of file
+    """文章检索条件，全文索引可用时匹配标题、摘要和正文，否则按标题 LIKE 匹配"""
+    return search_condition(keyword)
\ No newline at end of file
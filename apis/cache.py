@@ -1,10 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from core.auth import get_current_user_or_ak
 from .base import success_response, error_response
-from core.cache import clear_cache_pattern, clear_all_cache
+from core.cache import clear_cache_pattern, clear_all_cache, get_cache_stats
 
 router = APIRouter(prefix="/cache", tags=["缓存管理"])
 
+@router.get("/stats", summary="获取缓存命中统计", description="获取视图缓存和数据缓存的命中、淘汰统计")
+async def cache_stats(
+    current_user: dict = Depends(get_current_user_or_ak)
+):
+    """获取缓存命中统计"""
+    return success_response(get_cache_stats())
+
 @router.delete("/clear", summary="清除所有视图缓存", description="清除所有视图页面的缓存")
 async def clear_all_view_cache(
     current_user: dict = Depends(get_current_user_or_ak)
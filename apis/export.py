@@ -8,7 +8,7 @@ from core.wx import search_Biz
 from .base import success_response, error_response
 from datetime import datetime
 from core.config import cfg
-from core.res import save_avatar_locally
+from core.res import save_avatars_locally
 import csv
 import io
 import os
@@ -98,10 +98,14 @@ async def import_mps(
         updated = 0
         skipped = 0
 
-        for row in csv_reader:
+        # 并发保存所有头像(开启本地头像时)，相同头像只下载一次
+        rows = list(csv_reader)
+        avatars = await save_avatars_locally([row["封面图"] for row in rows])
+
+        for row in rows:
             mp_id = row["id"]
             mp_name = row["公众号名称"]
-            mp_cover = row["封面图"]
+            mp_cover = avatars.get(row["封面图"]) or row["封面图"]
             mp_intro = row.get("简介", "")
             status_val = int(row.get("状态", 1)) if row.get("状态") else 1
             faker_id = row.get("faker_id", "")
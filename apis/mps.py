@@ -12,7 +12,8 @@ from core.config import cfg
 from core.res import save_avatar_locally
 from core.models.feed import FEATURED_MP_ID, FEATURED_MP_NAME, FEATURED_MP_INTRO
 from core.models.base import DATA_STATUS
-from core.cache import clear_cache_pattern
+from core.cache import invalidate_cache_tags, cache_tag
+import asyncio
 import io
 import os
 from jobs.article import UpdateArticle
@@ -154,10 +155,7 @@ def _run_add_featured_article_task(task_id: str, url: str):
             created = True
 
         session.commit()
-        clear_cache_pattern("articles_list")
-        clear_cache_pattern("article_detail")
-        clear_cache_pattern("home_page")
-        clear_cache_pattern("tag_detail")
+        invalidate_cache_tags("articles", "mps", cache_tag("article", article_id), cache_tag("mp", FEATURED_MP_ID))
 
         _set_featured_article_task(task_id, {
             "task_id": task_id,
@@ -455,7 +453,8 @@ async def add_mp(
         
         import base64
         mpx_id = base64.b64decode(mp_id).decode("utf-8")
-        local_avatar_path = f"{save_avatar_locally(avatar)}"
+        # 下载头像不阻塞事件循环
+        local_avatar_path = f"{await asyncio.to_thread(save_avatar_locally, avatar)}"
         
         # 检查公众号是否已存在
         existing_feed = session.query(Feed).filter(Feed.faker_id == mp_id).first()
@@ -1,94 +1,247 @@
-from fastapi import APIRouter, Request, HTTPException
-import httpx
-from fastapi.responses import Response
+from fastapi import APIRouter, Request
+from fastapi.responses import Response, FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional
+from urllib.parse import urlparse
+import asyncio
 import os
-import hashlib
 import time
-import json
+import httpx
 from core.config import cfg
-CACHE_DIR = cfg.get("cache.dir","data/cache")
-CACHE_TTL = 3600  # 缓存过期时间1小时
+from core.print import print_error
+from core.res.image_cache import image_cache, url_key, CachedImage, DEFAULT_HEADERS, PROXY_HOSTS
+from core.res.image_transform import normalize_params, variant_url, transform_image
+
+ALLOWED_HOSTS = PROXY_HOSTS
+# 缓存的图片超过该时间(秒)后向源站重新校验，源站图片未变化时继续使用缓存
+CACHE_TTL = int(cfg.get("image_cache.proxy_ttl", 86400))
+# 浏览器缓存时间(秒)
+BROWSER_MAX_AGE = 86400
+CHUNK_SIZE = 65536
+# 透传给客户端的源站响应头
+PASS_HEADERS = ("content-type", "cache-control", "etag", "last-modified", "expires")
 
-if not os.path.exists(CACHE_DIR):
-    os.makedirs(CACHE_DIR)
+# 所有请求共用的连接池
+_client: Optional[httpx.AsyncClient] = None
+# 缓存键 -> 正在从源站获取该图片的请求完成事件，同一图片并发未命中时只请求一次源站
+_inflight: dict[str, asyncio.Event] = {}
+# 同时进行的图片缩放/转码数，转换在线程中执行
+_transform_slots = asyncio.Semaphore(max(1, int(cfg.get("image_cache.transform_workers", 2))))
 
 router = APIRouter(prefix="/res", tags=["资源反向代理"])
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(image_cache.timeout, connect=10),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            follow_redirects=True,
+        )
+    return _client
+
+
+@router.on_event("shutdown")
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _cached_response(entry: CachedImage, cache_status: str = "HIT") -> Response:
+    headers = {"Cache-Control": f"public, max-age={BROWSER_MAX_AGE}", "X-Cache": cache_status}
+    if entry.etag:
+        headers["ETag"] = entry.etag
+    return FileResponse(entry.path, media_type=entry.content_type or None, headers=headers)
+
+
+def _upstream_headers(resp: httpx.Response) -> dict:
+    headers = {name: resp.headers[name] for name in PASS_HEADERS if name in resp.headers}
+    # aiter_bytes 已解压，只有未压缩时长度才准确
+    if "content-length" in resp.headers and "content-encoding" not in resp.headers:
+        headers["content-length"] = resp.headers["content-length"]
+    return headers
+
+
+def _finish(key: str, event: asyncio.Event) -> None:
+    event.set()
+    if _inflight.get(key) is event:
+        del _inflight[key]
+
+
+async def _lookup(url: str) -> Optional[CachedImage]:
+    return await asyncio.to_thread(image_cache.lookup, url)
+
+
 @router.api_route("/logo/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"], operation_id="reverse_proxy_logo")
 async def reverse_proxy(request: Request, path: str):
-    hosts=["mmbiz.qpic.cn","mmbiz.qlogo.cn","mmecoa.qpic.cn"]
     path=path.replace("https://", "http://")
-    from urllib.parse import urlparse
     parsed_url = urlparse(path)
     host = parsed_url.netloc
-    if  host not  in hosts:
+    if  host not  in ALLOWED_HOSTS:
         return Response(
         content="只允许访问微信公众号图标，请使用正确的域名。",
         status_code=301,
         headers={"Location":path},
     )
-    
-    # 生成缓存文件名
-    cache_key = f"{request.method}_{path}".encode('utf-8')
-    cache_filename = os.path.join(CACHE_DIR, hashlib.sha256(cache_key).hexdigest())
-    
-    # 检查缓存是否存在且有效
-    if os.path.exists(cache_filename):
-        file_mtime = os.path.getmtime(cache_filename)
-        if time.time() - file_mtime < CACHE_TTL:
-            with open(cache_filename, 'rb') as f:
-                content = f.read()
-            
-            # 读取缓存的状态码和响应头
-            headers_filename = cache_filename + ".headers"
-            if os.path.exists(headers_filename):
-                with open(headers_filename, 'r', encoding='utf-8') as f:
-                    headers = json.load(f)
-            else:
-                headers = {}
-            
-            media_type = headers.get("Content-Type")
-            status_code = 200  # 默认状态码
-            
-            return Response(
-                content=content,
-                status_code=status_code,
-                headers=headers,
-                media_type=media_type
-            )
-    
-    target_url = path
-    
-    client = httpx.AsyncClient()
-    request_data = await request.body()
-    headers = dict(request.headers)
-    headers.pop("host", host)
-    headers.pop("referer", None)
-    print(headers)
-    resp = await client.request(
-        method=request.method,
-        url=target_url,
-        # headers=headers,
-        content=request_data
-    )
-    
-    content = resp.content
-    status_code = resp.status_code
-    headers = dict(resp.headers)
-    media_type = resp.headers.get("Content-Type")
+    if request.method != "GET":
+        return await _pass_through(request, path)
+    fmt = request.query_params.get("fmt", "")
+    params = normalize_params(request.query_params.get("w"), request.query_params.get("q"),
+                              fmt, request.headers.get("accept", ""))
+    if params is not None:
+        return await _transformed(path, params, vary=fmt.lower() == "auto")
+
+    entry = await _lookup(path)
+    if entry is not None and time.time() - entry.fetched_at < CACHE_TTL:
+        return _cached_response(entry)
+
+    # 其他请求正在获取同一图片时，等待完成后读取缓存
+    cached = await _wait_inflight(path)
+    if cached is not None and time.time() - cached.fetched_at < CACHE_TTL:
+        return _cached_response(cached)
+    return await _fetch(path, entry)
+
+
+async def _wait_inflight(url: str) -> Optional[CachedImage]:
+    event = _inflight.get(url_key(url))
+    if event is None:
+        return None
+    try:
+        await asyncio.wait_for(event.wait(), image_cache.timeout)
+    except asyncio.TimeoutError:
+        pass
+    return await _lookup(url)
+
+
+async def _transformed(url: str, params: dict, vary: bool = False) -> Response:
+    """返回缩放/转码后的图片，结果按 (URL, 参数) 缓存"""
+    key_url = variant_url(url, params)
+    entry = await _lookup(key_url) or await _wait_inflight(key_url)
+    if entry is None:
+        entry = await _render_variant(url, key_url, params)
+    if entry is None:
+        return Response(content="获取图片失败", status_code=502)
+    response = _cached_response(entry)
+    if vary:
+        response.headers["Vary"] = "Accept"
+    return response
+
+
+async def _render_variant(url: str, key_url: str, params: dict) -> Optional[CachedImage]:
+    key = url_key(key_url)
+    event = asyncio.Event()
+    _inflight[key] = event
+    original = None
     try:
-        # 缓存响应
-        with open(cache_filename, 'wb') as f:
-            f.write(content)
-        
-        # 缓存响应头
-        headers_filename = cache_filename + ".headers"
-        with open(headers_filename, 'w', encoding='utf-8') as f:
-            json.dump(headers, f)
+        original = await asyncio.to_thread(image_cache.fetch, url)
+        if original is None:
+            return None
+        async with _transform_slots:
+            result = await asyncio.to_thread(transform_image, original.path, params["w"], params["q"], params["fmt"])
+        # 无需转换或只缩放时结果反而更大，转换参数直接指向原图
+        if result is None or (not params["fmt"] and len(result[0]) >= original.size):
+            return await asyncio.to_thread(image_cache.alias, key_url, original)
+        data, content_type = result
+        return await asyncio.to_thread(image_cache.store, key_url, data, content_type)
     except Exception as e:
-        print(f"缓存响应失败: {str(e)}")    
-    return Response(
-        content=content,
-        status_code=status_code,
-        headers=headers,
-        media_type=media_type
-    )
\ No newline at end of file
+        print_error(f"转换图片失败: {url}, 错误: {str(e)}")
+        return original
+    finally:
+        _finish(key, event)
+
+
+async def _fetch(url: str, stale: Optional[CachedImage]) -> Response:
+    """从源站获取图片，边返回给客户端边写入缓存；stale 为过期的缓存，用于条件请求"""
+    key = url_key(url)
+    event = asyncio.Event()
+    _inflight[key] = event
+    headers = {}
+    if stale is not None:
+        if stale.etag:
+            headers["If-None-Match"] = stale.etag
+        if stale.last_modified:
+            headers["If-Modified-Since"] = stale.last_modified
+    client = get_client()
+    try:
+        upstream = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+    except httpx.HTTPError as e:
+        _finish(key, event)
+        if stale is not None:
+            return _cached_response(stale, "STALE")
+        print_error(f"获取图片失败: {url}, 错误: {str(e)}")
+        return Response(content=f"获取图片失败: {str(e)}", status_code=502)
+
+    if upstream.status_code == 304 and stale is not None:
+        await upstream.aclose()
+        try:
+            await asyncio.to_thread(image_cache.touch, stale)
+        finally:
+            _finish(key, event)
+        return _cached_response(stale, "REVALIDATED")
+
+    if upstream.status_code != 200 and stale is not None:
+        # 源站图片已失效(如微信图片过期)时继续使用缓存
+        await upstream.aclose()
+        _finish(key, event)
+        return _cached_response(stale, "STALE")
+
+    if upstream.status_code != 200:
+        # 错误响应不缓存，直接透传
+        _finish(key, event)
+        return StreamingResponse(upstream.aiter_bytes(CHUNK_SIZE), status_code=upstream.status_code,
+                                 headers=_upstream_headers(upstream), background=BackgroundTask(upstream.aclose))
+
+    return StreamingResponse(_tee(url, upstream, key, event), status_code=200,
+                             headers={**_upstream_headers(upstream), "X-Cache": "MISS"})
+
+
+async def _tee(url: str, upstream: httpx.Response, key: str, event: asyncio.Event):
+    """转发源站响应，同时写入缓存目录的临时文件，完整接收后移入缓存"""
+    temp_path = image_cache.temp_path()
+    f = None
+    complete = False
+    try:
+        f = await asyncio.to_thread(open, temp_path, "wb")
+        size = 0
+        async for chunk in upstream.aiter_bytes(CHUNK_SIZE):
+            if f is not None:
+                size += len(chunk)
+                if size > image_cache.max_image_size:
+                    # 超过大小上限的图片只转发不缓存
+                    await asyncio.to_thread(f.close)
+                    f = None
+                else:
+                    await asyncio.to_thread(f.write, chunk)
+            yield chunk
+        complete = True
+    finally:
+        try:
+            await upstream.aclose()
+            if f is not None:
+                await asyncio.to_thread(f.close)
+                if complete:
+                    await asyncio.to_thread(image_cache.store_file, url, temp_path,
+                                            upstream.headers.get("Content-Type", ""),
+                                            upstream.headers.get("ETag", ""),
+                                            upstream.headers.get("Last-Modified", ""))
+        except Exception as e:
+            print_error(f"缓存图片失败: {url}, 错误: {str(e)}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            _finish(key, event)
+
+
+async def _pass_through(request: Request, path: str) -> Response:
+    """非GET请求直接转发，不缓存"""
+    client = get_client()
+    try:
+        upstream = await client.send(client.build_request(request.method, path, content=await request.body()), stream=True)
+    except httpx.HTTPError as e:
+        return Response(content=f"请求失败: {str(e)}", status_code=502)
+    return StreamingResponse(upstream.aiter_bytes(CHUNK_SIZE), status_code=upstream.status_code,
+                             headers=_upstream_headers(upstream), background=BackgroundTask(upstream.aclose))
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, Query, HTTPException, Request,Response
 from fastapi import status
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+import asyncio
 from core.db import DB
 from core.rss import RSS
 from core.models.feed import Feed
@@ -8,7 +9,7 @@ import json
 from .base import success_response, error_response
 from core.auth import get_current_user
 from core.config import cfg
-from apis.base import format_search_kw
+from core.search import search_articles
 from core.print import print_error,print_success
 def verify_rss_access(current_user: dict = Depends(get_current_user)):
     """
@@ -233,7 +234,8 @@ async def get_mp_articles_source(
         total = query.count()
         # articles = query.order_by(Article.publish_time.desc()).limit(limit).offset(offset).all()
         if kw!="":
-            query=query.filter(format_search_kw(kw))
+            # 全文索引可用时按相关度排序，发布时间为次要排序
+            query=search_articles(query,kw)
         articles =query.order_by(Article.publish_time.desc()).limit(limit).offset(offset).all()
         # 转换为RSS格式数据
         from datetime import datetime, timezone, timedelta
@@ -244,6 +246,8 @@ async def get_mp_articles_source(
             "link":  f"{rss_domain}/views/article/{article.id}" if cfg.get("rss.local",False) else article.url,
             "description": article.description if article.description != "" else article.title or "",
             "content": article.content or "",
+            "content_text": article.content_text,
+            "content_markdown": article.content_markdown,
             "image": article.pic_url or "",
             "mp_name":_feed.mp_name or "",
             "updated": datetime.fromtimestamp(article.publish_time, tz=cst),
@@ -268,11 +272,11 @@ async def get_mp_articles_source(
                 "mp_name": _feed.mp_name
             }
             rss.cache_content(article.id, content_data)
-        # 生成RSS XML
-        rss_xml = rss.generate(rss_list,ext=ext, title=f"{feed.mp_name}",link=rss_domain,description=feed.mp_intro,image_url=feed.mp_cover,template=template)
+        # 生成RSS XML，自定义模板时流式输出；正文转换在线程中等待转换进程池，不阻塞事件循环
+        chunks = await asyncio.to_thread(rss.generate_iter,rss_list,ext=ext, title=f"{feed.mp_name}",link=rss_domain,description=feed.mp_intro,image_url=feed.mp_cover,template=template)
         
-        return Response(
-            content=rss_xml,
+        return StreamingResponse(
+            chunks,
             media_type=rss.get_type()
         )
     except Exception as e:
@@ -9,6 +9,9 @@ from .base import success_response, error_response
 from driver.token import wx_cfg
 from core.config import cfg
 from jobs.mps import TaskQueue
+from core.notice.delivery import delivery
+from core.content_pool import content_pool
+from core.res.image_cache import image_cache
 from driver.success import getLoginInfo,getStatus
 router = APIRouter(prefix="/sys", tags=["系统信息"])
 def get_docker_version():
@@ -65,6 +68,9 @@ async def system_resources(
             message=f"获取系统资源失败: {str(e)}"
         )
 from core.article_lax import get_article_info
+from core.cache import get_cache_stats
+from jobs.search_index import get_search_index_progress
+from jobs.image_prefetch import get_image_prefetch_info
 from .ver import API_VERSION
 from core.base import VERSION as CORE_VERSION,LATEST_VERSION
 @router.get("/info", summary="获取系统信息")
@@ -110,6 +116,12 @@ async def get_system_info(
             },
             "article":get_article_info(),
             'queue':TaskQueue.get_queue_info(),
+            'delivery':delivery.get_info(),
+            'content_pool':content_pool.get_info(),
+            'image_cache':image_cache.get_info(),
+            'image_prefetch':get_image_prefetch_info(),
+            'cache':get_cache_stats(),
+            'search':get_search_index_progress(),
         }
         return success_response(data=system_info)
     except Exception as e:
@@ -7,7 +7,7 @@ from sqlalchemy.orm import Session
 from schemas.tags import Tags, TagsCreate
 from .base import success_response, error_response
 from core.auth import get_current_user_or_ak
-from core.cache import clear_cache_pattern
+from core.cache import invalidate_cache_tags, cache_tag
 
 # 标签管理API路由
 # 提供标签的增删改查功能
@@ -80,9 +80,8 @@ async def create_tag(tag: TagsCreate, db: Session = Depends(get_db),cur_user: di
         db.commit()
         db.refresh(db_tag)
         
-        # 清除相关缓存
-        clear_cache_pattern("home_page")
-        clear_cache_pattern("tag_detail")
+        # 清除标签列表页面缓存
+        invalidate_cache_tags("tags")
         
         return success_response(data=db_tag)
     except Exception as e:
@@ -152,9 +151,8 @@ async def update_tag(tag_id: str, tag_data: TagsCreate, db: Session = Depends(ge
         db.commit()
         db.refresh(tag)
         
-        # 清除相关缓存
-        clear_cache_pattern("home_page")
-        clear_cache_pattern("tag_detail")
+        # 清除显示该标签和按该标签筛选的页面缓存
+        invalidate_cache_tags("tags", cache_tag("tag", tag_id))
         
         return success_response(data=tag)
     except Exception as e:
@@ -182,9 +180,8 @@ async def delete_tag(tag_id: str, db: Session = Depends(get_db),cur_user: dict =
         db.delete(tag)
         db.commit()
         
-        # 清除相关缓存
-        clear_cache_pattern("home_page")
-        clear_cache_pattern("tag_detail")
+        # 清除显示该标签和按该标签筛选的页面缓存
+        invalidate_cache_tags("tags", cache_tag("tag", tag_id))
         
         return success_response(message="Tag deleted successfully")
     except Exception as e:
@@ -13,7 +13,7 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
 # 导入导出工具
-from tools.mdtools.export import export_md_to_doc, process_articles
+from tools.mdtools.export import export_md_to_doc, get_export_progress, is_exporting
 
 router = APIRouter(prefix="/tools", tags=["工具"])
 
@@ -91,16 +91,15 @@ async def export_articles(
     """
     try:
         # 检查是否已有相同 mp_id 的导出任务正在运行
-        for thread in threading.enumerate():
-            if thread.name == f"export_articles_{request.mp_id}":
-                return error_response(400, "该公众号的导出任务已在处理中，请勿重复点击")
+        if is_exporting(request.mp_id) or any(thread.name == f"export_articles_{request.mp_id}" for thread in threading.enumerate()):
+            return error_response(400, "该公众号的导出任务已在处理中，请勿重复点击")
                 
         # 直接生成 zip_filename 并返回
         docx_path = f"./data/docs/{request.mp_id}/"
-        if request.zip_filename:
-            zip_file_path = f"{docx_path}{request.zip_filename}"
-        else:
-            zip_file_path = f"{docx_path}exported_articles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        zip_filename = request.zip_filename or f"exported_articles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        if not zip_filename.endswith('.zip'):
+            zip_filename += '.zip'
+        zip_file_path = f"{docx_path}{zip_filename}"
         
         # 启动后台线程执行导出操作
         export_thread = threading.Thread(
@@ -118,7 +117,7 @@ async def export_articles(
                 request.export_json,
                 request.export_csv,
                 request.export_pdf,
-                request.zip_filename
+                zip_filename
             ),
             name=f"export_articles_{request.mp_id}"
         )
@@ -134,6 +133,19 @@ async def export_articles(
     except Exception as e:
         return error_response(500, f"导出失败: {str(e)}")
 
+@router.get("/export/progress", summary="获取导出进度", response_model=BaseResponse)
+async def get_export_articles_progress(
+    mp_id: str = Query(..., description="公众号ID"),
+    current_user: dict = Depends(get_current_user_or_ak)
+):
+    """
+    获取公众号导出任务的进度(已完成/失败/总数、预计剩余时间)
+    """
+    progress = get_export_progress(mp_id)
+    if progress is None:
+        return error_response(404, "没有导出任务")
+    return success_response(progress)
+
 @router.get("/export/download", summary="下载导出文件")
 async def download_export_file(
     filename: str = Query(..., description="文件名"),
@@ -0,0 +1,138 @@
+"""
+文章派生内容
+
+纯文本、Markdown和摘要由正文解析一次HTML生成，保存到 articles 表。
+写入文章时不生成，只在正文变更时清空(ORM before_update)；
+首次读取时转换并保存，或由后台任务(jobs.content_html)分批补齐，
+之后 Webhook、导出、RSS和页面直接读取保存的结果。
+"""
+from sqlalchemy import event, update, case, or_
+from sqlalchemy.orm.attributes import get_history, set_committed_value
+from core.content_pool import content_pool
+from core.html_pipeline import HtmlDocument
+from core.models.article import Article
+from core.print import print_error
+
+# 摘要长度(字符)
+DESCRIPTION_LENGTH = 200
+
+
+def _derive_text(doc: HtmlDocument) -> dict:
+    return {
+        "content_text": doc.text(),
+        "description": doc.description(DESCRIPTION_LENGTH),
+    }
+
+
+def derive_text(content: str) -> dict:
+    """只返回纯文本和摘要，不转换Markdown"""
+    if not content:
+        return {"content_text": "", "description": ""}
+    return _derive_text(HtmlDocument(content))
+
+
+def derive_content(content: str) -> dict:
+    """解析一次正文，返回纯文本、Markdown和摘要"""
+    if not content:
+        return {"content_text": "", "content_markdown": "", "description": ""}
+    doc = HtmlDocument(content)
+    derived = _derive_text(doc)
+    # 转换Markdown会修改文档，放在最后
+    derived["content_markdown"] = doc.markdown()
+    return derived
+
+
+def save_derived_content(article_id: str, content: str, derived: dict) -> bool:
+    """
+    保存生成的派生内容，正文已被修改时放弃
+
+    只保存 derived 中包含的字段；已有摘要(公众号提供的digest)时保留
+    """
+    from core.db import DB
+    table = Article.__table__
+    values = {name: derived[name] for name in ("content_text", "content_markdown") if name in derived}
+    if "description" in derived:
+        values["description"] = case((or_(table.c.description.is_(None), table.c.description == ''),
+                                      derived["description"]),
+                                     else_=table.c.description)
+    try:
+        with DB.engine.begin() as conn:
+            result = conn.execute(update(table)
+                                  .where(table.c.id == article_id, table.c.content == content)
+                                  .values(**values))
+        return result.rowcount > 0
+    except Exception as e:
+        print_error(f"保存文章派生内容失败({article_id}): {e}")
+        return False
+
+
+@event.listens_for(Article, 'before_update')
+def _before_update(mapper, connection, target):
+    history = get_history(target, 'content')
+    if not history.added:
+        return
+    # 正文变更后 content_html 失效，下次读取时重新生成
+    if not get_history(target, 'content_html').added:
+        target.content_html = None
+        target.content_html_version = None
+    # 摘要是由旧正文生成的，随正文一起更新
+    old = history.deleted[0] if history.deleted else None
+    if old and target.description and target.description == HtmlDocument(old).description(DESCRIPTION_LENGTH):
+        target.description = ""
+    # 派生内容失效，下次读取或后台任务重新生成
+    for name in ("content_text", "content_markdown"):
+        if not get_history(target, name).added:
+            setattr(target, name, None)
+
+
+def _get(article, name: str):
+    if isinstance(article, dict):
+        return article.get(name)
+    return getattr(article, name, None)
+
+
+def article_content(article, content_format: str = 'html') -> str:
+    """
+    按格式返回文章正文
+
+    纯文本和Markdown未生成时转换并保存，只需要纯文本时不转换Markdown
+
+    Args:
+        article: Article对象或包含文章字段的字典
+        content_format: html / text / markdown
+    """
+    content = _get(article, "content") or ""
+    if content_format == 'text':
+        stored = _get(article, "content_text")
+    elif content_format == 'markdown':
+        stored = _get(article, "content_markdown")
+    else:
+        return content
+    if stored is not None and (stored or not content):
+        return stored
+    derived = content_pool.run("derive_content" if content_format == 'markdown' else "derive_text", content)
+    article_id = _get(article, "id")
+    if article_id:
+        save_derived_content(article_id, content, derived)
+    for name in ("content_text", "content_markdown"):
+        if name not in derived:
+            continue
+        if isinstance(article, dict):
+            article[name] = derived[name]
+        elif isinstance(article, Article):
+            # 直接更新已加载的值，不把对象标记为已修改
+            set_committed_value(article, name, derived[name])
+    return derived["content_markdown" if content_format == 'markdown' else "content_text"]
+
+
+def article_description(article, length: int = DESCRIPTION_LENGTH) -> str:
+    """文章摘要，没有摘要时由纯文本截取"""
+    description = _get(article, "description")
+    if description:
+        return description
+    text = _get(article, "content_text")
+    if text is None:
+        content = _get(article, "content")
+        return HtmlDocument(content).description(length) if content else ""
+    text = text.strip().replace("\n", " ").replace("\r", " ")
+    return text[:length] + "..." if len(text) > length else text
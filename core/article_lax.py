@@ -1,9 +1,9 @@
-import threading
 from core import lax, thread
-from core.models import Article,Feed,DATA_STATUS
+from core.models import Feed
 from core.db import DB
 from core.cache import data_cache
-import json
+from core.feed_stats import get_feed_stats_summary
+from core.print import print_error
 class ArticleInfo():
     #没有内容的文章数量
     no_content_count:int=0
@@ -16,45 +16,37 @@ class ArticleInfo():
     #公众号总数
     mp_all_count:int=0
 def laxArticle():
+    """从 feed_stats 汇总文章统计，查询量只与公众号数量相关"""
     info=ArticleInfo()
-    session=DB.get_session()
-    #获取没有内容的文章数量 - 只查询content字段
-    info.no_content_count=session.query(Article).filter((Article.content == None) | (Article.content=='')).count()
-    #所有文章数量 - 只查询id字段
-    info.all_count=session.query(Article.id).count()
+    stats=get_feed_stats_summary()
+    #所有文章数量
+    info.all_count=stats["total_count"]
     #有内容的文章数量
-    info.has_content_count=info.all_count-info.no_content_count
-
-    #获取删除的文章 - 只查询status字段
-    info.wrong_count=session.query(Article).filter(Article.status !=DATA_STATUS.ACTIVE ).count()
+    info.has_content_count=stats["content_count"]
+    #没有内容的文章数量
+    info.no_content_count=info.all_count-info.has_content_count
+    #不正常的文章数量
+    info.wrong_count=stats["deleted_count"]
 
     #公众号总数 - 只查询id字段
+    session=DB.get_session()
     info.mp_all_count=session.query(Feed.id).distinct().count()
-    # session.close()
     return info.__dict__
-    pass
 ARTICLE_INFO={}
-lock = threading.Lock()
 def refresh_article_info():
-    def lax_article():
-        global ARTICLE_INFO
-        with lock:
-            ARTICLE_INFO=laxArticle()
-            # 存储到缓存中，缓存30分钟
-            data_cache.set("article_info", ARTICLE_INFO)
-            print(ARTICLE_INFO)
-    threading.Thread(target=lax_article).start()
+    global ARTICLE_INFO
+    ARTICLE_INFO=laxArticle()
+    return ARTICLE_INFO
 
 def get_article_info():
-    """从缓存获取文章信息，如果缓存不存在则返回全局变量"""
-    # 先尝试从缓存获取
-    cached_info = data_cache.get("article_info", ttl=60)  # 1分钟TTL
-    ARTICLE_INFO=cached_info
-    if cached_info is not None:
-        return cached_info
-    else:
-        refresh_article_info()
-    
-    # 如果缓存不存在，返回全局变量
-    return ARTICLE_INFO
+    """
+    从缓存获取文章信息，缓存1分钟
 
+    同一时间只有一个线程重新统计，过期后5分钟内先返回旧数据并在后台刷新
+    """
+    try:
+        return data_cache.get_or_set("article_info", refresh_article_info, ttl=60, stale_ttl=300)
+    except Exception as e:
+        print_error(f"获取文章统计失败: {e}")
+        # 查询失败时返回上一次的结果
+        return ARTICLE_INFO
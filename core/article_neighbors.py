@@ -0,0 +1,130 @@
+"""
+公众号文章邻接索引
+
+文章详情页需要同公众号的上一篇、下一篇和最新文章，
+按公众号缓存按发布时间排序的文章列表，详情页查询时不再访问数据库。
+文章新增、删除、修改时通过 ORM 事件清除对应公众号的索引，
+其他进程写入的变化在 INDEX_TTL 秒后生效。
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import get_history
+from core.article_content import article_description
+from core.models.article import Article
+from core.models.base import DATA_STATUS
+
+# 索引有效期(秒)
+INDEX_TTL = 300
+# 最多缓存的公众号数量
+MAX_FEEDS = 256
+# 相关文章数量
+RELATED_LIMIT = 5
+
+
+class FeedNeighbors:
+    """单个公众号的文章邻接索引"""
+
+    def __init__(self, rows: list, latest: list):
+        # rows 按发布时间升序: (发布时间, 文章ID, 标题)
+        self.times = [row[0] for row in rows]
+        self.items = [(row[1], row[2]) for row in rows]
+        # 最新的文章，比 RELATED_LIMIT 多一篇用于排除当前文章
+        self.latest = latest
+        self.built_at = time.monotonic()
+
+    def prev(self, publish_time) -> Optional[tuple]:
+        """发布时间早于当前文章的最近一篇"""
+        if publish_time is None:
+            return None
+        i = bisect_left(self.times, publish_time)
+        return self.items[i - 1] if i > 0 else None
+
+    def next(self, publish_time) -> Optional[tuple]:
+        """发布时间晚于当前文章的最近一篇"""
+        if publish_time is None:
+            return None
+        i = bisect_right(self.times, publish_time)
+        return self.items[i] if i < len(self.items) else None
+
+    def related(self, article_id: str) -> list:
+        return [item for item in self.latest if item["id"] != article_id][:RELATED_LIMIT]
+
+
+_indexes: "OrderedDict[str, FeedNeighbors]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _build(session, mp_id: str) -> FeedNeighbors:
+    from driver.wxarticle import Web
+    rows = session.query(Article.publish_time, Article.id, Article.title).filter(
+        Article.mp_id == mp_id,
+        Article.status == DATA_STATUS.ACTIVE,
+        Article.publish_time != None
+    ).order_by(Article.publish_time.asc()).all()
+    latest_articles = session.query(Article).filter(
+        Article.mp_id == mp_id,
+        Article.status == DATA_STATUS.ACTIVE
+    ).order_by(Article.publish_time.desc()).limit(RELATED_LIMIT + 1).all()
+    latest = [{
+        "id": rel_article.id,
+        "title": rel_article.title,
+        "description": article_description(rel_article),
+        "pic_url": Web.get_image_url(rel_article.pic_url),
+        "publish_time": datetime.fromtimestamp(rel_article.publish_time).strftime('%Y-%m-%d %H:%M') if rel_article.publish_time else ""
+    } for rel_article in latest_articles]
+    return FeedNeighbors([tuple(row) for row in rows], latest)
+
+
+def get_feed_neighbors(session, mp_id: str) -> FeedNeighbors:
+    """获取公众号的邻接索引，不存在或过期时重新生成"""
+    key = str(mp_id)
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None and time.monotonic() - index.built_at <= INDEX_TTL:
+            _indexes.move_to_end(key)
+            return index
+    index = _build(session, mp_id)
+    with _lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_FEEDS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def invalidate_feed_neighbors(mp_id=None) -> None:
+    """清除公众号的邻接索引，mp_id为空时清除全部"""
+    with _lock:
+        if mp_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(str(mp_id), None)
+
+
+@event.listens_for(Article, 'after_insert')
+@event.listens_for(Article, 'after_delete')
+def _article_changed(mapper, connection, target):
+    invalidate_feed_neighbors(target.mp_id)
+
+
+# 影响邻接索引的字段，已读、收藏等状态变化不需要重建
+_INDEXED_FIELDS = ('mp_id', 'title', 'publish_time', 'status', 'description', 'pic_url', 'content')
+
+
+@event.listens_for(Article, 'after_update')
+def _article_updated(mapper, connection, target):
+    changed = False
+    for key in _INDEXED_FIELDS:
+        history = get_history(target, key)
+        if history.added or history.deleted:
+            changed = True
+            if key == 'mp_id':
+                for mp_id in history.deleted:
+                    invalidate_feed_neighbors(mp_id)
+    if changed:
+        invalidate_feed_neighbors(target.mp_id)
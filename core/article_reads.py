@@ -0,0 +1,74 @@
+"""
+文章已读标记 (write-behind)
+
+详情页只把文章ID放入缓冲区，合并后定时用一条 UPDATE 批量写入，
+页面渲染保持只读，可以直接被视图缓存。
+"""
+import atexit
+import threading
+from typing import Optional
+from sqlalchemy import or_
+from core.models.article import Article
+from core.print import print_error
+
+# 合并写入的间隔(秒)
+FLUSH_DELAY = 3
+# 每条 UPDATE 语句最多包含的文章数
+BATCH_SIZE = 500
+
+_pending: set = set()
+_lock = threading.Lock()
+_timer: Optional[threading.Timer] = None
+
+
+def _schedule_flush() -> None:
+    """启动定时写入，调用方持有 _lock"""
+    global _timer
+    if _timer is None:
+        _timer = threading.Timer(FLUSH_DELAY, flush_article_reads)
+        _timer.daemon = True
+        _timer.start()
+
+
+def mark_article_read(article_id: str) -> None:
+    """标记文章已读，稍后批量写入数据库"""
+    if not article_id:
+        return
+    with _lock:
+        _pending.add(article_id)
+        _schedule_flush()
+
+
+def flush_article_reads() -> int:
+    """把缓冲区中的已读标记写入数据库，返回写入的文章数量"""
+    global _timer
+    from core.db import DB
+    with _lock:
+        ids = list(_pending)
+        _pending.clear()
+        _timer = None
+    if not ids:
+        return 0
+    session = None
+    try:
+        session = DB.get_session()
+        for i in range(0, len(ids), BATCH_SIZE):
+            session.query(Article).filter(
+                Article.id.in_(ids[i:i + BATCH_SIZE]),
+                or_(Article.is_read.is_(None), Article.is_read != 1)
+            ).update({Article.is_read: 1}, synchronize_session=False)
+        session.commit()
+        return len(ids)
+    except Exception as e:
+        if session is not None:
+            session.rollback()
+        with _lock:
+            _pending.update(ids)
+            # 写入失败后重新定时，不依赖之后的阅读触发
+            _schedule_flush()
+        print_error(f"写入文章已读状态失败: {e}")
+        return 0
+
+
+# 退出时写入尚未保存的已读标记
+atexit.register(flush_article_reads)
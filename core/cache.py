@@ -2,22 +2,449 @@ import os
 import hashlib
 import time
 import json
-import pickle
-from typing import Any, Optional, Union
+import re
+import base64
+import asyncio
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Optional, Tuple, Union
 from functools import wraps
+from starlette.responses import Response
 from core.config import cfg
+from core.print import print_error
+
+
+class SingleFlight:
+    """
+    同一个键同时只执行一次计算
+
+    并发调用方等待正在执行的计算并共享结果(或异常)，
+    避免缓存失效时多个线程重复执行相同的查询
+    """
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, "SingleFlight._Call"] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    def do(self, key: str, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._Call()
+                self._calls[key] = call
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def do_background(self, key: str, func: Callable, *args, **kwargs) -> bool:
+        """在后台线程中执行，已有相同计算在执行时直接返回False"""
+        if self.in_flight(key):
+            return False
+
+        def run():
+            try:
+                self.do(key, func, *args, **kwargs)
+            except Exception as e:
+                print_error(f"后台刷新缓存失败({key}): {e}")
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight 的协程版本
+
+    计算作为独立任务运行，发起请求的客户端断开连接时不会取消计算，
+    其他等待者仍能拿到结果
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def _running(self, key: str) -> Optional[asyncio.Task]:
+        task = self._tasks.get(key)
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return None
+        return task
+
+    def _start(self, key: str, func: Callable, *args, **kwargs) -> asyncio.Task:
+        task = asyncio.ensure_future(func(*args, **kwargs))
+        self._tasks[key] = task
+
+        def done(t: asyncio.Task):
+            if self._tasks.get(key) is t:
+                del self._tasks[key]
+            # 标记异常已读取，所有等待者都已取消时避免事件循环报警
+            if not t.cancelled() and t.exception() is not None:
+                print_error(f"刷新缓存失败({key}): {t.exception()}")
+        task.add_done_callback(done)
+        return task
+
+    async def do(self, key: str, func: Callable, *args, **kwargs) -> Any:
+        task = self._running(key) or self._start(key, func, *args, **kwargs)
+        return await asyncio.shield(task)
+
+    def do_background(self, key: str, func: Callable, *args, **kwargs) -> bool:
+        """在后台任务中执行，已有相同计算在执行时直接返回False"""
+        if self._running(key) is not None:
+            return False
+        self._start(key, func, *args, **kwargs)
+        return True
+
+
+def _encode_value(o):
+    """把JSON不支持的缓存值转换为带标记的字典"""
+    if isinstance(o, Response):
+        body = bytes(o.body)
+        try:
+            content = {"text": body.decode("utf-8")}
+        except UnicodeDecodeError:
+            content = {"b64": base64.b64encode(body).decode("ascii")}
+        return {"__response__": {
+            "status_code": o.status_code,
+            "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in o.raw_headers],
+            **content
+        }}
+    if isinstance(o, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(bytes(o)).decode("ascii")}
+    if isinstance(o, datetime):
+        return {"__datetime__": o.isoformat()}
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"不支持缓存的数据类型: {type(o).__name__}")
+
+
+def _decode_value(d: dict):
+    if len(d) != 1:
+        return d
+    if "__response__" in d:
+        data = d["__response__"]
+        body = data["text"].encode("utf-8") if "text" in data else base64.b64decode(data["b64"])
+        response = Response(content=body, status_code=data["status_code"])
+        response.raw_headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in data["headers"]]
+        return response
+    if "__bytes__" in d:
+        return base64.b64decode(d["__bytes__"])
+    if "__datetime__" in d:
+        return datetime.fromisoformat(d["__datetime__"])
+    return d
+
+
+def dumps_cache_value(value: Any) -> str:
+    """
+    序列化缓存值
+
+    使用JSON代替pickle，读取缓存文件不会执行任意代码；
+    Response、bytes、datetime 以带标记的字典保存，不支持的类型抛出 TypeError
+    """
+    return json.dumps(value, default=_encode_value, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads_cache_value(payload: str) -> Any:
+    return json.loads(payload, object_hook=_decode_value)
+
+
+def _match_prefix(prefix: str, pattern: str) -> bool:
+    """与旧版按文件名 {pattern}_* 匹配的规则保持一致"""
+    return prefix == pattern or prefix.startswith(f"{pattern}_")
+
+
+class _MemoryLRU:
+    """一级缓存：进程内按条目数量淘汰的LRU，按前缀索引缓存键"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, maxsize)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # 缓存键 -> (前缀, 写入时间, 序列化后的值)
+        self._data: "OrderedDict[str, Tuple[str, float, str]]" = OrderedDict()
+        self._prefixes: dict[str, set] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key: str, prefix: str, created: float, payload: str) -> None:
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = (prefix, created, payload)
+            self._data.move_to_end(key)
+            self._prefixes.setdefault(prefix, set()).add(key)
+            while len(self._data) > self.maxsize:
+                old_key, (old_prefix, _, _) = self._data.popitem(last=False)
+                self._unindex(old_key, old_prefix)
+                self.evictions += 1
+
+    def _unindex(self, key: str, prefix: str) -> None:
+        keys = self._prefixes.get(prefix)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._prefixes[prefix]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._unindex(key, entry[0])
+
+    def delete_pattern(self, pattern: str) -> int:
+        with self._lock:
+            count = 0
+            for prefix in [p for p in self._prefixes if _match_prefix(p, pattern)]:
+                for key in self._prefixes.pop(prefix):
+                    self._data.pop(key, None)
+                    count += 1
+            return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._prefixes.clear()
+
+
+class _DiskStore:
+    """
+    二级缓存：文件存储，多进程共享
+
+    每个前缀一个子目录，按模式清除时只需遍历匹配的目录
+    """
+
+    STAMP_FILE = ".invalidated"
+    TAGS_DIR = ".tags"
+    # 本进程最多记录的已登记标签的缓存键数，超过后清空重新记录
+    MAX_TAGGED_KEYS = 10000
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        # 确保缓存目录存在
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._remove_legacy()
+        # 本进程已写入标签索引的 标签 -> 缓存键 及 缓存键 -> 标签，避免重复渲染时索引文件不断增长；
+        # 缓存删除或标签清除后移除对应记录
+        self._tagged: dict[str, set] = {}
+        self._key_tags: dict[str, set] = {}
+        self._tag_lock = threading.Lock()
+
+    def _remove_legacy(self) -> None:
+        # 旧版本在根目录保存的pickle缓存不再读取
+        try:
+            for filename in os.listdir(self.cache_dir):
+                if filename.endswith('.cache'):
+                    os.remove(os.path.join(self.cache_dir, filename))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _dir_name(prefix: str) -> str:
+        return re.sub(r'[^\w\-]', '_', prefix)
+
+    def _path(self, prefix: str, key: str) -> str:
+        return os.path.join(self.cache_dir, self._dir_name(prefix), f"{key[len(prefix) + 1:]}.cache")
+
+    def get(self, prefix: str, key: str) -> Optional[Tuple[float, str]]:
+        try:
+            with open(self._path(prefix, key), 'r', encoding='utf-8') as f:
+                return os.fstat(f.fileno()).st_mtime, f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def set(self, prefix: str, key: str, payload: str) -> bool:
+        path = self._path(prefix, key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            # 先写临时文件再替换，其他进程不会读到写了一半的缓存
+            os.replace(tmp_path, path)
+            return True
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def delete(self, prefix: str, key: str) -> None:
+        try:
+            os.remove(self._path(prefix, key))
+        except OSError:
+            pass
+        with self._tag_lock:
+            self._forget_key(key)
+
+    def _remove_dir(self, name: str) -> None:
+        path = os.path.join(self.cache_dir, name)
+        for filename in os.listdir(path):
+            if filename.endswith(('.cache', '.idx')):
+                try:
+                    os.remove(os.path.join(path, filename))
+                except FileNotFoundError:
+                    pass
+
+    def delete_pattern(self, pattern: str) -> None:
+        with self._tag_lock:
+            # 缓存键为 前缀_哈希
+            for key in [k for k in self._key_tags if k.startswith(f"{pattern}_")]:
+                self._forget_key(key)
+        pattern = self._dir_name(pattern)
+        for name in os.listdir(self.cache_dir):
+            if _match_prefix(name, pattern) and os.path.isdir(os.path.join(self.cache_dir, name)):
+                self._remove_dir(name)
+
+    def clear(self) -> None:
+        self._remove_legacy()
+        for name in os.listdir(self.cache_dir):
+            if os.path.isdir(os.path.join(self.cache_dir, name)):
+                self._remove_dir(name)
+        with self._tag_lock:
+            self._tagged.clear()
+            self._key_tags.clear()
+
+    def _forget_key(self, key: str) -> None:
+        """移除缓存键的标签记录，调用方持有 _tag_lock"""
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def _tag_path(self, tag: str) -> str:
+        return os.path.join(self.cache_dir, self.TAGS_DIR, f"{hashlib.sha1(tag.encode('utf-8')).hexdigest()}.idx")
+
+    def add_tags(self, prefix: str, key: str, tags) -> None:
+        """把缓存键追加到每个标签的索引文件，多进程共享"""
+        line = f"{prefix}\t{key}\n"
+        for tag in tags:
+            with self._tag_lock:
+                if key in self._tagged.get(tag, ()):
+                    continue
+                if key not in self._key_tags and len(self._key_tags) >= self.MAX_TAGGED_KEYS:
+                    # 只用于去重，清空后最多重复写入一次索引
+                    self._tagged.clear()
+                    self._key_tags.clear()
+                self._tagged.setdefault(tag, set()).add(key)
+                self._key_tags.setdefault(key, set()).add(tag)
+            try:
+                path = self._tag_path(tag)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError:
+                pass
+
+    def pop_tag(self, tag: str) -> list:
+        """取出并删除标签索引，返回 [(前缀, 缓存键)]"""
+        path = self._tag_path(tag)
+        claimed = f"{path}.{os.getpid()}.{threading.get_ident()}.pop"
+        try:
+            # 先改名再读取，改名后其他进程追加的索引会写入新文件
+            os.replace(path, claimed)
+        except OSError:
+            return []
+        try:
+            with open(claimed, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            lines = []
+        finally:
+            try:
+                os.remove(claimed)
+            except OSError:
+                pass
+        with self._tag_lock:
+            for key in self._tagged.pop(tag, ()):
+                tags = self._key_tags.get(key)
+                if tags is not None:
+                    tags.discard(tag)
+                    if not tags:
+                        del self._key_tags[key]
+        entries = set()
+        for line in lines:
+            prefix, _, key = line.partition("\t")
+            if key:
+                entries.add((prefix, key))
+        return list(entries)
+
+    def stamp(self) -> str:
+        """读取最近一次清除缓存的标记，用于通知其他进程清空一级缓存"""
+        try:
+            with open(os.path.join(self.cache_dir, self.STAMP_FILE), 'r') as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    def touch_stamp(self) -> str:
+        stamp = f"{os.getpid()}-{time.time_ns()}"
+        path = os.path.join(self.cache_dir, self.STAMP_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(stamp)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+        return stamp
+
 
 class ViewCache:
-    """视图缓存管理类"""
+    """
+    视图缓存管理类
+
+    一级缓存为进程内LRU，二级缓存为磁盘文件；
+    其他进程清除缓存后，最多 STAMP_CHECK_INTERVAL 秒内本进程的一级缓存会被清空
+    """
+
+    STAMP_CHECK_INTERVAL = 1.0
     
-    def __init__(self, cache_dir: str = None, default_ttl: int = 1800, enabled: bool = False):
+    def __init__(self, cache_dir: str = None, default_ttl: int = 1800, enabled: bool = False, memory_size: Optional[int] = None):
         self.cache_dir = cache_dir or cfg.get("cache.views.dir", "data/cache/views")
         self.default_ttl = default_ttl or cfg.get("cache.views.ttl", 1800)  # 默认30分钟
         self.enabled = enabled or cfg.get("cache.views.enabled", False)
-        
-        # 确保缓存目录存在
-        if not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir, exist_ok=True)
+        # 过期后仍可返回旧页面的时间(秒)，cache_view 未指定 stale_ttl 时使用
+        self.stale_ttl = int(cfg.get("cache.views.stale_ttl", 300) or 0)
+        if memory_size is None:
+            memory_size = int(cfg.get("cache.views.memory_size", 256))
+        self.memory = _MemoryLRU(memory_size)
+        self.store = _DiskStore(self.cache_dir)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stale_hits": 0, "sets": 0, "invalidations": 0}
+        self._stamp = self.store.stamp()
+        self._stamp_checked = time.monotonic()
     
     def _get_cache_key(self, prefix: str, **kwargs) -> str:
         """生成缓存键"""
@@ -27,102 +454,222 @@ class ViewCache:
         
         # 将参数转换为可哈希的字符串
         key_data = json.dumps(filtered_kwargs, sort_keys=True, default=str)
-        key_hash = hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+        # 前缀一起参与哈希：磁盘目录名由前缀替换特殊字符得到，不同前缀可能对应同一目录
+        key_hash = hashlib.sha256(f"{prefix}\0{key_data}".encode('utf-8')).hexdigest()
         return f"{prefix}_{key_hash}"
-    
-    def _get_cache_path(self, cache_key: str) -> str:
-        """获取缓存文件路径"""
-        return os.path.join(self.cache_dir, f"{cache_key}.cache")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _sync_invalidations(self) -> None:
+        """其他进程清除过缓存时清空一级缓存"""
+        now = time.monotonic()
+        if now - self._stamp_checked < self.STAMP_CHECK_INTERVAL:
+            return
+        self._stamp_checked = now
+        stamp = self.store.stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self.memory.clear()
+
+    def _invalidated(self) -> None:
+        self._count("invalidations")
+        self._stamp = self.store.touch_stamp()
+
+    def _delete(self, prefix: str, cache_key: str) -> None:
+        self.memory.delete(cache_key)
+        self.store.delete(prefix, cache_key)
     
     def get(self, prefix: str, ttl: Optional[int] = None, **kwargs) -> Optional[Any]:
         """获取缓存数据"""
+        data, fresh = self.get_with_state(prefix, ttl=ttl, **kwargs)
+        return data if fresh else None
+
+    def get_with_state(self, prefix: str, ttl: Optional[int] = None, stale_ttl: int = 0, **kwargs) -> Tuple[Optional[Any], bool]:
+        """
+        获取缓存数据及是否仍在有效期内
+
+        过期不超过 stale_ttl 秒的缓存仍会返回(fresh为False)，供调用方先返回旧数据再后台刷新
+        """
         if not self.enabled:
-            return None
+            return None, False
             
         cache_key = self._get_cache_key(prefix, **kwargs)
-        cache_path = self._get_cache_path(cache_key)
-        
-        if not os.path.exists(cache_path):
-            return None
+        self._sync_invalidations()
+        tier = "memory_hits"
+        entry = self.memory.get(cache_key)
+        if entry is None:
+            tier = "disk_hits"
+            entry = self.store.get(prefix, cache_key)
+            if entry is not None:
+                self.memory.set(cache_key, prefix, *entry)
+        if entry is None:
+            self._count("misses")
+            return None, False
         
         # 检查缓存是否过期
         ttl = ttl or self.default_ttl
-        file_mtime = os.path.getmtime(cache_path)
-        if time.time() - file_mtime > ttl:
+        created, payload = entry
+        age = time.time() - created
+        if age > ttl + (stale_ttl or 0):
             # 删除过期缓存
-            try:
-                os.remove(cache_path)
-            except OSError:
-                pass
-            return None
+            self._delete(prefix, cache_key)
+            self._count("misses")
+            return None, False
         
-        # 读取缓存数据
         try:
-            with open(cache_path, 'rb') as f:
-                return pickle.load(f)
-        except (pickle.PickleError, IOError, EOFError):
+            data = loads_cache_value(payload)
+        except (ValueError, KeyError, TypeError):
             # 缓存文件损坏，删除并返回None
-            try:
-                os.remove(cache_path)
-            except OSError:
-                pass
-            return None
+            self._delete(prefix, cache_key)
+            self._count("misses")
+            return None, False
+        self._count(tier)
+        if age > ttl:
+            self._count("stale_hits")
+        return data, age <= ttl
+
+    def get_or_set(self, prefix: str, func: Callable[[], Any], ttl: Optional[int] = None, stale_ttl: int = 0, **kwargs) -> Any:
+        """
+        获取缓存，未命中时调用 func 计算并写入缓存
+
+        同一个键同时只有一个线程执行 func，其他线程等待结果；
+        缓存过期但仍在 stale_ttl 内时直接返回旧数据，并在后台刷新一次
+        """
+        if not self.enabled:
+            return func()
+        data, fresh = self.get_with_state(prefix, ttl=ttl, stale_ttl=stale_ttl, **kwargs)
+        if fresh:
+            return data
+        flight_key = self._get_cache_key(prefix, **kwargs)
+
+        def load():
+            result = func()
+            if result is not None:
+                self.set(prefix, result, **kwargs)
+            return result
+        if data is not None:
+            _flight.do_background(flight_key, load)
+            return data
+        return _flight.do(flight_key, load)
     
     def set(self, prefix: str, data: Any, **kwargs) -> bool:
         """设置缓存数据"""
+        return self.set_with_tags(prefix, data, (), **kwargs)
+
+    def set_with_tags(self, prefix: str, data: Any, tags, **kwargs) -> bool:
+        """设置缓存数据，并登记到标签索引，之后可按标签清除"""
         if not self.enabled:
             return True
             
         cache_key = self._get_cache_key(prefix, **kwargs)
-        cache_path = self._get_cache_path(cache_key)
-        
         try:
-            with open(cache_path, 'wb') as f:
-                pickle.dump(data, f)
-            return True
-        except (pickle.PickleError, IOError):
+            payload = dumps_cache_value(data)
+        except (TypeError, ValueError):
             return False
+        self._count("sets")
+        saved = self.store.set(prefix, cache_key, payload)
+        self.memory.set(cache_key, prefix, time.time(), payload)
+        if tags:
+            self.store.add_tags(prefix, cache_key, tags)
+        return saved
     
     def clear(self, prefix: Optional[str] = None) -> bool:
         """清除缓存"""
+        if prefix:
+            # 清除特定前缀的缓存
+            return self.delete_pattern(prefix)
+        self.memory.clear()
         try:
-            if prefix:
-                # 清除特定前缀的缓存
-                for filename in os.listdir(self.cache_dir):
-                    if filename.startswith(f"{prefix}_") and filename.endswith('.cache'):
-                        os.remove(os.path.join(self.cache_dir, filename))
-            else:
-                # 清除所有缓存
-                for filename in os.listdir(self.cache_dir):
-                    if filename.endswith('.cache'):
-                        os.remove(os.path.join(self.cache_dir, filename))
+            # 清除所有缓存
+            self.store.clear()
             return True
         except OSError:
             return False
+        finally:
+            self._invalidated()
     
     def delete_pattern(self, pattern: str) -> bool:
-        """删除匹配模式的缓存"""
+        """删除匹配模式的缓存，只遍历匹配前缀下的缓存"""
+        self.memory.delete_pattern(pattern)
         try:
-            import glob
-            pattern_path = os.path.join(self.cache_dir, f"{pattern}_*.cache")
-            for cache_file in glob.glob(pattern_path):
-                os.remove(cache_file)
+            self.store.delete_pattern(pattern)
             return True
         except OSError:
             return False
+        finally:
+            self._invalidated()
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """删除依赖任一标签的缓存，返回删除的缓存数量"""
+        entries = set()
+        for tag in tags:
+            entries.update(self.store.pop_tag(tag))
+        for prefix, cache_key in entries:
+            self._delete(prefix, cache_key)
+        if entries:
+            self._invalidated()
+        return len(entries)
+
+    def get_stats(self) -> dict:
+        """缓存命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        return {
+            "enabled": bool(self.enabled),
+            "memory_entries": len(self.memory),
+            "memory_size": self.memory.maxsize,
+            "evictions": self.memory.evictions,
+            **stats,
+            "hit_rate": round(hits / total, 4) if total else 0,
+        }
 
 # 全局缓存实例
 view_cache = ViewCache()
 data_cache = ViewCache("data/cache/data", default_ttl=3600, enabled=True)  # 数据缓存，默认1小时
+_flight = SingleFlight()
+_async_flight = AsyncSingleFlight()
+# 当前正在渲染的缓存页面依赖的标签
+_render_tags: ContextVar[Optional[set]] = ContextVar("cache_render_tags", default=None)
 
-def cache_view(prefix: str, ttl: Optional[int] = None, key_func=None):
+
+def cache_tag(kind: str, entity_id: Any) -> str:
+    """
+    生成实体标签，如 cache_tag("article", id)、cache_tag("mp", mp_id)、cache_tag("tag", tag_id)
+
+    不带ID的 "articles"、"mps"、"tags" 表示对应的列表，新增实体时清除
+    """
+    return f"{kind}:{entity_id}"
+
+
+def add_cache_tags(*tags: str) -> None:
+    """登记当前渲染的页面依赖的标签，不在 cache_view 渲染中时忽略"""
+    current = _render_tags.get()
+    if current is not None:
+        current.update(str(tag) for tag in tags if tag)
+
+
+def invalidate_cache_tags(*tags: str) -> int:
+    """清除依赖任一标签的视图缓存"""
+    return view_cache.invalidate_tags(*tags)
+
+
+def cache_view(prefix: str, ttl: Optional[int] = None, key_func=None, stale_ttl: Optional[int] = None):
     """
     视图缓存装饰器
+
+    缓存未命中时同一页面只渲染一次，并发请求等待同一个结果；
+    缓存过期不超过 stale_ttl 秒时先返回旧页面，并在后台重新渲染；
+    渲染过程中通过 add_cache_tags 登记的标签会随缓存保存，供 invalidate_cache_tags 精确清除
     
     Args:
         prefix: 缓存前缀
         ttl: 缓存过期时间（秒），None表示使用默认值
         key_func: 自定义缓存键生成函数，接收函数参数，返回字符串
+        stale_ttl: 过期后仍可返回旧数据的时间（秒），None表示使用配置 cache.views.stale_ttl
     """
     def decorator(func):
         @wraps(func)
@@ -138,17 +685,26 @@ def cache_view(prefix: str, ttl: Optional[int] = None, key_func=None):
                 cache_key_prefix = prefix
             
             # 尝试从缓存获取
-            cached_result = view_cache.get(cache_key_prefix, ttl=ttl, **kwargs)
+            stale = stale_ttl if stale_ttl is not None else view_cache.stale_ttl
+            cached_result, fresh = view_cache.get_with_state(cache_key_prefix, ttl=ttl, stale_ttl=stale, **kwargs)
+            if cached_result is not None and fresh:
+                return cached_result
+
+            async def render():
+                # 收集渲染过程中登记的标签
+                tags = set()
+                _render_tags.set(tags)
+                # 执行原函数
+                result = await func(*args, **kwargs)
+                # 缓存结果
+                view_cache.set_with_tags(cache_key_prefix, result, tags, **kwargs)
+                return result
+
+            flight_key = view_cache._get_cache_key(cache_key_prefix, **kwargs)
             if cached_result is not None:
+                _async_flight.do_background(flight_key, render)
                 return cached_result
-            
-            # 执行原函数
-            result = await func(*args, **kwargs)
-            
-            # 缓存结果
-            view_cache.set(cache_key_prefix, result, **kwargs)
-            
-            return result
+            return await _async_flight.do(flight_key, render)
         return wrapper
     return decorator
 
@@ -158,4 +714,11 @@ def clear_cache_pattern(pattern: str) -> bool:
 
 def clear_all_cache() -> bool:
     """清除所有视图缓存"""
-    return view_cache.clear()
\ No newline at end of file
+    return view_cache.clear()
+
+def get_cache_stats() -> dict:
+    """视图缓存和数据缓存的命中统计"""
+    return {
+        "views": view_cache.get_stats(),
+        "data": data_cache.get_stats(),
+    }
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+正文转换进程池
+
+HTML清理、Markdown转换和DOCX生成都是纯CPU计算，在API或队列线程中执行会长时间占用GIL。
+这里把转换任务描述为可序列化的 ContentJob(转换名称+正文+参数)，交给独立进程执行，
+调用方等待结果时不占用GIL；同时在途任务数有上限，超过时提交方阻塞等待(背压)。
+
+配置:
+    - content_pool.workers: 进程数，0为在当前进程执行
+    - content_pool.max_pending: 在途任务上限
+    - content_pool.min_size: 正文小于该长度(字符)时直接在当前进程转换
+    - content_pool.timeout: 等待单个任务的超时(秒)
+"""
+import atexit
+import importlib
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from core.config import cfg
+from core.print import print_info, print_warning
+
+# 转换名称 -> "模块:函数"，worker 进程按名称导入，函数签名为 func(content, **options)
+TRANSFORMS = {
+    "fix_html": "tools.fix:fix_html",
+    "format_content": "core.content_format:format_content",
+    "derive_content": "core.article_content:derive_content",
+    "derive_text": "core.article_content:derive_text",
+    "md2html": "tools.mdtools.md2html:convert_markdown_to_html",
+    "md2docx": "tools.mdtools.md2doc:convert_markdown_to_docx",
+    "md2docx_bytes": "tools.mdtools.md2doc:convert_markdown_to_docx_bytes",
+}
+
+_resolved: dict[str, Callable] = {}
+
+
+@dataclass(frozen=True)
+class ContentJob:
+    """可序列化的转换任务"""
+    transform: str
+    content: str
+    options: dict = field(default_factory=dict)
+
+
+def resolve_transform(name: str) -> Callable:
+    func = _resolved.get(name)
+    if func is None:
+        target = TRANSFORMS.get(name)
+        if target is None:
+            raise KeyError(f"未注册的正文转换: {name}")
+        module, attr = target.split(":")
+        func = getattr(importlib.import_module(module), attr)
+        _resolved[name] = func
+    return func
+
+
+def run_job(job: ContentJob):
+    """在 worker 进程中执行转换"""
+    return resolve_transform(job.transform)(job.content, **job.options)
+
+
+class ContentPool:
+    def __init__(self, workers: int = 2, max_pending: int = 64, min_size: int = 2000, timeout: float = 120):
+        self.workers = max(0, workers)
+        self.min_size = max(0, min_size)
+        self.timeout = timeout
+        self.max_pending = max(1, max_pending)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._stats = {"submitted": 0, "inline": 0, "failed": 0, "restarted": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 使用 spawn，避免在多线程进程中 fork 继承锁状态
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+                print_info(f"正文转换进程池已启动，进程数: {self.workers}")
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._stats["restarted"] += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_inline(self, job: ContentJob) -> Future:
+        future = Future()
+        with self._lock:
+            self._stats["inline"] += 1
+        try:
+            future.set_result(run_job(job))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def submit(self, transform: str, content: str, **options) -> Future:
+        """提交转换任务，在途任务达到上限时阻塞"""
+        job = ContentJob(transform, content or "", options)
+        if self.workers <= 0 or len(job.content) < self.min_size:
+            return self._run_inline(job)
+        self._slots.acquire()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(run_job, job)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._slots.release()
+            print_warning(f"正文转换进程池不可用，改为当前进程执行: {e}")
+            self._reset(executor)
+            return self._run_inline(job)
+        with self._lock:
+            self._stats["submitted"] += 1
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, transform: str, content: str, **options):
+        """执行转换并等待结果，进程池异常时在当前进程重试"""
+        future = self.submit(transform, content, **options)
+        try:
+            return future.result(timeout=self.timeout)
+        except BrokenProcessPool as e:
+            # worker 进程异常退出(如内存不足)，重建进程池
+            print_warning(f"正文转换进程异常退出，改为当前进程执行: {e}")
+            executor = self._executor
+            if executor is not None:
+                self._reset(executor)
+            return run_job(ContentJob(transform, content or "", options))
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+
+    def map(self, transform: str, contents: list, **options) -> list:
+        """并行转换多篇正文，返回与输入顺序一致的结果，失败的项为异常对象"""
+        futures = [self.submit(transform, content, **options) for content in contents]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=self.timeout))
+            except Exception as e:
+                with self._lock:
+                    self._stats["failed"] += 1
+                results.append(e)
+        return results
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_info(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._executor is not None,
+                "pending": self.max_pending - self._slots._value,
+                **self._stats,
+            }
+
+
+content_pool = ContentPool(
+    workers=int(cfg.get("content_pool.workers", 2)),
+    max_pending=int(cfg.get("content_pool.max_pending", 64)),
+    min_size=int(cfg.get("content_pool.min_size", 2000)),
+    timeout=float(cfg.get("content_pool.timeout", 120)),
+)
+atexit.register(content_pool.shutdown)
@@ -66,6 +66,12 @@ class Db:
             alter_statements = []
             if "is_favorite" not in columns:
                 alter_statements.append("ALTER TABLE articles ADD COLUMN is_favorite INTEGER DEFAULT 0")
+            text_type = "MEDIUMTEXT" if self.engine.dialect.name == "mysql" else "TEXT"
+            for column in ("content_text", "content_markdown"):
+                if column not in columns:
+                    alter_statements.append(f"ALTER TABLE articles ADD COLUMN {column} {text_type}")
+            if "content_html_version" not in columns:
+                alter_statements.append("ALTER TABLE articles ADD COLUMN content_html_version INTEGER")
 
             if not alter_statements:
                 return
@@ -188,10 +194,7 @@ class Db:
             art.updated_at = _to_unix_seconds(art.updated_at)
             art.updated_at_millis = _to_unix_millis(art.updated_at_millis, art.updated_at)
             art.content=art.content
-
-            if art.content_html is None:
-                from tools.fix import fix_html
-                art.content_html = fix_html(art.content)
+            # content_html 在首次读取时生成(tools.fix.get_content_html)
             from core.models.base import DATA_STATUS
             art.status=DATA_STATUS.ACTIVE
             session.add(art)
@@ -319,3 +322,10 @@ class Db:
 # 全局数据库实例
 DB = Db(User_In_Thread=True)
 DB.init(cfg.get("db"))
+
+# 注册文章写入时生成纯文本、Markdown和摘要的事件
+import core.article_content
+# 注册文章写入时维护公众号文章统计的事件
+import core.feed_stats
+# 注册文章写入时更新全文检索索引的事件
+import core.search
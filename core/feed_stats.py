@@ -0,0 +1,239 @@
+"""
+公众号文章统计 (feed_stats)
+
+文章的新增、删除、状态和内容变更通过 ORM 事件记录为增量，
+合并后定时写入 feed_stats 表，统计信息读取时只需汇总 feed_stats。
+批量 SQL 删除/更新不会触发 ORM 事件，由定时全量校正任务修正偏差。
+"""
+import atexit
+import threading
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event, func, case, and_
+from sqlalchemy.orm.attributes import get_history
+from core.models.article import Article
+from core.models.base import DATA_STATUS
+from core.models.feed_stats import FeedStats
+from core.print import print_error, print_info, print_success
+
+# 增量合并后写入数据库的间隔(秒)
+FLUSH_DELAY = 5
+
+# 公众号ID -> [文章数, 有内容数, 非正常状态数, 最新发布时间]
+_pending: dict[str, list] = {}
+_lock = threading.Lock()
+# 写入增量和全量校正互斥，避免校正结果被重复叠加
+_flush_lock = threading.Lock()
+_timer: Optional[threading.Timer] = None
+
+
+def _has_content(content) -> bool:
+    return content is not None and content != ''
+
+
+def _is_inactive(status) -> bool:
+    return (status if status is not None else DATA_STATUS.ACTIVE) != DATA_STATUS.ACTIVE
+
+
+def _old_value(target, key: str):
+    """返回 (是否已知, 修改前的值)"""
+    history = get_history(target, key)
+    if history.deleted:
+        return True, history.deleted[0]
+    if history.unchanged:
+        return True, history.unchanged[0]
+    if not history.added and key in target.__dict__:
+        return True, target.__dict__[key]
+    return False, None
+
+
+def _record(mp_id, total: int = 0, content: int = 0, deleted: int = 0, publish_time=None) -> None:
+    global _timer
+    if not (total or content or deleted or publish_time):
+        return
+    with _lock:
+        delta = _pending.setdefault(str(mp_id or ''), [0, 0, 0, 0])
+        delta[0] += total
+        delta[1] += content
+        delta[2] += deleted
+        if publish_time and publish_time > delta[3]:
+            delta[3] = publish_time
+        if _timer is None:
+            _timer = threading.Timer(FLUSH_DELAY, flush_feed_stats)
+            _timer.daemon = True
+            _timer.start()
+
+
+# 数据库连接使用 AUTOCOMMIT，语句执行后即已生效，因此在 flush 阶段记录增量
+@event.listens_for(Article, 'after_insert')
+def _after_insert(mapper, connection, target):
+    _record(target.mp_id, total=1,
+            content=1 if _has_content(target.content) else 0,
+            deleted=1 if _is_inactive(target.status) else 0,
+            publish_time=target.publish_time)
+
+
+@event.listens_for(Article, 'after_delete')
+def _after_delete(mapper, connection, target):
+    _, mp_id = _old_value(target, 'mp_id')
+    known_content, content = _old_value(target, 'content')
+    known_status, status = _old_value(target, 'status')
+    _record(mp_id if mp_id is not None else target.mp_id, total=-1,
+            content=-1 if known_content and _has_content(content) else 0,
+            deleted=-1 if known_status and _is_inactive(status) else 0)
+
+
+@event.listens_for(Article, 'after_update')
+def _after_update(mapper, connection, target):
+    known_mp, old_mp_id = _old_value(target, 'mp_id')
+    if known_mp and old_mp_id != target.mp_id:
+        # 文章转移到其他公众号，按删除+新增处理
+        known_content, content = _old_value(target, 'content')
+        known_status, status = _old_value(target, 'status')
+        _record(old_mp_id, total=-1,
+                content=-1 if known_content and _has_content(content) else 0,
+                deleted=-1 if known_status and _is_inactive(status) else 0)
+        _after_insert(mapper, connection, target)
+        return
+    content_delta = 0
+    if get_history(target, 'content').added:
+        known, content = _old_value(target, 'content')
+        if known:
+            content_delta = int(_has_content(target.content)) - int(_has_content(content))
+    deleted_delta = 0
+    if get_history(target, 'status').added:
+        known, status = _old_value(target, 'status')
+        if known:
+            deleted_delta = int(_is_inactive(target.status)) - int(_is_inactive(status))
+    publish_time = target.publish_time if get_history(target, 'publish_time').added else None
+    _record(target.mp_id, content=content_delta, deleted=deleted_delta, publish_time=publish_time)
+
+
+def _merge_back(pending: dict) -> None:
+    with _lock:
+        for mp_id, (total, content, deleted, last_publish) in pending.items():
+            delta = _pending.setdefault(mp_id, [0, 0, 0, 0])
+            delta[0] += total
+            delta[1] += content
+            delta[2] += deleted
+            delta[3] = max(delta[3], last_publish)
+
+
+def flush_feed_stats() -> int:
+    """把内存中的增量写入 feed_stats，返回更新的公众号数量"""
+    global _timer
+    from core.db import DB
+    with _flush_lock:
+        with _lock:
+            pending = dict(_pending)
+            _pending.clear()
+            _timer = None
+        if not pending:
+            return 0
+        session = DB.get_session()
+        try:
+            now = datetime.now()
+            stats = {s.mp_id: s for s in session.query(FeedStats).filter(FeedStats.mp_id.in_(list(pending.keys()))).all()}
+            for mp_id, (total, content, deleted, last_publish) in pending.items():
+                row = stats.get(mp_id)
+                if row is None:
+                    session.add(FeedStats(mp_id=mp_id, total_count=max(total, 0), content_count=max(content, 0),
+                                          deleted_count=max(deleted, 0), last_publish=last_publish, updated_at=now))
+                    continue
+                # 使用SQL表达式累加，避免多进程同时更新时互相覆盖
+                row.total_count = FeedStats.total_count + total
+                row.content_count = FeedStats.content_count + content
+                row.deleted_count = FeedStats.deleted_count + deleted
+                if last_publish and last_publish > (row.last_publish or 0):
+                    row.last_publish = last_publish
+                row.updated_at = now
+            session.commit()
+            return len(pending)
+        except Exception as e:
+            session.rollback()
+            _merge_back(pending)
+            print_error(f"更新公众号文章统计失败: {e}")
+            return 0
+
+
+# 退出时写入尚未保存的增量
+atexit.register(flush_feed_stats)
+
+
+def reconcile_feed_stats() -> int:
+    """按 articles 表全量重新统计，修正增量维护产生的偏差，返回公众号数量"""
+    from core.db import DB
+    with _flush_lock:
+        # 全量统计会包含尚未写入的增量
+        with _lock:
+            _pending.clear()
+        session = DB.get_session()
+        try:
+            rows = session.query(
+                Article.mp_id,
+                func.count(Article.id),
+                func.sum(case((and_(Article.content != None, Article.content != ''), 1), else_=0)),
+                func.sum(case((Article.status != DATA_STATUS.ACTIVE, 1), else_=0)),
+                func.max(Article.publish_time)
+            ).group_by(Article.mp_id).all()
+            now = datetime.now()
+            stats = {s.mp_id: s for s in session.query(FeedStats).all()}
+            seen = set()
+            for mp_id, total, content, deleted, last_publish in rows:
+                mp_id = str(mp_id or '')
+                # mp_id为空和为''的文章合并到同一行
+                if mp_id in seen:
+                    row = stats[mp_id]
+                    row.total_count += int(total or 0)
+                    row.content_count += int(content or 0)
+                    row.deleted_count += int(deleted or 0)
+                    row.last_publish = max(row.last_publish or 0, int(last_publish or 0))
+                    continue
+                seen.add(mp_id)
+                row = stats.get(mp_id)
+                if row is None:
+                    row = FeedStats(mp_id=mp_id)
+                    session.add(row)
+                    stats[mp_id] = row
+                row.total_count = int(total or 0)
+                row.content_count = int(content or 0)
+                row.deleted_count = int(deleted or 0)
+                row.last_publish = int(last_publish or 0)
+                row.updated_at = now
+            for mp_id, row in stats.items():
+                if mp_id not in seen:
+                    session.delete(row)
+            session.commit()
+            print_success(f"公众号文章统计校正完成，共{len(seen)}个公众号")
+            return len(seen)
+        except Exception as e:
+            session.rollback()
+            print_error(f"公众号文章统计校正失败: {e}")
+            return 0
+
+
+def get_feed_stats_summary() -> dict:
+    """汇总所有公众号的文章统计"""
+    from core.db import DB
+    session = DB.get_session()
+    total, content, deleted, feeds = session.query(
+        func.coalesce(func.sum(FeedStats.total_count), 0),
+        func.coalesce(func.sum(FeedStats.content_count), 0),
+        func.coalesce(func.sum(FeedStats.deleted_count), 0),
+        func.count(FeedStats.mp_id)
+    ).one()
+    return {
+        "total_count": int(total),
+        "content_count": int(content),
+        "deleted_count": int(deleted),
+        "feed_count": int(feeds),
+    }
+
+
+def ensure_feed_stats() -> None:
+    """feed_stats 为空时(首次升级)执行一次全量统计"""
+    from core.db import DB
+    session = DB.get_session()
+    if session.query(FeedStats.mp_id).first() is None and session.query(Article.id).first() is not None:
+        print_info("初始化公众号文章统计")
+        reconcile_feed_stats()
@@ -0,0 +1,299 @@
+"""
+文章HTML处理流水线
+
+文章内容只解析一次为 lxml 树，图片修正、元素清理、空元素移除等处理
+作为注册的处理步骤(pass)依次修改同一棵树，最后只序列化一次；
+纯文本、摘要和Markdown也直接由这棵树生成，不再反复解析HTML。
+
+用法:
+    doc = HtmlDocument(content)
+    doc.apply("fix_images").apply("remove_empty")
+    html = doc.html()
+"""
+import html as html_lib
+import re
+from typing import Callable, Optional
+from lxml import etree, html as lxml_html
+from core.print import print_error, print_info, print_warning
+
+# 处理步骤: 名称 -> 函数(根元素, **参数)，原地修改树
+PASSES: dict[str, Callable] = {}
+
+# 媒体标签，即使没有文本也保留
+MEDIA_TAGS = frozenset(['img', 'video', 'audio', 'picture', 'source', 'track', 'canvas', 'svg', 'iframe', 'embed', 'object'])
+# 移除空元素时保留的标签
+KEEP_EMPTY_TAGS = MEDIA_TAGS | {'br', 'hr'}
+# 提取文本时跳过的标签
+SKIP_TEXT_TAGS = frozenset(['script', 'style', 'noscript', 'template'])
+# 转换Markdown前去掉外层、只保留内容的标签
+MARKDOWN_UNWRAP_TAGS = ('span', 'font', 'div', 'strong', 'b')
+MARKDOWN_DROP_ATTRS = ('style', 'class', 'data-pm-slice', 'data-title')
+
+_XML_DECL_RE = re.compile(r'^\s*<\?xml[^>]*\?>', re.IGNORECASE)
+_DOCUMENT_RE = re.compile(r'^\s*(<!doctype[^>]*>\s*)?<html[\s>]', re.IGNORECASE)
+_WIDTH_RE = re.compile(r'width\s*:\s*\d+\s*px')
+_SIMPLE_SELECTOR_RE = re.compile(r'^([a-zA-Z][\w-]*)?(?:#([\w-]+))?(?:\.([\w-]+))?$')
+
+
+def register_pass(name: str):
+    """注册处理步骤"""
+    def decorator(func: Callable) -> Callable:
+        PASSES[name] = func
+        return func
+    return decorator
+
+
+def _parse(content: str):
+    content = _XML_DECL_RE.sub('', content or '')
+    if not content.strip():
+        return lxml_html.Element('div')
+    if _DOCUMENT_RE.match(content):
+        # 完整页面只保留 body
+        doc = lxml_html.document_fromstring(content)
+        body = doc.find('body')
+        return body if body is not None else doc
+    return lxml_html.fragment_fromstring(content, create_parent='div')
+
+
+def _elements(root):
+    """遍历所有子元素(不含根元素和注释)"""
+    return [el for el in root.iter(etree.Element) if el is not root]
+
+
+def _has_class(el, name: str) -> bool:
+    return name in (el.get('class') or '').split()
+
+
+def _drop(root, elements) -> int:
+    count = 0
+    for el in elements:
+        # 已随父元素移除的跳过
+        if el is root or root not in el.iterancestors():
+            continue
+        el.drop_tree()
+        count += 1
+    return count
+
+
+class HtmlDocument:
+    """解析一次的HTML文档"""
+
+    def __init__(self, content: str = '', root=None):
+        self.root = root if root is not None else _parse(content)
+
+    @classmethod
+    def extract(cls, content: str, element_id: str) -> Optional['HtmlDocument']:
+        """从完整页面中取出指定id的元素，找不到时返回None"""
+        found = lxml_html.document_fromstring(_XML_DECL_RE.sub('', content or '') or '<html></html>').get_element_by_id(element_id, None)
+        return cls(root=found) if found is not None else None
+
+    def apply(self, name: str, **options) -> 'HtmlDocument':
+        """执行一个处理步骤"""
+        func = PASSES.get(name)
+        if func is None:
+            raise KeyError(f"未注册的HTML处理步骤: {name}")
+        func(self.root, **options)
+        return self
+
+    def html(self) -> str:
+        """序列化根元素的内容"""
+        parts = [html_lib.escape(self.root.text, quote=False)] if self.root.text else []
+        parts.extend(etree.tostring(child, encoding='unicode', method='html') for child in self.root)
+        return ''.join(parts)
+
+    def outer_html(self) -> str:
+        """序列化根元素本身"""
+        return etree.tostring(self.root, encoding='unicode', method='html', with_tail=False)
+
+    def raw_text(self) -> str:
+        parts = []
+        _collect_text(self.root, parts)
+        return ''.join(parts)
+
+    def text(self) -> str:
+        """纯文本，合并空行"""
+        return re.sub(r'\n\s*\n', '\n', self.raw_text().strip())
+
+    def description(self, length: int = 200) -> str:
+        """单行摘要，超过长度截断"""
+        text = self.raw_text().strip().strip("\n").replace("\n", " ").replace("\r", " ")
+        return text[:length] + "..." if len(text) > length else text
+
+    def markdown(self) -> str:
+        """转换为Markdown，会修改当前文档"""
+        self.apply("markdown_prepare")
+        content = self.html()
+        # 替换 p 标签中的换行符为空
+        content = re.sub(r'(<p[^>]*>)([\s\S]*?)(<\/p>)', lambda m: m.group(1) + re.sub(r'\n', '', m.group(2)) + m.group(3), content)
+        content = re.sub(r'\n\s*\n\s*\n+', '\n', content)
+        content = re.sub(r'\*', '', content)
+        from markdownify import markdownify as md
+        content = md(content, heading_style="ATX", bullets='-*+', code_language='python')
+        return re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
+
+
+def _collect_text(el, parts: list) -> None:
+    if el.text:
+        parts.append(el.text)
+    for child in el:
+        if isinstance(child.tag, str) and child.tag not in SKIP_TEXT_TAGS:
+            _collect_text(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+
+
+@register_pass("fix_images")
+def fix_images(root, width: str = '1080px') -> None:
+    """使用 data-src 作为图片地址，固定像素宽度替换为 width"""
+    root.attrib.pop('style', None)
+    for img in root.iter('img'):
+        src = img.attrib.pop('data-src', None)
+        if src is not None:
+            img.set('src', src)
+        style = img.get('style')
+        if style is not None:
+            img.set('style', _WIDTH_RE.sub(f'width: {width}', style))
+
+
+@register_pass("proxy_images")
+def proxy_images(root, url_func: Callable[[str], str], width: str = '100%') -> None:
+    """图片地址替换为代理地址"""
+    root.attrib.pop('style', None)
+    for img in root.iter('img'):
+        src = img.get('src')
+        if src is not None:
+            img.set('src', url_func(src))
+        style = img.get('style')
+        if style is not None:
+            img.set('style', _WIDTH_RE.sub(f'width: {width}', style))
+
+
+def _select_css(root, selector: str) -> list:
+    try:
+        from lxml.cssselect import CSSSelector
+        return CSSSelector(selector)(root)
+    except ImportError:
+        pass
+    # 未安装 cssselect 时只支持 tag、#id、.class 及其组合
+    m = _SIMPLE_SELECTOR_RE.match(selector.strip())
+    if not m or not any(m.groups()):
+        print_warning(f"不支持的CSS选择器(需要安装cssselect): {selector}")
+        return []
+    tag, id_, cls = m.groups()
+    return [el for el in _elements(root)
+            if (not tag or el.tag == tag.lower())
+            and (not id_ or el.get('id') == id_)
+            and (not cls or _has_class(el, cls))]
+
+
+@register_pass("remove_elements")
+def remove_elements(root, selectors: list) -> int:
+    """
+    移除选择器匹配的元素
+
+    selectors 每项可以是：
+        - 字符串：id选择器
+        - 字典：包含'selector'和'type'键，type支持 "css"、"xpath"、"id"、"class"
+        - 元组：(selector, type)
+    """
+    removed_count = 0
+    for item in selectors or []:
+        if isinstance(item, dict):
+            selector, selector_type = item.get('selector', ''), item.get('type', 'id')
+        elif isinstance(item, tuple) and len(item) >= 2:
+            selector, selector_type = item[0], item[1]
+        else:
+            selector, selector_type = item, 'id'
+        if not selector:
+            continue
+        try:
+            if selector_type == "css":
+                elements = _select_css(root, selector)
+            elif selector_type == "xpath":
+                elements = [el for el in root.xpath(selector) if hasattr(el, 'tag')]
+            elif selector_type == "id":
+                elements = [el for el in _elements(root) if el.get('id') == selector]
+            elif selector_type == "class":
+                elements = [el for el in _elements(root) if _has_class(el, selector)]
+            else:
+                print_warning(f"不支持的选择器类型: {selector_type}")
+                continue
+            removed_count += _drop(root, elements)
+        except Exception as e:
+            print_error(f"移除元素失败 (选择器: {selector}, 类型: {selector_type}): {e}")
+    if removed_count > 0:
+        print_info(f"成功移除 {removed_count} 个HTML元素")
+    return removed_count
+
+
+@register_pass("remove_by_attributes")
+def remove_by_attributes(root, attributes: list) -> int:
+    """
+    根据属性移除元素
+
+    attributes 格式为 [{'name': 'attr_name', 'value': 'attr_value', 'eq': False}]，
+    只提供name时移除所有包含该属性的元素，eq为真时属性值需完全相等，否则按包含匹配
+    """
+    elements = []
+    for attr in attributes or []:
+        if not isinstance(attr, dict) or not attr.get('name'):
+            continue
+        name, value, eq = attr['name'], attr.get('value'), attr.get('eq')
+        for el in _elements(root):
+            current = el.get(name)
+            if current is None:
+                continue
+            if not value or (current == value if eq else value in current):
+                elements.append(el)
+    removed_count = _drop(root, elements)
+    if removed_count > 0:
+        print_info(f"根据属性成功移除 {removed_count} 个HTML元素")
+    return removed_count
+
+
+def _strip_empty(el, removed: list) -> bool:
+    """移除没有文本的子元素，返回元素是否有可见内容"""
+    visible = bool(el.text and el.text.strip())
+    for child in list(el):
+        if isinstance(child.tag, str):
+            if child.tag in KEEP_EMPTY_TAGS or _strip_empty(child, removed):
+                visible = True
+            else:
+                tail = bool(child.tail and child.tail.strip())
+                child.drop_tree()
+                removed.append(1)
+                visible = visible or tail
+                continue
+        if child.tail and child.tail.strip():
+            visible = True
+    return visible
+
+
+@register_pass("remove_empty")
+def remove_empty(root) -> int:
+    """移除空文本元素，媒体标签及包含媒体的元素保留"""
+    removed = []
+    _strip_empty(root, removed)
+    if removed:
+        print_info(f"成功移除 {len(removed)} 个空文本元素")
+    return len(removed)
+
+
+@register_pass("markdown_prepare")
+def markdown_prepare(root) -> None:
+    """去除只影响样式的标签和属性，图片title作为alt"""
+    for el in _elements(root):
+        if el.tag in MARKDOWN_UNWRAP_TAGS:
+            el.drop_tag()
+    for el in root.iter(etree.Element):
+        for name in MARKDOWN_DROP_ATTRS:
+            el.attrib.pop(name, None)
+        if el.tag == 'img' and 'title' in el.attrib:
+            el.set('alt', el.get('title'))
+
+
+def html_description(content: str, length: int = 200) -> str:
+    """HTML正文生成单行摘要"""
+    if not content:
+        return ""
+    return HtmlDocument(content).description(length)
@@ -0,0 +1,382 @@
+"""
+模板渲染基准测试
+
+渲染 jobs/webhook.py 中的默认模板、public/templates 下的页面模板
+以及几种常见的自定义RSS模板，分别使用 10/100/1000 篇文章的合成数据，
+输出每秒渲染次数(ops/sec)和单次渲染的内存峰值。
+
+用法:
+    python -m core.lax.benchmark                 # 运行并与基线对比
+    python -m core.lax.benchmark --save          # 运行并保存为新基线
+    python -m core.lax.benchmark --sizes 10 100 --filter webhook
+
+基线与机器相关，请在同一台机器上保存和对比。
+任一用例比基线慢超过 --threshold 时退出码为1，可作为性能回归门禁。
+"""
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from core.lax.template_parser import TemplateParser
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PUBLIC_TEMPLATE_DIR = os.path.join(ROOT_DIR, "public", "templates")
+WEBHOOK_SOURCE = os.path.join(ROOT_DIR, "jobs", "webhook.py")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_SIZES = [10, 100, 1000]
+
+SITE = {
+    "name": "WeRss",
+    "description": "A WeChat Official Account RSS Reader",
+    "keywords": "WeRss,RSS",
+    "logo": "/static/logo.svg",
+    "favicon": "/static/logo.svg",
+    "author": "WeRss Team",
+    "copyright": "© 2024 WeRss Team",
+}
+
+# 常见的自定义RSS模板 (rss.generate_by_template)
+RSS_TEMPLATES = {
+    "rss_xml": """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+<channel>
+  <title>{{ title }}</title>
+  <link>{{ link }}</link>
+  <description>{{ description }}</description>
+  <language>{{ language }}</language>
+  {% for article in articles %}
+  <item>
+    <title>{{ article.title }}</title>
+    <link>{{ article.link }}</link>
+    <description><![CDATA[{{ article.description }}]]></description>
+    <content:encoded><![CDATA[{{ article.content }}]]></content:encoded>
+    <author>{{ article.mp_name }}</author>
+    <pubDate>{{ article.updated }}</pubDate>
+    {% if article.image %}<enclosure url="{{ article.image }}" type="image/jpeg"/>{% endif %}
+  </item>
+  {% endfor %}
+</channel>
+</rss>""",
+    "json_feed": """{
+  "version": "https://jsonfeed.org/version/1.1",
+  "title": "{{ title }}",
+  "home_page_url": "{{ link }}",
+  "items": [
+  {% for article in articles %}
+    {
+      "id": "{{ article.id }}",
+      "url": "{{ article.link }}",
+      "title": "{{ article.title }}",
+      "summary": "{{ article.description or article.title }}",
+      "image": "{{ article.image }}",
+      "author": {"name": "{{ article.feed.name }}"}
+    }{% if not loop.last %},{% endif %}
+  {% endfor %}
+  ]
+}""",
+    "markdown": """# {{ title }}
+{% for article in articles %}
+## {{ loop.index }}. [{{ article.title }}]({{ article.link }})
+{% if article.description %}> {{ article.description }}{% endif %}
+{{= upper(article.mp_name) }} · {{ article.updated }}
+{% endfor %}""",
+}
+
+
+def load_webhook_templates() -> Dict[str, str]:
+    """读取 jobs/webhook.py 中的默认模板，不导入任务模块本身"""
+    with open(WEBHOOK_SOURCE, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    templates = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name.startswith("DEFAULT_") and name.endswith("_TEMPLATE"):
+                templates[name[len("DEFAULT_"):-len("_TEMPLATE")].lower()] = ast.literal_eval(node.value)
+    return templates
+
+
+def make_articles(count: int) -> List[Dict[str, Any]]:
+    """生成与视图、webhook数据结构一致的合成文章"""
+    base_time = datetime(2025, 1, 1, 8, 0, 0)
+    articles = []
+    for i in range(count):
+        publish_time = base_time + timedelta(minutes=i * 37)
+        mp_id = f"MP_WXS_{i % 20:04d}"
+        articles.append({
+            "id": f"{mp_id}-{i:06d}",
+            "mp_id": mp_id,
+            "title": f"公众号文章标题 {i} - 性能测试",
+            "description": f"第{i}篇文章的摘要内容，用于模板渲染基准测试。" * 3,
+            "pic_url": f"https://mmbiz.qpic.cn/mmbiz_jpg/{i:08x}/0?wx_fmt=jpeg",
+            "url": f"https://mp.weixin.qq.com/s/{i:012x}",
+            "publish_time": publish_time.strftime("%Y-%m-%d %H:%M"),
+            "created_at": publish_time.strftime("%Y-%m-%d %H:%M"),
+            "content": "<p>正文段落</p>" * 20,
+            "mp_name": f"测试公众号{i % 20}",
+            "mp_cover": f"https://mmbiz.qpic.cn/mmhead/{i % 20:08x}/0",
+            "is_read": i % 3 == 0,
+        })
+    return articles
+
+
+def _pagination(count: int, base_url: str, item_name: str) -> Dict[str, Any]:
+    return {
+        "current_page": 2,
+        "total_pages": max(3, count // 10),
+        "total_items": count * 3,
+        "limit": count,
+        "has_prev": True,
+        "has_next": True,
+        "prev_page": 1,
+        "next_page": 3,
+        "base_url": base_url,
+        "item_name": item_name,
+    }
+
+
+def _feeds(count: int) -> List[Dict[str, Any]]:
+    return [{
+        "id": f"MP_WXS_{i:04d}",
+        "name": f"测试公众号{i}",
+        "cover": f"https://mmbiz.qpic.cn/mmhead/{i:08x}/0",
+        "intro": f"公众号{i}的简介，" * (i % 4 + 1),
+        "mp_count": 1,
+        "article_count": i * 7,
+        "sync_time": "2025-01-01 08:00",
+        "created_at": "2025-01-01",
+    } for i in range(count)]
+
+
+def _tags(count: int) -> List[Dict[str, Any]]:
+    return [{
+        "id": f"tag-{i}",
+        "name": f"标签{i}",
+        "cover": "",
+        "intro": f"标签{i}的简介",
+        "mp_count": i % 5,
+        "article_count": i * 11,
+        "sync_time": "未同步",
+        "created_at": "2025-01-01",
+    } for i in range(count)]
+
+
+def webhook_context(count: int) -> Dict[str, Any]:
+    return {
+        "feed": {"id": "MP_WXS_0001", "mp_name": "测试公众号"},
+        "articles": make_articles(count),
+        "task": {"id": "task-1", "name": "基准测试任务"},
+        "now": "2025-01-01 08:00:00",
+    }
+
+
+def rss_context(count: int) -> Dict[str, Any]:
+    rss_list = [{
+        "id": a["id"],
+        "title": a["title"],
+        "link": a["url"],
+        "description": a["description"],
+        "content": a["content"],
+        "image": a["pic_url"],
+        "mp_name": a["mp_name"],
+        "updated": datetime(2025, 1, 1, 8, 0, 0),
+        "feed": {"id": a["mp_id"], "name": a["mp_name"], "cover": a["mp_cover"], "intro": ""},
+    } for a in make_articles(count)]
+    return {
+        "articles": rss_list,
+        "title": "WeRss",
+        "link": "http://localhost:8001/",
+        "description": "WeRss高效订阅我的公众号",
+        "language": "zh-CN",
+        "image_url": "",
+    }
+
+
+def view_context(name: str, count: int) -> Dict[str, Any]:
+    """按 views/ 中各页面传给模板的数据结构构造上下文"""
+    articles = make_articles(count)
+    if name == "home":
+        return {
+            "site": SITE,
+            "tags": {"tags": _tags(count), **_pagination(count, "/views/home", "个标签")},
+            "mps": {"feeds": _feeds(count), **_pagination(count, "/views/mps", "个公众号")},
+        }
+    if name == "mps":
+        return {"site": SITE, "feeds": _feeds(count), "breadcrumb": [{"name": "公众号", "url": "/views/mps"}],
+                **_pagination(count, "/views/mps", "个公众号")}
+    if name == "tags":
+        return {"site": SITE, "tags": _tags(count), "breadcrumb": [{"name": "标签", "url": None}],
+                **_pagination(count, "/views/tags", "个标签")}
+    if name == "tags_articles":
+        return {
+            "site": SITE,
+            "tag": {"id": "tag-1", "name": "标签1", "cover": "", "intro": "简介", "mp_count": 3,
+                    "article_count": count, "sync_time": "未同步", "mps": _feeds(3)},
+            "articles": articles,
+            "breadcrumb": [{"name": "标签1", "url": None}],
+            "keyword": "",
+            **_pagination(count, "/views/tag/tag-1", "篇文章"),
+        }
+    if name == "articles":
+        return {
+            "site": SITE,
+            "articles": articles,
+            "filter_info": {},
+            "tag_options": [{"id": t["id"], "name": t["name"]} for t in _tags(20)],
+            "mp_options": [{"id": f["id"], "name": f["name"], "article_count": f["article_count"]} for f in _feeds(10)],
+            "info": {},
+            "current_filters": {"mp_id": "", "tag_id": "", "keyword": "", "sort": "publish_time", "order": "desc"},
+            "breadcrumb": [{"name": "文章列表", "url": None}],
+            **_pagination(count, "/views/articles", "篇文章"),
+        }
+    if name == "article_detail":
+        # 详情页的数据量体现在正文长度上
+        article = dict(articles[0] if articles else make_articles(1)[0])
+        article["content"] = "<p>正文段落，包含<img src=\"/static/res/logo/x.jpg\">图片</p>" * count
+        article["mp_intro"] = "公众号简介"
+        return {
+            "site": SITE,
+            "article": article,
+            "related_articles": articles[1:6],
+            "prev_article": {"id": "prev", "title": "上一篇"},
+            "next_article": {"id": "next", "title": "下一篇"},
+            "breadcrumb": [{"name": article["mp_name"], "url": "/views/articles"}, {"name": article["title"], "url": None}],
+        }
+    raise ValueError(f"未知的页面模板: {name}")
+
+
+def collect_cases() -> List[Dict[str, Any]]:
+    """收集所有基准用例: name, template, template_dir, context(count)"""
+    cases = []
+    for name, template in load_webhook_templates().items():
+        cases.append({"name": f"webhook/{name}", "template": template, "template_dir": None, "context": webhook_context})
+    for file_name in sorted(os.listdir(PUBLIC_TEMPLATE_DIR)):
+        if not file_name.endswith(".html"):
+            continue
+        name = file_name[:-len(".html")]
+        with open(os.path.join(PUBLIC_TEMPLATE_DIR, file_name), "r", encoding="utf-8") as f:
+            template = f.read()
+        cases.append({"name": f"views/{name}", "template": template, "template_dir": PUBLIC_TEMPLATE_DIR + os.sep,
+                      "context": lambda count, name=name: view_context(name, count)})
+    for name, template in RSS_TEMPLATES.items():
+        cases.append({"name": f"rss/{name}", "template": template, "template_dir": None, "context": rss_context})
+    return cases
+
+
+def measure(template: str, template_dir: Optional[str], context: Dict[str, Any], seconds: float) -> Dict[str, float]:
+    """测量单个用例的渲染速度和内存峰值"""
+    # 每次渲染使用上下文的浅拷贝，避免模板中的set语句影响下一次渲染
+    parser = TemplateParser(template, template_dir=template_dir)
+    parser.render(dict(context))
+
+    runs = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        parser.render(dict(context))
+        runs += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+    elapsed = now - start
+
+    tracemalloc.start()
+    try:
+        parser.render(dict(context))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_sec": round(runs / elapsed, 2),
+        "ms_per_op": round(elapsed / runs * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run(sizes: List[int], seconds: float, name_filter: str = "") -> Dict[str, Dict[str, float]]:
+    results = {}
+    for case in collect_cases():
+        if name_filter and name_filter not in case["name"]:
+            continue
+        for count in sizes:
+            key = f"{case['name']}@{count}"
+            results[key] = measure(case["template"], case["template_dir"], case["context"](count), seconds)
+            stats = results[key]
+            print(f"{key:<32} {stats['ops_per_sec']:>10.1f} ops/s {stats['ms_per_op']:>10.3f} ms {stats['peak_kb']:>10.1f} KB")
+    return results
+
+
+def load_baseline(path: str = BASELINE_FILE) -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(results: Dict[str, Dict[str, float]], path: str = BASELINE_FILE) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": sys.version.split()[0],
+            "results": results,
+        }, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """与基线对比，返回变慢超过阈值的用例"""
+    regressions = []
+    print(f"\n{'用例':<30} {'基线 ops/s':>12} {'当前 ops/s':>12} {'变化':>8}")
+    for key, stats in results.items():
+        base = baseline.get(key)
+        if not base or not base.get("ops_per_sec"):
+            print(f"{key:<32} {'-':>12} {stats['ops_per_sec']:>12.1f} {'新增':>8}")
+            continue
+        ratio = stats["ops_per_sec"] / base["ops_per_sec"]
+        mark = ""
+        if ratio < 1 - threshold:
+            regressions.append(key)
+            mark = " !"
+        print(f"{key:<32} {base['ops_per_sec']:>12.1f} {stats['ops_per_sec']:>12.1f} {(ratio - 1) * 100:>+7.1f}%{mark}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="模板渲染基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="文章数量")
+    parser.add_argument("--seconds", type=float, default=0.5, help="每个用例的计时时长(秒)")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--save", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的最大变慢比例")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="基线文件路径")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.seconds, args.filter)
+    if args.save:
+        baseline = load_baseline(args.baseline)
+        baseline.update(results)
+        save_baseline(baseline, args.baseline)
+        print(f"\n基线已保存: {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print("\n未找到基线，使用 --save 保存本次结果")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)}个用例比基线慢超过{args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\n未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,10 @@
 import re
 import os
-from typing import Any, Dict, List, Union
+import hashlib
+import threading
+from collections import ChainMap, OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Union
 # """
 # 模板引擎使用示例
 
@@ -9,494 +13,653 @@ from typing import Any, Dict, List, Union
 # 2. 条件判断: {% if condition %}...{% endif %}
 # 3. 循环结构: {% for item in items %}...{% endfor %}
 # """
+
+_TOKEN_PATTERN = re.compile(
+    r'(\{\%.*?\%\})|'  # control blocks {% ... %}
+    r'(\{\{.*?\}\})'    # variables {{ ... }}
+)
+
+
+def _parse_var(var_expr: str) -> tuple:
+    """Pre-parse the expression inside {{ ... }} into a variable node."""
+    if var_expr.startswith('='):
+        return ('calc', var_expr[1:])
+    if ' or ' in var_expr:
+        alternatives = []
+        for part_expr in var_expr.split(' or '):
+            part_expr = part_expr.strip()
+            if (part_expr.startswith('"') and part_expr.endswith('"')) or \
+               (part_expr.startswith("'") and part_expr.endswith("'")):
+                alternatives.append(('literal', part_expr[1:-1]))
+            elif '.' in part_expr:
+                alternatives.append(('path', part_expr.split('.')))
+            else:
+                alternatives.append(('name', part_expr))
+        return ('or', alternatives)
+    if '.' in var_expr:
+        return ('path', var_expr.split('.'))
+    return ('name', var_expr)
+
+
+def _parse_assign(block: str) -> tuple:
+    """Pre-parse 'set name = expr' / 'let name = expr' into (name, expr)."""
+    content = block[4:].strip()
+    if '=' not in content:
+        return None, None
+    var_name, value_expr = content.split('=', 1)
+    value_expr = value_expr.strip()
+    if value_expr.startswith('='):
+        value_expr = value_expr[1:]
+    return var_name.strip(), value_expr
+
+
+def _parse_part(part) -> tuple:
+    """Pre-parse one template part into the node used by the top level renderer."""
+    if part is None:
+        return ('skip',)
+    if not (part.startswith('{{') or part.startswith('{%')):
+        return ('text', part)
+    if part.startswith('{{') and part.endswith('}}'):
+        return ('var', _parse_var(part[2:-2].strip()))
+    if part.startswith('{%') and part.endswith('%}'):
+        block = part[2:-2].strip()
+        if block.startswith('include '):
+            return ('skip',)
+        if block.startswith('set ') or block.startswith('let '):
+            var_name, value_expr = _parse_assign(block)
+            if var_name is None:
+                return ('skip',)
+            return (block[:3], var_name, value_expr)
+        if block.startswith('if '):
+            return ('if', block[3:].strip())
+        if block.startswith('for ') and ' in ' in block:
+            parts = block[4:].split(' in ', 1)
+            return ('for', parts[0].strip(), parts[1].strip())
+        return ('skip',)
+    return ('text', str(part) if part else '')
+
+
+def _parse_loop_part(part: str) -> tuple:
+    """Pre-parse one part of a for loop body (loop bodies use their own dispatch rules)."""
+    if part.startswith('{%') and part.endswith('%}'):
+        block = part[2:-2].strip()
+        if block.startswith('set ') or block.startswith('let '):
+            var_name, value_expr = _parse_assign(block)
+            if var_name is None:
+                return ('skip',)
+            return (block[:3], var_name, value_expr)
+    if part.startswith('{% if ') and part.endswith('%}'):
+        return ('if', part[6:-2].strip())
+    if part.startswith('{{') and part.endswith('}}'):
+        return ('var', _parse_var(part[2:-2].strip()))
+    return ('text', str(part))
+
+
+def _find_block_end(parts: list, start_idx: int, end_tag: str) -> int:
+    """Find the index of the end tag matching the block opened at start_idx."""
+    if start_idx >= len(parts):
+        return len(parts)
+    depth = 1
+    i = start_idx + 1
+    while i < len(parts):
+        part = parts[i]
+        if isinstance(part, str) and part.startswith('{%') and part.endswith('%}'):
+            block = part[2:-2].strip()
+            if block.startswith('if ') or block.startswith('for '):
+                depth += 1
+            elif block == end_tag:
+                depth -= 1
+                if depth == 0:
+                    return i
+            elif block in ['endif', 'endfor'] and depth > 1:
+                depth -= 1
+        i += 1
+    return len(parts)
+
+
+class CompiledTemplate:
+    """
+    A template compiled into pre-parsed nodes.
+
+    Jump targets (endif/else/endfor) and nested block bodies are resolved
+    once on first use and reused by every later render.
+    """
+
+    def __init__(self, parts: list):
+        self.parts = parts
+        self.nodes = [_parse_part(part) for part in parts]
+        self._ifs = {}
+        self._loops = {}
+        self._children = {}
+
+    def child(self, start: int, end: int) -> 'CompiledTemplate':
+        key = (start, end)
+        child = self._children.get(key)
+        if child is None:
+            child = CompiledTemplate(self.parts[start:end])
+            self._children[key] = child
+        return child
+
+    def if_block(self, idx: int) -> tuple:
+        """Return (endif_idx, else_idx) for the if block at idx."""
+        block = self._ifs.get(idx)
+        if block is None:
+            endif_idx = _find_block_end(self.parts, idx, 'endif')
+            else_idx = -1
+            for j in range(idx + 1, endif_idx):
+                part = self.parts[j]
+                if isinstance(part, str) and part.strip() in ('{% else %}', 'else'):
+                    else_idx = j
+                    break
+            block = (endif_idx, else_idx)
+            self._ifs[idx] = block
+        return block
+
+    def loop_block(self, idx: int) -> tuple:
+        """Return (loop_body, endfor_idx) for the for block at idx."""
+        block = self._loops.get(idx)
+        if block is None:
+            content = []
+            j = idx + 1
+            endfor_idx = j
+            while j < len(self.parts):
+                inner_part = self.parts[j]
+                if isinstance(inner_part, str) and inner_part.startswith('{% endfor %}'):
+                    endfor_idx = j
+                    break
+                content.append(str(inner_part) if inner_part else '')
+                j += 1
+            block = (LoopBody(content), endfor_idx)
+            self._loops[idx] = block
+        return block
+
+
+class LoopBody:
+    """Pre-parsed body of a for loop."""
+
+    def __init__(self, content: list):
+        self.content = content
+        self.nodes = [_parse_loop_part(part) for part in content]
+        self._ifs = {}
+
+    def if_block(self, idx: int) -> tuple:
+        """Return (endif_idx, assigns, body) for the if block at idx inside the loop."""
+        block = self._ifs.get(idx)
+        if block is None:
+            content = self.content
+            endif_idx = idx + 1
+            nested_depth = 1
+            while endif_idx < len(content):
+                inner_part = content[endif_idx]
+                if inner_part.startswith('{% if ') and inner_part.endswith('%}'):
+                    nested_depth += 1
+                elif inner_part.startswith('{% endif %}'):
+                    nested_depth -= 1
+                    if nested_depth == 0:
+                        break
+                endif_idx += 1
+            assigns, body = _split_assigns(content[idx + 1:endif_idx])
+            block = (endif_idx, assigns, body)
+            self._ifs[idx] = block
+        return block
+
+
+def _split_assigns(parts: list) -> tuple:
+    """Separate set/let statements from the parts that produce output."""
+    assigns = []
+    processed_parts = []
+    for part in parts:
+        if isinstance(part, str) and part.startswith('{%') and part.endswith('%}'):
+            block = part[2:-2].strip()
+            if block.startswith('set ') or block.startswith('let '):
+                var_name, value_expr = _parse_assign(block)
+                if var_name is not None:
+                    assigns.append((block[:3], var_name, value_expr))
+                continue
+        processed_parts.append(part)
+    return assigns, CompiledTemplate(processed_parts)
+
+
+# 编译结果缓存：模板内容哈希 -> (CompiledTemplate, include依赖文件及修改时间)
+_COMPILE_CACHE_SIZE = 256
+_compile_cache = OrderedDict()
+_compile_cache_lock = threading.Lock()
+
+
+def _deps_changed(deps: list) -> bool:
+    for path, mtime in deps:
+        try:
+            current = os.path.getmtime(path)
+        except OSError:
+            current = None
+        if current != mtime:
+            return True
+    return False
+
+
+def clear_template_cache() -> None:
+    """Drop all cached compiled templates."""
+    with _compile_cache_lock:
+        _compile_cache.clear()
+    _compile_expression.cache_clear()
+    _is_safe.cache_clear()
+
+
+_FORBIDDEN_WORDS = (
+    'import', 'open', 'exec', 'eval', 'system', 'subprocess',
+    '__import__', 'getattr', 'setattr', 'delattr', 'compile',
+    'globals', 'locals', 'vars', 'dir', 'help', 'reload',
+    'input', 'file', 'execfile', 'reload', 'exit', 'quit'
+)
+
+# 计算表达式额外可用的数学函数
+_CALC_FUNCTIONS = {
+    'pow': pow,
+    'sqrt': lambda x: x ** 0.5,
+    'ceil': lambda x: int(x) + (1 if x > int(x) else 0),
+    'floor': int,
+    'abs': abs,
+    'round': round,
+    'min': min,
+    'max': max,
+    'sum': sum
+}
+
+
+@lru_cache(maxsize=2048)
+def _is_safe(expr: str) -> bool:
+    expr_lower = expr.lower()
+    return not any(keyword in expr_lower for keyword in _FORBIDDEN_WORDS)
+
+
+@lru_cache(maxsize=2048)
+def _compile_expression(expr: str, mode: str = 'eval'):
+    """Compile an expression once and reuse the code object."""
+    if mode == 'eval':
+        # eval() strips leading spaces and tabs from source strings, compile() does not
+        expr = expr.lstrip(' \t')
+    return compile(expr, '<string>', mode)
+
+
+@lru_cache(maxsize=None)
+def _shared_safe_globals() -> Dict[str, Any]:
+    return TemplateParser._build_safe_globals()
+
+
+class _Scope(ChainMap):
+    """
+    Render scope layered over an outer context.
+
+    Loops and blocks push a small dict of their own variables instead of
+    copying the whole context; lookups check each layer with plain dict
+    membership tests rather than ChainMap's try/except per layer.
+    """
+
+    def __getitem__(self, key):
+        for mapping in self.maps:
+            if key in mapping:
+                return mapping[key]
+        return self.__missing__(key)
+
+    def get(self, key, default=None):
+        for mapping in self.maps:
+            if key in mapping:
+                return mapping[key]
+        return default
+
+    def __contains__(self, key):
+        for mapping in self.maps:
+            if key in mapping:
+                return True
+        return False
+
+
+def _layers(context) -> tuple:
+    """Mappings making up a context, innermost first."""
+    if isinstance(context, ChainMap):
+        return tuple(context.maps)
+    return (context,)
+
+
 class TemplateParser:
     """A lightweight template engine supporting variables, conditions and loops."""
-    
+
     def __init__(self, template: str, template_dir: str = None):
         """Initialize the template parser with a template string."""
         self.template = template
         self.compiled = None
         self.custom_functions = {}
         self.template_dir = template_dir  # Template directory for include functionality
-        
+        self._program = None
+        self._bare_parser = None
+        self._include_deps = []
+        self._eval_globals = None
+        self._calc_globals = None
+        self._iter_globals = None
+
     def register_function(self, name: str, func: callable) -> None:
         """
         Register a custom function to be available in template expressions.
-        
+
         Args:
             name: The name to use in templates
             func: The function to register
         """
         self.custom_functions[name] = func
-        
+        self._eval_globals = None
+
     def register_functions(self, functions: Dict[str, callable]) -> None:
         """
         Register multiple custom functions at once.
-        
+
         Args:
             functions: Dictionary of function names to functions
         """
         self.custom_functions.update(functions)
+        self._eval_globals = None
 
     def compile_template(self) -> None:
-        """Compile the template into an intermediate representation."""
+        """Compile the template into pre-parsed nodes, reusing the shared compile cache."""
+        key = hashlib.sha1(f"{self.template_dir or ''}\0{self.template}".encode('utf-8')).hexdigest()
+        with _compile_cache_lock:
+            cached = _compile_cache.get(key)
+            if cached is not None:
+                _compile_cache.move_to_end(key)
+        if cached is not None and not _deps_changed(cached[1]):
+            self._program = cached[0]
+            self.compiled = self._program.parts
+            return
+
         # First process include directives
+        self._include_deps = []
         processed_template = self._process_includes(self.template)
-        
+
         # Split template into static parts and control blocks
-        pattern = re.compile(
-            r'(\{\%.*?\%\})|'  # control blocks {% ... %}
-            r'(\{\{.*?\}\})'    # variables {{ ... }}
-        )
-        self.compiled = pattern.split(processed_template)
-        
+        program = CompiledTemplate(_TOKEN_PATTERN.split(processed_template))
+        with _compile_cache_lock:
+            _compile_cache[key] = (program, list(self._include_deps))
+            _compile_cache.move_to_end(key)
+            while len(_compile_cache) > _COMPILE_CACHE_SIZE:
+                _compile_cache.popitem(last=False)
+        self._program = program
+        self.compiled = program.parts
+
+    def _get_program(self) -> CompiledTemplate:
+        if self.compiled is None:
+            self.compile_template()
+        elif self._program is None or self._program.parts is not self.compiled:
+            # compiled was assigned directly
+            self._program = CompiledTemplate(self.compiled)
+        return self._program
+
+    def _bare(self) -> 'TemplateParser':
+        """Parser without custom functions, used for nested if blocks."""
+        if not self.custom_functions:
+            return self
+        if self._bare_parser is None:
+            self._bare_parser = TemplateParser('')
+        return self._bare_parser
+
+    @staticmethod
+    def _check_context(context: Dict[str, Any]) -> None:
+        # Security check: validate context keys
+        for layer in reversed(_layers(context)):
+            for key in layer.keys():
+                if not isinstance(key, str) or not key.isidentifier():
+                    raise ValueError(f"Invalid context key: {key}. Keys must be valid Python identifiers")
+
     def render(self, context: Dict[str, Any]) -> str:
         """
         Render the template with the given context.
-        
+
         Args:
             context: A dictionary containing variables for template rendering
-            
+
         Returns:
             The rendered template as a string
         """
-        # Security check: validate context keys
-        for key in context.keys():
-            if not isinstance(key, str) or not key.isidentifier():
-                raise ValueError(f"Invalid context key: {key}. Keys must be valid Python identifiers")
-        
-        if self.compiled is None:
-            self.compile_template()
-            
+        self._check_context(context)
         output = []
+        for _ in self._render_program(self._get_program(), context, output):
+            pass
+        # Clean up the output by removing excessive newlines
+        return self._clean_output(''.join(output))
+
+    def render_iter(self, context: Dict[str, Any], chunk_size: int = 8192) -> Iterator[str]:
+        """
+        Render the template incrementally, yielding output chunks.
+
+        Chunks are flushed as top-level loops progress, so large lists can be
+        sent to the client before the whole page is rendered.
+        ''.join(render_iter(context)) is identical to render(context).
+
+        Args:
+            context: A dictionary containing variables for template rendering
+            chunk_size: Minimum number of characters buffered before a chunk is yielded
+
+        Yields:
+            Rendered output chunks
+        """
+        self._check_context(context)
+        output = []
+        size = 0
+        checked = 0
+        ends_with_newline = False
+        for _ in self._render_program(self._get_program(), context, output):
+            size += sum(len(piece) for piece in output[checked:])
+            checked = len(output)
+            if size < chunk_size:
+                continue
+            chunk, ends_with_newline = self._clean_chunk(''.join(output), ends_with_newline)
+            output.clear()
+            size = checked = 0
+            if chunk:
+                yield chunk
+        chunk, _ = self._clean_chunk(''.join(output), ends_with_newline)
+        if chunk:
+            yield chunk
+
+    def _clean_chunk(self, chunk: str, after_newline: bool) -> tuple:
+        """Apply _clean_output to one chunk, continuing a newline run from the previous chunk."""
+        chunk = self._clean_output(chunk)
+        if after_newline:
+            chunk = chunk.lstrip('\n')
+        return chunk, chunk.endswith('\n') if chunk else after_newline
+
+    def _render_var(self, node: tuple, context: Dict[str, Any]) -> str:
+        """Render a pre-parsed {{ ... }} node."""
+        kind = node[0]
+        if kind == 'name':
+            return str(context.get(node[1], ''))
+        if kind == 'path':
+            parts = node[1]
+            current = context.get(parts[0], {})
+            for part_name in parts[1:]:
+                if isinstance(current, dict):
+                    current = current.get(part_name, '')
+                else:
+                    current = getattr(current, part_name, '')
+                if current is None:
+                    current = ''
+                    break
+            return str(current)
+        if kind == 'calc':
+            try:
+                return str(self._evaluate_calculation(node[1], context))
+            except Exception as e:
+                return f'[Error: {str(e)}]'
+        # Handle 'or' operator for default values
+        result = None
+        for alt_kind, alt in node[1]:
+            if alt_kind == 'literal':
+                result = alt
+                break
+            if alt_kind == 'path':
+                current = context.get(alt[0], {})
+                for var_part in alt[1:]:
+                    if isinstance(current, dict):
+                        current = current.get(var_part, '')
+                    else:
+                        current = getattr(current, var_part, '')
+                    if current is None:
+                        current = ''
+                        break
+                value = current
+            else:
+                value = context.get(alt, '')
+            # If value is not empty or not zero, use it
+            if value or value == 0:
+                result = value
+                break
+        return str(result if result is not None else '')
+
+    def _assign(self, kind: str, var_name: str, value_expr: str, context: Dict[str, Any]) -> None:
+        """Evaluate a set/let statement into context."""
+        try:
+            context[var_name] = self._evaluate_calculation(value_expr, context)
+        except Exception as e:
+            context[var_name] = f"[{kind.capitalize()} Error: {str(e)}]"
+
+    def _render_program(self, program: CompiledTemplate, context: Dict[str, Any], output: list) -> Iterator[None]:
+        """Render a compiled template into output, yielding after every top-level loop item."""
+        nodes = program.nodes
+        count = len(nodes)
         i = 0
-        while i < len(self.compiled):
-            part = self.compiled[i]
-            
-            if part is None:
+        while i < count:
+            node = nodes[i]
+            kind = node[0]
+
+            if kind == 'text':
+                output.append(node[1])
                 i += 1
-                continue
-                
-            # Handle static text (preserve original formatting)
-            if not (part.startswith('{{') or part.startswith('{%')):
-                output.append(part)
+            elif kind == 'var':
+                output.append(self._render_var(node[1], context))
                 i += 1
-                continue
-                
-            # Handle variables {{ var }} and nested {{ var.attr }} and eval expressions
-            if part.startswith('{{') and part.endswith('}}'):
-                # print(f"\nProcessing variable part: {part}")
-                var_expr = part[2:-2].strip()
-                # print(f"Extracted expression: {var_expr}")
-                
-                # Check if this is an eval expression (starts with =)
-                if var_expr.startswith('='):
-                    try:
-                        # Evaluate the expression (after =)
-                        expr = var_expr[1:]
-                        result = self._evaluate_calculation(expr, context)
-                        output.append(str(result))
-                    except Exception as e:
-                        output.append(f'[Error: {str(e)}]')
-                elif ' or ' in var_expr:
-                    # Handle 'or' operator for default values
-                    parts = var_expr.split(' or ')
-                    result = None
-                    for part_expr in parts:
-                        part_expr = part_expr.strip()
-                        # Remove quotes if it's a literal string
-                        if (part_expr.startswith('"') and part_expr.endswith('"')) or \
-                           (part_expr.startswith("'") and part_expr.endswith("'")):
-                            result = part_expr[1:-1]
-                            break
-                        else:
-                            # Evaluate the variable
-                            if '.' in part_expr:
-                                # Handle nested attribute access
-                                var_parts = part_expr.split('.')
-                                current = context.get(var_parts[0], {})
-                                for var_part in var_parts[1:]:
-                                    if isinstance(current, dict):
-                                        current = current.get(var_part, '')
-                                    else:
-                                        current = getattr(current, var_part, '')
-                                    if current is None:
-                                        current = ''
-                                        break
-                                value = current
-                            else:
-                                # Simple variable access
-                                value = context.get(part_expr, '')
-                            
-                            # If value is not empty or not zero, use it
-                            if value or value == 0:
-                                result = value
-                                break
-                    
-                    output.append(str(result if result is not None else ''))
-                elif '.' in var_expr:
-                    # print(f"DEBUG - Processing nested variable: {var_expr}")  # Debug
-                    # Handle nested attribute access
-                    parts = var_expr.split('.')
-                    current = context.get(parts[0], {})
-                    for part_name in parts[1:]:
-                        if isinstance(current, dict):
-                            current = current.get(part_name, '')
-                        else:
-                            current = getattr(current, part_name, '')
-                        if current is None:
-                            current = ''
-                            break
-                    output.append(str(current))
-                else:
-                    # Simple variable access
-                    output.append(str(context.get(var_expr, '')))
+            elif kind == 'set' or kind == 'let':
+                self._assign(kind, node[1], node[2], context)
                 i += 1
-                
-            # Handle control blocks {% ... %}
-            elif part.startswith('{%') and part.endswith('%}'):
-                block = part[2:-2].strip()
-                
-                # Handle include directive (processed during compile, but keep for safety)
-                if block.startswith('include '):
-                    # Include should have been processed during compilation
-                    i += 1
-                    continue
-                
-                # Handle set variable
-                if block.startswith('set '):
-                    # Parse: set variable_name = expression
-                    set_content = block[4:].strip()
-                    if '=' in set_content:
-                        var_name, value_expr = set_content.split('=', 1)
-                        var_name = var_name.strip()
-                        value_expr = value_expr.strip()
-                        
-                        # Evaluate the value expression
-                        try:
-                            if value_expr.startswith('='):
-                                value_expr = value_expr[1:]
-                            value = self._evaluate_calculation(value_expr, context)
-                            # Store in context for future use
-                            context[var_name] = value
-                        except Exception as e:
-                            context[var_name] = f"[Set Error: {str(e)}]"
-                    i += 1
-                    continue
-                
-                # Handle let variable
-                if block.startswith('let '):
-                    # Parse: let variable_name = expression
-                    let_content = block[4:].strip()
-                    if '=' in let_content:
-                        var_name, value_expr = let_content.split('=', 1)
-                        var_name = var_name.strip()
-                        value_expr = value_expr.strip()
-                        
-                        # Evaluate the value expression
-                        try:
-                            if value_expr.startswith('='):
-                                value_expr = value_expr[1:]
-                            value = self._evaluate_calculation(value_expr, context)
-                            # Store in context for current scope
-                            context[var_name] = value
-                        except Exception as e:
-                            context[var_name] = f"[Let Error: {str(e)}]"
-                    i += 1
-                    continue
-                
-                # Handle if condition
-                if block.startswith('if '):
-                    condition = block[3:].strip()
-                    result, updated_context = self._evaluate_condition(condition, context)
+            elif kind == 'if':
+                result, updated_context = self._evaluate_condition(node[1], context)
+                if updated_context is not context:
                     # Merge all variables except special ones and functions
                     for k, v in updated_context.items():
                         if not k.startswith('__') and k not in self.custom_functions:
                             # Only update context if the key doesn't exist or was modified
-                            if k not in context or context[k] != v:
+                            if k not in context or (context[k] is not v and context[k] != v):
                                 context[k] = v
                     # Ensure final_price is available in context if it was calculated
                     if 'final_price' in updated_context:
                         context['final_price'] = updated_context['final_price']
-                    
-                    # Find matching endif using helper method
-                    endif_idx = self._skip_control_block(i, 'if', 'endif')
-                    if endif_idx == len(self.compiled):
-                        i += 1
-                        continue
-                    
-                    # Find else if exists
-                    else_idx = -1
-                    for j in range(i+1, endif_idx):
-                        part = self.compiled[j]
-                        if isinstance(part, str) and part.strip() in ('{% else %}', 'else'):
-                            else_idx = j
-                            break
-                    
-                    # Process the appropriate block
-                    if result:
-                        # Process if block (from current position to else or endif)
-                        end_idx = else_idx if else_idx != -1 else endif_idx
-                        if_content = self.compiled[i+1:end_idx]
-                        
-                        if_parser = TemplateParser('')
-                        if_parser.compiled = if_content
-                        rendered = if_parser.render(context)
-                        output.append(rendered)
-                    elif else_idx != -1:
-                        # Process else block
-                        else_content = self.compiled[else_idx+1:endif_idx]
-                        
-                        else_parser = TemplateParser('')
-                        else_parser.compiled = else_content
-                        rendered = else_parser.render(context)
-                        output.append(rendered)
-                    
-                    # Skip to after endif
-                    i = endif_idx + 1
-                    continue
-                    
-                # Handle for loop
-                elif block.startswith('for ') and ' in ' in block:
-                    loop_var, iterable = self._parse_for_block(block)
-                    items = self._get_iterable(iterable, context)
-                    
-                    # Collect loop content
-                    loop_content = []
-                    j = i + 1
-                    endfor_idx = j
-                    while j < len(self.compiled):
-                        inner_part = self.compiled[j]
-                        if (isinstance(inner_part, str) and 
-                            inner_part.startswith('{% endfor %}')):
-                            endfor_idx = j
-                            break
-                        loop_content.append(str(inner_part) if inner_part else '')
-                        j += 1
-                        
-                    # Render loop with preserved formatting and indentation
-                    loop_output = []
-                    total_items = len(items)
-                    
-                    # Get the indentation level from the template
-                    for_line = self.compiled[i]
-                    indent = ''
-                    if isinstance(for_line, str):
-                        indent_match = re.match(r'^(\s*)', for_line)
-                        if indent_match:
-                            indent = indent_match.group(1)
-                    
-                    for item_idx, item in enumerate(items):
-                        loop_context = context.copy()
-                        loop_context[loop_var] = item
-                        
-                        # Add loop variable with iteration info
-                        loop_context['loop'] = {
-                            'index': item_idx + 1,
-                            'index0': item_idx,
-                            'first': item_idx == 0,
-                            'last': item_idx == total_items - 1,
-                            'length': total_items,
-                            'parentloop': context.get('loop')  # Save parent loop context
-                        }
-                        
-                        # Render loop content with current item
-                        item_output = []
-                        j = 0
-                        while j < len(loop_content):
-                            part = loop_content[j]
-                            if part is None:
-                                j += 1
-                                continue
-                            
-                            # Handle set/let statements inside for loop
-                            if (isinstance(part, str) and 
-                                part.startswith('{%') and 
-                                part.endswith('%}')):
-                                block = part[2:-2].strip()
-                                
-                                # Handle set variable
-                                if block.startswith('set '):
-                                    set_content = block[4:].strip()
-                                    if '=' in set_content:
-                                        var_name, value_expr = set_content.split('=', 1)
-                                        var_name = var_name.strip()
-                                        value_expr = value_expr.strip()
-                                        
-                                        # Evaluate value expression
-                                        try:
-                                            if value_expr.startswith('='):
-                                                value_expr = value_expr[1:]
-                                            value = self._evaluate_calculation(value_expr, loop_context)
-                                            # Store in loop context
-                                            loop_context[var_name] = value
-                                        except Exception as e:
-                                            loop_context[var_name] = f"[Set Error: {str(e)}]"
-                                    
-                                    j += 1
-                                    continue
-                                
-                                # Handle let variable  
-                                elif block.startswith('let '):
-                                    let_content = block[4:].strip()
-                                    if '=' in let_content:
-                                        var_name, value_expr = let_content.split('=', 1)
-                                        var_name = var_name.strip()
-                                        value_expr = value_expr.strip()
-                                        
-                                        # Evaluate value expression
-                                        try:
-                                            if value_expr.startswith('='):
-                                                value_expr = value_expr[1:]
-                                            value = self._evaluate_calculation(value_expr, loop_context)
-                                            # Store in loop context
-                                            loop_context[var_name] = value
-                                        except Exception as e:
-                                            loop_context[var_name] = f"[Let Error: {str(e)}]"
-                                    
-                                    j += 1
-                                    continue
-                            
-                            # Handle if conditions inside for loop
-                            if (isinstance(part, str) and 
-                                part.startswith('{% if ') and 
-                                part.endswith('%}')):
-                                condition = part[6:-2].strip()
-                                result, _ = self._evaluate_condition(condition, loop_context)
-                                
-                                # Find matching endif
-                                endif_idx = j + 1
-                                nested_depth = 1
-                                while endif_idx < len(loop_content):
-                                    inner_part = loop_content[endif_idx]
-                                    if (isinstance(inner_part, str) and 
-                                        inner_part.startswith('{% if ') and 
-                                        inner_part.endswith('%}')):
-                                        nested_depth += 1
-                                    elif (isinstance(inner_part, str) and 
-                                          inner_part.startswith('{% endif %}')):
-                                        nested_depth -= 1
-                                        if nested_depth == 0:
-                                            break
-                                    endif_idx += 1
-                                
-                                # Process if block if condition is true
-                                if result:
-                                    if_content = loop_content[j+1:endif_idx]
-                                    rendered = self._render_parts(if_content, loop_context)
-                                    item_output.append(rendered)
-                                
-                                # Skip to after endif
-                                j = endif_idx + 1
-                            
-                            # Handle variable references
-                            elif isinstance(part, str) and part.startswith('{{') and part.endswith('}}'):
-                                var_expr = part[2:-2].strip()
-                                # print(f"DEBUG - Evaluating variable: {var_expr}")  # Debug
-                            
-                                if var_expr.startswith('='):
-                                    # Handle eval expressions with enhanced calculation
-                                    try:
-                                        expr = var_expr[1:]
-                                        result = self._evaluate_calculation(expr, loop_context)
-                                        value = str(result)
-                                    except Exception as e:
-                                        value = f'[Error: {str(e)}]'
-                                elif ' or ' in var_expr:
-                                    # Handle 'or' operator for default values
-                                    parts = var_expr.split(' or ')
-                                    result = None
-                                    for part_expr in parts:
-                                        part_expr = part_expr.strip()
-                                        # Remove quotes if it's a literal string
-                                        if (part_expr.startswith('"') and part_expr.endswith('"')) or \
-                                           (part_expr.startswith("'") and part_expr.endswith("'")):
-                                            result = part_expr[1:-1]
-                                            break
-                                        else:
-                                            # Evaluate the variable
-                                            if '.' in part_expr:
-                                                # Handle nested attribute access
-                                                var_parts = part_expr.split('.')
-                                                current = loop_context.get(var_parts[0], {})
-                                                for var_part in var_parts[1:]:
-                                                    if isinstance(current, dict):
-                                                        current = current.get(var_part, '')
-                                                    else:
-                                                        current = getattr(current, var_part, '')
-                                                    if current is None:
-                                                        current = ''
-                                                        break
-                                                value = current
-                                            else:
-                                                # Simple variable access
-                                                value = loop_context.get(part_expr, '')
-                                            
-                                            # If value is not empty or not zero, use it
-                                            if value or value == 0:
-                                                result = value
-                                                break
-                                    
-                                    value = str(result if result is not None else '')
-                                elif '.' in var_expr:
-                                    # Handle nested attributes
-                                    parts = var_expr.split('.')
-                                    current = loop_context.get(parts[0], {})
-                                    for part_name in parts[1:]:
-                                        if isinstance(current, dict):
-                                            current = current.get(part_name, '')
-                                        else:
-                                            current = getattr(current, part_name, '')
-                                        if current is None:
-                                            current = ''
-                                            break
-                                    value = str(current)
-                                else:
-                                    # Handle simple variable
-                                    value = str(loop_context.get(var_expr, ''))
-                            
-                                # print(f"DEBUG - Variable value: {value}")  # Debug
-                                item_output.append(value)
-                                j += 1
-                            
-                            else:
-                                # Handle literal text (preserve whitespace and newlines)
-                                item_output.append(str(part))
-                                j += 1
-                        
-                        rendered_item = ''.join(item_output)
-                        # print(f"DEBUG - Rendered item {item_idx}:\n{repr(rendered_item)}")  # Debug
-                        loop_output.append(rendered_item)
-                    
-                    if loop_output:
-                        # Join all loop items with newlines and add to output
-                        loop_result = '\n'.join(loop_output)
-                        output.append(loop_result)
-                    else:
-                        # print("DEBUG - No loop output generated")
-                        pass
-                    
-                    # Skip to end of loop
-                    i = endfor_idx + 1
-                    
-                # Handle endif/endfor
-                elif block in ('endif', 'endfor'):
-                    i += 1
-                    
-                else:
+
+                endif_idx, else_idx = program.if_block(i)
+                if endif_idx == count:
                     i += 1
-                    
-            # Static text
+                    continue
+
+                # Process the appropriate block
+                if result:
+                    end_idx = else_idx if else_idx != -1 else endif_idx
+                    bare = self._bare()
+                    bare._check_context(context)
+                    yield from bare._render_program(program.child(i + 1, end_idx), context, output)
+                elif else_idx != -1:
+                    bare = self._bare()
+                    bare._check_context(context)
+                    yield from bare._render_program(program.child(else_idx + 1, endif_idx), context, output)
+
+                # Skip to after endif
+                i = endif_idx + 1
+            elif kind == 'for':
+                loop_var, iterable = node[1], node[2]
+                items = self._get_iterable(iterable, context)
+                body, endfor_idx = program.loop_block(i)
+                # Join all loop items with newlines, flushing after each item
+                for item_idx, item_output in enumerate(self._render_loop(body, loop_var, items, context)):
+                    if item_idx:
+                        output.append('\n')
+                    output.append(item_output)
+                    yield
+                # Skip to end of loop
+                i = endfor_idx + 1
             else:
-                output.append(str(part) if part else '')
                 i += 1
-                
-        # Clean up the output by removing excessive newlines
-        result = ''.join(output)
-        return self._clean_output(result)
-    
+
+    def _render_loop(self, body: LoopBody, loop_var: str, items, context: Dict[str, Any]) -> Iterator[str]:
+        """Render every iteration of a for loop body, yielding one string per item."""
+        total_items = len(items)
+        nodes = body.nodes
+        count = len(nodes)
+        parentloop = context.get('loop')
+        layers = _layers(context)
+
+        for item_idx, item in enumerate(items):
+            # Layer the loop variables over the outer context instead of copying it
+            loop_context = _Scope({
+                loop_var: item,
+                # Add loop variable with iteration info
+                'loop': {
+                    'index': item_idx + 1,
+                    'index0': item_idx,
+                    'first': item_idx == 0,
+                    'last': item_idx == total_items - 1,
+                    'length': total_items,
+                    'parentloop': parentloop  # Save parent loop context
+                }
+            }, *layers)
+
+            item_output = []
+            j = 0
+            while j < count:
+                node = nodes[j]
+                kind = node[0]
+                if kind == 'text':
+                    item_output.append(node[1])
+                    j += 1
+                elif kind == 'var':
+                    item_output.append(self._render_var(node[1], loop_context))
+                    j += 1
+                elif kind == 'set' or kind == 'let':
+                    self._assign(kind, node[1], node[2], loop_context)
+                    j += 1
+                elif kind == 'if':
+                    result, _ = self._evaluate_condition(node[1], loop_context)
+                    endif_idx, assigns, if_body = body.if_block(j)
+                    # Process if block if condition is true
+                    if result:
+                        self._render_block(assigns, if_body, loop_context, item_output)
+                    # Skip to after endif
+                    j = endif_idx + 1
+                else:
+                    j += 1
+
+            yield ''.join(item_output)
+
+    def _render_block(self, assigns: list, program: CompiledTemplate, context: Dict[str, Any], output: list) -> None:
+        """Render an if block inside a loop in its own scope, evaluating set/let first."""
+        # Create a new scope layered over context for this rendering block
+        local_context = _Scope({}, *_layers(context))
+        for kind, var_name, value_expr in assigns:
+            self._assign(kind, var_name, value_expr, local_context)
+        bare = self._bare()
+        bare._check_context(local_context)
+        for _ in bare._render_program(program, local_context, output):
+            pass
+
     def _get_safe_globals(self) -> Dict[str, Any]:
         """Return a dictionary of safe builtins for eval/exec."""
+        return dict(_shared_safe_globals())
+
+    def _get_eval_globals(self) -> tuple:
+        """Return (condition globals, calculation globals), built once per parser."""
+        if self._eval_globals is None:
+            safe_globals = _shared_safe_globals()
+            self._eval_globals = {**safe_globals, **self.custom_functions}
+            self._calc_globals = {**safe_globals, **_CALC_FUNCTIONS, **self.custom_functions}
+        return self._eval_globals, self._calc_globals
+
+    @staticmethod
+    def _build_safe_globals() -> Dict[str, Any]:
+        """Build the safe builtins shared by all parsers."""
         # 字符串操作函数
         def safe_upper(s):
             return str(s).upper() if s else ""
@@ -856,14 +1019,7 @@ class TemplateParser:
 
     def _is_safe_expression(self, expr: str) -> bool:
         """Check if an expression contains potentially dangerous operations."""
-        forbidden = [
-            'import', 'open', 'exec', 'eval', 'system', 'subprocess',
-            '__import__', 'getattr', 'setattr', 'delattr', 'compile',
-            'globals', 'locals', 'vars', 'dir', 'help', 'reload',
-            'input', 'file', 'execfile', 'reload', 'exit', 'quit'
-        ]
-        expr_lower = expr.lower()
-        return not any(keyword in expr_lower for keyword in forbidden)
+        return _is_safe(expr)
 
     def _evaluate_condition(self, condition: str, context: Dict[str, Any]) -> tuple:
         """
@@ -899,17 +1055,15 @@ class TemplateParser:
                 return (not result if has_not else result), context
                     
             # Create safe evaluation environment
-            safe_globals = self._get_safe_globals()
-            eval_globals = {**safe_globals, **self.custom_functions}
-            
-            # Make a copy of context to avoid modifying the original
-            local_vars = context.copy()
+            eval_globals = self._get_eval_globals()[0]
             
             # Handle multi-line code blocks
             if '\n' in condition.strip():
+                # Make a copy of context to avoid modifying the original
+                local_vars = dict(context)
                 # Compile and execute the code block in restricted environment
-                code = compile(condition, '<string>', 'exec')
-                exec(code, eval_globals, local_vars)
+                code = _compile_expression(condition, 'exec')
+                exec(code, dict(eval_globals), local_vars)
                 # The last expression's value should be in __result__
                 result = bool(local_vars.get('__result__', False))
                 # Return result and updated context (excluding special vars)
@@ -930,79 +1084,48 @@ class TemplateParser:
                 
                 return result, updated_context
             
+            # Variables assigned during evaluation land in the new top layer,
+            # so the context itself does not need to be copied
+            local_vars = _Scope({}, *_layers(context))
+
             # Handle function calls with = prefix
             if condition.startswith('='):
-                result = bool(eval(condition[1:], eval_globals, local_vars))
-                return result, local_vars
+                result = bool(eval(_compile_expression(condition[1:]), eval_globals, local_vars))
+                return result, local_vars.maps[0] or context
             
             # Handle nested attribute access (e.g. user.is_admin)
             if '.' in condition:
                 parts = condition.split('.')
-                current = local_vars.get(parts[0], {})
+                current = context.get(parts[0], {})
                 for part in parts[1:]:
                     if isinstance(current, dict):
                         current = current.get(part, None)
                     else:
                         current = getattr(current, part, None)
                     if current is None:
-                        return False, local_vars
+                        return False, context
                 # Handle empty collections
                 if isinstance(current, (list, dict, set)) and not current:
-                    return False, local_vars
-                return bool(current), local_vars
+                    return False, context
+                return bool(current), context
             
             # Handle direct variable reference
-            if condition in local_vars:
-                value = local_vars[condition]
+            if condition in context:
+                value = context[condition]
                 if isinstance(value, (list, dict, set)):
-                    return len(value) > 0, local_vars
-                return bool(value), local_vars
+                    return len(value) > 0, context
+                return bool(value), context
                 
             # Evaluate other expressions
-            result = bool(eval(condition, eval_globals, local_vars))
-            return result, local_vars
+            result = bool(eval(_compile_expression(condition), eval_globals, local_vars))
+            return result, local_vars.maps[0] or context
             
         except Exception:
             return False, context
             
     def _skip_control_block(self, start_idx: int, start_tag: str, end_tag: str) -> int:
         """Skip a control block until matching end tag is found."""
-        if start_idx >= len(self.compiled):
-            return len(self.compiled)
-            
-        depth = 1
-        i = start_idx + 1
-        # print(f"DEBUG - Searching for {end_tag} starting from {start_idx}")
-        
-        while i < len(self.compiled):
-            part = self.compiled[i]
-            if isinstance(part, str) and part.startswith('{%') and part.endswith('%}'):
-                block = part[2:-2].strip()
-                # print(f"DEBUG - Token {i}: {block} (depth={depth})")
-                
-                # Handle nested blocks
-                if block.startswith('if ') or block.startswith('for '):
-                    depth += 1
-                    # print(f"DEBUG - Found nested block, depth increased to {depth}")
-                elif block == end_tag:
-                    depth -= 1
-                    # print(f"DEBUG - Found {end_tag}, depth decreased to {depth}")
-                    if depth == 0:
-                        # print(f"DEBUG - Found matching {end_tag} at {i}")
-                        return i
-                elif block == 'else' and depth == 1:
-                    # print(f"DEBUG - Found else at {i}")
-                    # Don't decrease depth for else blocks
-                    pass
-                elif block in ['endif', 'endfor'] and depth > 1:
-                    depth -= 1
-                    # print(f"DEBUG - Found closing tag in nested block, depth decreased to {depth}")
-            
-            i += 1
-        
-        # print(f"DEBUG - Error: Reached end without finding matching {end_tag} (current depth: {depth})")
-        # print(f"DEBUG - Last processed block: {self.compiled[i-1] if i > 0 else 'None'}")
-        return len(self.compiled)
+        return _find_block_end(self.compiled, start_idx, end_tag)
 
     def _clean_output(self, output: str) -> str:
         """Clean up the final output while preserving essential formatting."""
@@ -1029,8 +1152,9 @@ class TemplateParser:
             if not self._is_safe_expression(iterable):
                 raise ValueError("Potentially dangerous expression detected")
             
-            safe_globals = self._get_safe_globals()
-            return eval(iterable, safe_globals, context)
+            if self._iter_globals is None:
+                self._iter_globals = self._get_safe_globals()
+            return eval(_compile_expression(iterable), self._iter_globals, context)
         except Exception:
             return []
             
@@ -1056,11 +1180,19 @@ class TemplateParser:
         else:
             file_path = filename
         
+        try:
+            mtime = os.path.getmtime(file_path)
+        except OSError:
+            mtime = None
+        # Record the dependency so cached compilations are invalidated when the file changes
+        self._include_deps.append((file_path, mtime))
+
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
             # Recursively process includes in the included file
             included_parser = TemplateParser(content, self.template_dir)
+            included_parser._include_deps = self._include_deps
             return included_parser._process_includes(content)
         except FileNotFoundError:
             return f"[Error: Include file '{filename}' not found]"
@@ -1086,21 +1218,7 @@ class TemplateParser:
                     value_expr = match.group(2)
                     
                     # Evaluate the value
-                    safe_globals = self._get_safe_globals()
-                    safe_globals.update({
-                        'pow': pow,
-                        'sqrt': lambda x: x ** 0.5,
-                        'ceil': lambda x: int(x) + (1 if x > int(x) else 0),
-                        'floor': int,
-                        'abs': abs,
-                        'round': round,
-                        'min': min,
-                        'max': max,
-                        'sum': sum
-                    })
-                    eval_globals = {**safe_globals, **self.custom_functions}
-                    
-                    value = eval(value_expr, eval_globals, context)
+                    value = eval(_compile_expression(value_expr), self._get_eval_globals()[1], context)
                     
                     # Store in context for future use
                     context[var_name] = value
@@ -1120,21 +1238,7 @@ class TemplateParser:
                     value_expr = match.group(2)
                     
                     # Evaluate the value
-                    safe_globals = self._get_safe_globals()
-                    safe_globals.update({
-                        'pow': pow,
-                        'sqrt': lambda x: x ** 0.5,
-                        'ceil': lambda x: int(x) + (1 if x > int(x) else 0),
-                        'floor': int,
-                        'abs': abs,
-                        'round': round,
-                        'min': min,
-                        'max': max,
-                        'sum': sum
-                    })
-                    eval_globals = {**safe_globals, **self.custom_functions}
-                    
-                    value = eval(value_expr, eval_globals, context)
+                    value = eval(_compile_expression(value_expr), self._get_eval_globals()[1], context)
                     
                     # Create a new context with the local variable
                     # In let expressions, the variable is available within the current evaluation scope
@@ -1145,94 +1249,19 @@ class TemplateParser:
                 return f"[Let Error: {str(e)}]"
         
         # Enhanced safe globals with math functions
-        safe_globals = self._get_safe_globals()
-        safe_globals.update({
-            'pow': pow,
-            'sqrt': lambda x: x ** 0.5,
-            'ceil': lambda x: int(x) + (1 if x > int(x) else 0),
-            'floor': int,
-            'abs': abs,
-            'round': round,
-            'min': min,
-            'max': max,
-            'sum': sum
-        })
-        
-        eval_globals = {**safe_globals, **self.custom_functions}
+        eval_globals = self._get_eval_globals()[1]
         
         try:
-            return eval(expr, eval_globals, context)
+            return eval(_compile_expression(expr), eval_globals, context)
         except Exception as e:
             return f"[Calculation Error: {str(e)}]"
 
     def _render_parts(self, parts: List[Union[str, None]], context: Dict[str, Any]) -> str:
         """Render a list of template parts with the given context."""
-        temp_parser = TemplateParser('', self.template_dir)
-        temp_parser.compiled = parts
-        
-        # Create a copy of context for this rendering scope
-        local_context = context.copy()
-        
-        # Process parts to handle set/let statements
-        processed_parts = []
-        i = 0
-        while i < len(parts):
-            part = parts[i]
-            
-            if (isinstance(part, str) and 
-                part.startswith('{%') and 
-                part.endswith('%}')):
-                block = part[2:-2].strip()
-                
-                # Handle set variable
-                if block.startswith('set '):
-                    set_content = block[4:].strip()
-                    if '=' in set_content:
-                        var_name, value_expr = set_content.split('=', 1)
-                        var_name = var_name.strip()
-                        value_expr = value_expr.strip()
-                        
-                        # Evaluate value expression
-                        try:
-                            if value_expr.startswith('='):
-                                value_expr = value_expr[1:]
-                            value = self._evaluate_calculation(value_expr, local_context)
-                            # Store in local context
-                            local_context[var_name] = value
-                        except Exception as e:
-                            local_context[var_name] = f"[Set Error: {str(e)}]"
-                    
-                    # Skip this part (set statement doesn't produce output)
-                    i += 1
-                    continue
-                
-                # Handle let variable  
-                elif block.startswith('let '):
-                    let_content = block[4:].strip()
-                    if '=' in let_content:
-                        var_name, value_expr = let_content.split('=', 1)
-                        var_name = var_name.strip()
-                        value_expr = value_expr.strip()
-                        
-                        # Evaluate value expression
-                        try:
-                            if value_expr.startswith('='):
-                                value_expr = value_expr[1:]
-                            value = self._evaluate_calculation(value_expr, local_context)
-                            # Store in local context
-                            local_context[var_name] = value
-                        except Exception as e:
-                            local_context[var_name] = f"[Let Error: {str(e)}]"
-                    
-                    # Skip this part (let statement doesn't produce output)
-                    i += 1
-                    continue
-            
-            processed_parts.append(part)
-            i += 1
-        
-        temp_parser.compiled = processed_parts
-        return temp_parser.render(local_context)
+        assigns, program = _split_assigns(parts)
+        output = []
+        self._render_block(assigns, program, context, output)
+        return ''.join(output)
 
 
 # Example usage
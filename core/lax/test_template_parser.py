@@ -115,5 +115,37 @@ class TestTemplateParser(unittest.TestCase):
 }"""
         self.assertEqual(result.strip().replace("\n", "").replace(" ", ""), expected.strip().replace("\n", "").replace(" ", ""))
 
+    def test_compiled_template_reused(self):
+        """Test that parsers for the same template share one compiled program."""
+        template = "{% for item in items %}{% if not loop.last %}{{item}},{% endif %}{% endfor %}"
+        first = TemplateParser(template)
+        second = TemplateParser(template)
+        first_result = first.render({"items": [1, 2, 3]})
+        second_result = second.render({"items": [1, 2, 3]})
+        print(second_result)
+        self.assertIs(first._program, second._program)
+        self.assertEqual(first_result, second_result)
+        self.assertEqual(second.render({"items": ["a", "b"]}), "a,\n")
+
+    def test_render_iter(self):
+        """Test that streaming render yields the same output in several chunks."""
+        template = "<ul>\n{% for item in items %}<li>{{item}}</li>\n{% endfor %}</ul>"
+        parser = TemplateParser(template)
+        context = {"items": list(range(50))}
+        chunks = list(parser.render_iter(context, chunk_size=64))
+        print(len(chunks))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), parser.render(context))
+
+    def test_loop_scope_isolated(self):
+        """Test that variables set inside a loop do not leak into the outer context."""
+        template = "{% set total = 0 %}{% for n in nums %}{% set total = total + n %}{{= total * 2 }}{% endfor %}|{{ total }}"
+        parser = TemplateParser(template)
+        context = {"nums": [1, 2, 3]}
+        result = parser.render(context)
+        print(result)
+        self.assertEqual(result, "2\n4\n6|0")
+        self.assertEqual(parser.render(context), result)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -6,6 +6,8 @@ from .feed import Feed
 from .user import User
 # 导入消息任务模型
 from .message_task import MessageTask
+# 导入消息任务日志模型
+from .message_task_log import MessageTaskLog
 # 导入配置管理模型
 from .config_management import ConfigManagement
 # 导入Access Key模型
@@ -14,5 +16,9 @@ from .access_key import AccessKey
 from .cascade_node import CascadeNode, CascadeSyncLog
 # 导入级联任务分配模型
 from .cascade_task_allocation import CascadeTaskAllocation
+# 导入公众号文章统计模型
+from .feed_stats import FeedStats
+# 导入全文检索模型
+from .article_search import ArticleSearchTerm, SearchIndexState
 # 导入基础模型
 from .base import *
\ No newline at end of file
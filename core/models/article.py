@@ -22,6 +22,11 @@ class ArticleBase(Base):
 class Article(ArticleBase):
     content = Column(Text)
     content_html = Column(Text)
+    # 生成 content_html 的转换版本(tools.fix.FIX_HTML_VERSION)，不一致时重新生成
+    content_html_version = Column(Integer)
+    # 由正文生成，正文变更时更新(core.article_content)
+    content_text = Column(Text)
+    content_markdown = Column(Text)
     
     def to_dict(self):
         """将Article对象转换为字典"""
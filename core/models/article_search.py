@@ -0,0 +1,28 @@
+from sqlalchemy import Index
+from  .base import Base,Column,String,Integer,DateTime
+
+class ArticleSearchTerm(Base):
+    """文章全文检索倒排表(terms 检索后端)，每行为一个词在一篇文章中的权重"""
+    from_attributes = True
+    __tablename__ = 'article_search_terms'
+    term = Column(String(64), primary_key=True)
+    article_id = Column(String(255), primary_key=True)
+    # 标题、摘要、正文中出现次数的加权和
+    weight = Column(Integer, default=0)
+    __table_args__ = (
+        Index('ix_article_search_terms_article_id', 'article_id'),
+    )
+
+
+class SearchIndexState(Base):
+    """全文检索索引状态，backend 为检索后端名称"""
+    from_attributes = True
+    __tablename__ = 'search_index_state'
+    backend = Column(String(32), primary_key=True)
+    # 历史文章是否已全部建立索引，未完成时检索回退为标题 LIKE 匹配
+    ready = Column(Integer, default=0)
+    # 回填进度：最后处理的文章位置
+    checkpoint = Column(String(512), default='')
+    indexed_count = Column(Integer, default=0)
+    total_count = Column(Integer, default=0)
+    updated_at = Column(DateTime)
@@ -0,0 +1,16 @@
+from  .base import Base,Column,String,Integer,DateTime
+
+class FeedStats(Base):
+    """每个公众号的文章统计，由文章写入时增量维护，定时全量校正"""
+    from_attributes = True
+    __tablename__ = 'feed_stats'
+    mp_id = Column(String(255), primary_key=True)
+    # 文章总数
+    total_count = Column(Integer, default=0)
+    # 有内容的文章数量
+    content_count = Column(Integer, default=0)
+    # 状态不是ACTIVE的文章数量(含已删除)
+    deleted_count = Column(Integer, default=0)
+    # 最新文章发布时间
+    last_publish = Column(Integer, default=0)
+    updated_at = Column(DateTime)
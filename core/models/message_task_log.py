@@ -4,9 +4,9 @@ from .base import Base,Column, Integer, String, DateTime,JSON,Text
 from datetime import datetime
 
 # 定义 MessageTaskLog 类，继承自 Base 基类
-class MessageTask(Base):
+class MessageTaskLog(Base):
     from_attributes = True
-    # 指定数据库表名为 message_tasks
+    # 指定数据库表名为 message_tasks_logs
     __tablename__ = 'message_tasks_logs'
     
     # 定义 id 字段，作为主键，同时创建索引
@@ -28,6 +28,20 @@ def _is_bark_url(webhook_url: str) -> bool:
     return False
 
 
+def detect_notice_type(webhook_url: str) -> str:
+    """根据 webhook 地址识别通知类型"""
+    if 'qyapi.weixin.qq.com' in webhook_url:
+        return 'wechat'
+    elif 'oapi.dingtalk.com' in webhook_url:
+        return 'dingtalk'
+    # 兼容企业本地化部署的飞书，如open.feishu.xxxx.com
+    elif 'open.feishu.' in webhook_url:
+        return 'feishu'
+    elif _is_bark_url(webhook_url):
+        return 'bark'
+    return 'custom'
+
+
 def notice( webhook_url, title, text,notice_type: str=None):
     """
     公用通知方法，根据类型判断调用哪种通知
@@ -43,27 +57,17 @@ def notice( webhook_url, title, text,notice_type: str=None):
         return
     # 优先notice_type；未传入时才按 URL 自动识别
     if not notice_type:
-        if 'qyapi.weixin.qq.com' in webhook_url:
-            notice_type = 'wechat'
-        elif 'oapi.dingtalk.com' in webhook_url:
-            notice_type = 'dingtalk'
-        # 兼容企业本地化部署的飞书，如open.feishu.xxxx.com
-        elif 'open.feishu.' in webhook_url:
-            notice_type = 'feishu'
-        elif _is_bark_url(webhook_url):
-            notice_type = 'bark'
-        else:
-            notice_type = 'custom'
+        notice_type = detect_notice_type(webhook_url)
     
     if notice_type == 'wechat':
-        send_wechat_message(webhook_url, title, text)
+        return send_wechat_message(webhook_url, title, text)
     elif notice_type == 'dingtalk':
-        send_dingtalk_message(webhook_url, title, text)
+        return send_dingtalk_message(webhook_url, title, text)
     elif notice_type == 'feishu':
-        send_feishu_message(webhook_url, title, text)
+        return send_feishu_message(webhook_url, title, text)
     elif notice_type == 'bark':
-        send_bark_message(webhook_url, title, text)
+        return send_bark_message(webhook_url, title, text)
     elif notice_type == 'custom':
-        send_custom_message(webhook_url, title, text)
+        return send_custom_message(webhook_url, title, text)
     else:
         raise ValueError(f'不支持的通知类型: {notice_type}')
\ No newline at end of file
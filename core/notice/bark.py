@@ -1,4 +1,4 @@
-import requests
+from .session import http_session
 
 
 def send_bark_message(webhook_url, title, text):
@@ -22,7 +22,7 @@ def send_bark_message(webhook_url, title, text):
             "title": title,
             "markdown": text
         }
-        response = requests.post(
+        response = http_session(url).post(
             url=url,
             json=payload,
             headers={"Content-Type": "application/json; charset=utf-8"},
@@ -30,5 +30,6 @@ def send_bark_message(webhook_url, title, text):
         )
         print(payload)
         print(response.text)
+        return response
     except Exception as e:
         print("Bark 通知发送失败", e)
@@ -1,5 +1,5 @@
-import requests
 import json
+from .session import http_session
 
 
 def send_custom_message(webhook_url, title, text):
@@ -17,11 +17,13 @@ def send_custom_message(webhook_url, title, text):
         "content": text
     }
     try:
-        response = requests.post(
+        response = http_session(webhook_url).post(
             url=webhook_url,
             headers=headers,
-            data=json.dumps(data)
+            data=json.dumps(data),
+            timeout=10
         )
         print(response.text)
+        return response
     except Exception as e:
         print('自定义webhook通知发送失败', e)
\ No newline at end of file
@@ -0,0 +1,320 @@
+import atexit
+import json
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+from core.config import cfg
+from core.print import print_error, print_info, print_success, print_warning
+from .session import http_session, close_sessions
+from . import detect_notice_type
+
+# 各平台单条消息大小上限(字节)，合并消息时按此切分
+# 企业微信和Bark发送时会按字符截断，这里取截断长度保证合并后不丢内容
+NOTICE_SIZE_LIMITS = {
+    "wechat": 2048,
+    "dingtalk": 20000,
+    "feishu": 30000,
+    "bark": 2000,
+}
+COALESCE_SEPARATOR = "\n\n---\n\n"
+
+
+@dataclass
+class DeliveryJob:
+    """一次待投递的通知或webhook请求"""
+    kind: str  # notice / webhook
+    url: str
+    title: str = ""
+    text: str = ""
+    notice_type: Optional[str] = None
+    headers: dict = field(default_factory=dict)
+    cookies: Optional[dict] = None
+    task_id: str = ""
+    mps_id: str = ""
+    attempts: int = 0
+    last_error: str = ""
+
+
+def _check_response(response, url: str = "") -> None:
+    """检查通知平台返回结果，失败时抛出异常以触发重试"""
+    if response is None:
+        raise ValueError("通知发送失败，未获取到响应")
+    response.raise_for_status()
+    try:
+        body = response.json()
+    except ValueError:
+        return
+    if isinstance(body, dict):
+        # 钉钉/企业微信返回 errcode，飞书返回 code
+        code = body.get("errcode")
+        if code is None and 'open.feishu.' in url:
+            code = body.get("code")
+        if code not in (0, "0", None):
+            raise ValueError(f"通知平台返回错误: {body}")
+
+
+def merge_notice_jobs(jobs: list[DeliveryJob]) -> list[DeliveryJob]:
+    """
+    合并同一地址的多条通知
+
+    按平台大小上限切分，每段合并为一条消息；
+    单条超过上限的消息保持原样单独发送
+    """
+    if len(jobs) <= 1:
+        return list(jobs)
+    first = jobs[0]
+    notice_type = first.notice_type or detect_notice_type(first.url)
+    limit = NOTICE_SIZE_LIMITS.get(notice_type)
+    sep_size = len(COALESCE_SEPARATOR.encode("utf-8"))
+
+    groups: list[list[DeliveryJob]] = []
+    size = 0
+    for job in jobs:
+        job_size = len((job.text or "").encode("utf-8"))
+        if groups and (limit is None or size + sep_size + job_size <= limit):
+            groups[-1].append(job)
+            size += sep_size + job_size
+        else:
+            groups.append([job])
+            size = job_size
+
+    merged = []
+    for group in groups:
+        if len(group) == 1:
+            merged.append(group[0])
+            continue
+        titles = list(dict.fromkeys(j.title for j in group if j.title))
+        title = titles[0] if len(titles) == 1 else f"{titles[0]} 等{len(group)}条消息" if titles else ""
+        merged.append(DeliveryJob(
+            kind="notice",
+            url=first.url,
+            title=title,
+            text=COALESCE_SEPARATOR.join(j.text or "" for j in group),
+            notice_type=first.notice_type,
+            task_id=",".join(dict.fromkeys(j.task_id for j in group if j.task_id))[:255],
+            mps_id=",".join(dict.fromkeys(j.mps_id for j in group if j.mps_id))[:255],
+        ))
+    return merged
+
+
+class DeliveryWorker:
+    """
+    通知投递工作池
+
+    采集线程只负责把消息放入队列，由固定数量的投递线程发送，
+    失败后按指数退避重试，超过重试次数写入 MessageTaskLog 作为死信记录。
+    coalesce_window 大于0时，同一地址在窗口内的任务通知合并为一条发送。
+    进程退出时由 shutdown 发送等待中的任务，来不及发送的同样写入死信记录
+    """
+
+    def __init__(self, workers: int = 4, retries: int = 3, backoff: float = 2.0, maxsize: int = 1000,
+                 coalesce_window: float = 0, tag: str = "通知投递"):
+        self.workers = max(1, workers)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.coalesce_window = coalesce_window
+        self.tag = tag
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._pending: dict[tuple, list[DeliveryJob]] = {}
+        # 未到期的延迟任务(合并窗口、退避重试) -> (函数, 参数)
+        self._timers: dict[threading.Timer, tuple] = {}
+        self._closing = False
+        self._stats = {"delivered": 0, "retried": 0, "dead": 0, "coalesced": 0}
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"delivery-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        print_info(f"{self.tag}线程池已启动，线程数: {self.workers}")
+
+    def submit(self, job: DeliveryJob) -> None:
+        """加入投递队列，队列已满时阻塞等待(背压)"""
+        self.start()
+        # 只合并任务产生的通知，系统通知(如授权二维码)立即发送；关闭期间不再合并
+        if self.coalesce_window > 0 and job.kind == "notice" and job.task_id and not self._closing:
+            self._coalesce(job)
+            return
+        self._queue.put(job)
+
+    def _coalesce(self, job: DeliveryJob) -> None:
+        key = (job.url, job.notice_type)
+        with self._lock:
+            jobs = self._pending.setdefault(key, [])
+            jobs.append(job)
+            if len(jobs) > 1:
+                return
+        self._schedule(self.coalesce_window, self._flush_pending, key)
+
+    def _flush_pending(self, key: tuple) -> None:
+        with self._lock:
+            jobs = self._pending.pop(key, [])
+        merged = merge_notice_jobs(jobs)
+        if len(merged) < len(jobs):
+            with self._lock:
+                self._stats["coalesced"] += len(jobs) - len(merged)
+            print_info(f"{self.tag}合并: {len(jobs)}条通知合并为{len(merged)}条")
+        for job in merged:
+            self._queue.put(job)
+
+    def notice(self, webhook_url: str, title: str, text: str, notice_type: str = None, task_id: str = "", mps_id: str = "") -> None:
+        if len(str(webhook_url or "")) == 0:
+            raise ValueError('未提供webhook_url')
+        self.submit(DeliveryJob(kind="notice", url=webhook_url, title=title, text=text,
+                                notice_type=notice_type, task_id=task_id, mps_id=mps_id))
+
+    def webhook(self, url: str, payload: str, headers: dict = None, cookies: dict = None, task_id: str = "", mps_id: str = "") -> None:
+        self.submit(DeliveryJob(kind="webhook", url=url, text=payload, headers=headers or {},
+                                cookies=cookies, task_id=task_id, mps_id=mps_id))
+
+    def deliver(self, job: DeliveryJob) -> None:
+        """同步发送一次，失败时抛出异常"""
+        if job.kind == "notice":
+            from core.notice import notice
+            _check_response(notice(job.url, job.title, job.text, notice_type=job.notice_type), job.url)
+        elif job.kind == "webhook":
+            response = http_session(job.url).post(
+                job.url,
+                data=job.text.encode("utf-8") if isinstance(job.text, str) else job.text,
+                headers=job.headers,
+                cookies=job.cookies,
+                timeout=30
+            )
+            response.raise_for_status()
+        else:
+            raise ValueError(f"未知的投递类型: {job.kind}")
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self.deliver(job)
+                with self._lock:
+                    self._stats["delivered"] += 1
+                print_success(f"{self.tag}成功: {job.kind} {job.task_id}")
+            except Exception as e:
+                self._retry(job, e)
+            finally:
+                self._queue.task_done()
+
+    def _retry(self, job: DeliveryJob, error: Exception) -> None:
+        job.attempts += 1
+        job.last_error = str(error)
+        if job.attempts > self.retries or self._closing:
+            self._dead_letter(job)
+            return
+        delay = self.backoff * (2 ** (job.attempts - 1))
+        with self._lock:
+            self._stats["retried"] += 1
+        print_warning(f"{self.tag}失败，{delay:.0f}秒后第{job.attempts}次重试: {error}")
+        # 延迟后重新入队，不占用投递线程
+        self._schedule(delay, self._queue.put, job)
+
+    def _schedule(self, delay: float, func, arg) -> None:
+        """延迟执行 func(arg)，shutdown 时未到期的立即执行"""
+        timer = None
+
+        def run():
+            with self._lock:
+                if self._timers.pop(timer, None) is None:
+                    # 已由 shutdown 执行
+                    return
+            func(arg)
+
+        timer = threading.Timer(delay, run)
+        timer.daemon = True
+        with self._lock:
+            closing = self._closing
+            if not closing:
+                self._timers[timer] = (func, arg)
+        if closing:
+            func(arg)
+        else:
+            timer.start()
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """
+        进程退出时发送等待中的任务
+
+        等待合并的通知和退避重试中的任务立即入队，timeout 秒内发送队列中的任务(关闭期间失败不再重试)，
+        仍未发送的写入死信记录
+        """
+        with self._lock:
+            self._closing = True
+            timers, self._timers = self._timers, {}
+        for timer, (func, arg) in timers.items():
+            timer.cancel()
+            func(arg)
+        if self._threads:
+            deadline = time.monotonic() + timeout
+            while self._queue.unfinished_tasks and time.monotonic() < deadline:
+                time.sleep(0.1)
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job.last_error = job.last_error or "服务关闭时未发送"
+            self._dead_letter(job)
+            self._queue.task_done()
+
+    def _dead_letter(self, job: DeliveryJob) -> None:
+        with self._lock:
+            self._stats["dead"] += 1
+        print_error(f"{self.tag}最终失败({job.attempts}次): {job.last_error}")
+        try:
+            from core.db import DB
+            from core.models.message_task_log import MessageTaskLog
+            from core.models.base import DATA_STATUS
+            session = DB.get_session()
+            now = datetime.now()
+            session.add(MessageTaskLog(
+                id=str(uuid.uuid4()),
+                task_id=job.task_id or "sys_notice",
+                mps_id=job.mps_id or "",
+                update_count=0,
+                log=json.dumps({
+                    "kind": job.kind,
+                    "url": job.url,
+                    "title": job.title,
+                    "attempts": job.attempts,
+                    "error": job.last_error,
+                    "payload": job.text,
+                }, ensure_ascii=False),
+                status=DATA_STATUS.FAILED,
+                created_at=now,
+                updated_at=now
+            ))
+            session.commit()
+        except Exception as e:
+            print_error(f"写入死信记录失败: {e}")
+
+    def get_info(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._queue.qsize(),
+                "coalescing": sum(len(jobs) for jobs in self._pending.values()),
+                **self._stats
+            }
+
+
+delivery = DeliveryWorker(
+    workers=int(cfg.get("webhook.workers", 4)),
+    retries=int(cfg.get("webhook.retries", 3)),
+    backoff=float(cfg.get("webhook.retry_backoff", 2)),
+    maxsize=int(cfg.get("webhook.queue_size", 1000)),
+    coalesce_window=float(cfg.get("webhook.coalesce_window", 0)),
+)
+# 退出时先发送等待中的任务，再关闭共享会话(atexit 按注册的逆序执行)
+atexit.register(close_sessions)
+atexit.register(delivery.shutdown)
@@ -1,5 +1,5 @@
-import requests
 import json
+from .session import http_session
 def send_dingtalk_message(webhook_url, title, text, is_at_all=False, at_mobiles=[]):
     """
     发送Markdown格式消息
@@ -24,12 +24,14 @@ def send_dingtalk_message(webhook_url, title, text, is_at_all=False, at_mobiles=
         }
     }
     try:
-        response = requests.post(
+        response = http_session(webhook_url).post(
             url=webhook_url,
             headers=headers,
-            data=json.dumps(data)
+            data=json.dumps(data),
+            timeout=10
         )
         print(response.text)
+        return response
     except Exception as e:
         print('通知发送失败', e)
 # 使用示例
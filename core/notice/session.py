@@ -0,0 +1,33 @@
+import threading
+import requests
+from urllib.parse import urlparse
+
+_sessions: dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+def http_session(url: str) -> requests.Session:
+    """
+    获取目标地址对应的共享会话
+
+    同一 scheme+host 复用一个 requests.Session，
+    避免每条通知都重新建立 TCP/TLS 连接
+    """
+    parsed = urlparse(url or "")
+    key = f"{parsed.scheme}://{parsed.netloc}".lower()
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                _sessions[key] = session
+    return session
+
+
+def close_sessions() -> None:
+    """关闭所有共享会话"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
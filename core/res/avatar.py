@@ -1,38 +1,169 @@
 
 from core.config import cfg
+import asyncio
+import hashlib
+import json
+import mimetypes
 import os
-import uuid
-import os
+import threading
+import time
 import requests
+from typing import Optional
 from urllib.parse import urlparse
+from core.res.image_cache import url_key, DEFAULT_HEADERS
 files_dir="data/files"
 avatar_dir=f"{files_dir}/avatars"
+# 头像URL索引: URL的缓存键 -> 文件名、内容哈希、ETag
+avatar_index_dir=f"{avatar_dir}/.index"
 os.makedirs(avatar_dir, exist_ok=True)
+# 本地头像超过该时间(秒)后向源站重新校验
+REFRESH_INTERVAL = int(cfg.get("avatar.refresh_interval", 86400))
+CONTENT_TYPE_EXT = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp"}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(DEFAULT_HEADERS)
+        return _session
+
+
+def _index_path(avatar_url: str) -> str:
+    return os.path.join(avatar_index_dir, f"{url_key(avatar_url)}.json")
+
+
+def _load_entry(avatar_url: str) -> Optional[dict]:
+    """已保存的头像信息，文件不存在时返回None"""
+    try:
+        with open(_index_path(avatar_url), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(os.path.join(avatar_dir, entry.get("file", ""))):
+        return None
+    return entry
+
+
+def _entry_path(entry: dict) -> str:
+    return f"{avatar_dir}/{entry['file']}"
+
+
+def _write_entry(avatar_url: str, entry: dict) -> None:
+    os.makedirs(avatar_index_dir, exist_ok=True)
+    path = _index_path(avatar_url)
+    temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(temp, path)
+
+
+def _conditional_headers(entry: Optional[dict]) -> dict:
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def _is_fresh(entry: Optional[dict]) -> bool:
+    return entry is not None and time.time() - entry.get("fetched_at", 0) < REFRESH_INTERVAL
+
+
+def _save_response(avatar_url: str, entry: Optional[dict], status_code: int, content: bytes, headers) -> str:
+    """
+    保存下载结果，返回本地路径
+
+    文件按内容哈希命名，相同的头像只保存一份；源站返回304时沿用已保存的文件
+    """
+    if status_code == 304 and entry is not None:
+        entry["fetched_at"] = time.time()
+        _write_entry(avatar_url, entry)
+        return _entry_path(entry)
+    if status_code != 200:
+        raise ValueError(f"HTTP {status_code}")
+    sha = hashlib.sha256(content).hexdigest()
+    content_type = (headers.get("Content-Type") or "").split(";")[0].strip().lower()
+    file_ext = CONTENT_TYPE_EXT.get(content_type) or os.path.splitext(urlparse(avatar_url).path)[1] \
+        or mimetypes.guess_extension(content_type) or ".jpg"
+    file_name = f"{sha[:32]}{file_ext}"
+    file_path = os.path.join(avatar_dir, file_name)
+    if not os.path.exists(file_path):
+        temp = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(content)
+        os.replace(temp, file_path)
+    entry = {
+        "url": avatar_url,
+        "file": file_name,
+        "sha": sha,
+        "etag": headers.get("ETag", ""),
+        "last_modified": headers.get("Last-Modified", ""),
+        "fetched_at": time.time(),
+    }
+    _write_entry(avatar_url, entry)
+    return _entry_path(entry)
+
+
 def save_avatar_locally(avatar_url):
     if not cfg.get("local_avatar",False):
         return avatar_url
     if not avatar_url:
         return None
-    
-    # 确保存储目录存在
-    save_dir = avatar_dir
-    os.makedirs(save_dir, exist_ok=True)
-    
-    # 生成唯一文件名
-    file_ext = os.path.splitext(urlparse(avatar_url).path)[1]
-    if not file_ext:
-        file_ext = ".jpg"
-    file_name = f"{uuid.uuid4().hex}{file_ext}"
-    file_path = os.path.join(save_dir, file_name)
-    
-    # 下载并保存文件
+
+    # 同一URL已保存且未过期时直接使用
+    entry = _load_entry(avatar_url)
+    if _is_fresh(entry):
+        return _entry_path(entry)
+
+    # 下载并保存文件，已保存过时使用 ETag 条件请求
     try:
-        response = requests.get(avatar_url)
-        response.raise_for_status()
-        with open(file_path, "wb") as f:
-            f.write(response.content)
-        return file_path
+        response = _get_session().get(avatar_url, headers=_conditional_headers(entry), timeout=20)
+        return _save_response(avatar_url, entry, response.status_code, response.content, response.headers)
     except Exception as e:
         print(f"保存头像失败: {str(e)}")
-        return None
+        return _entry_path(entry) if entry else None
+
+
+async def save_avatars_locally(avatar_urls: list, concurrency: int = None) -> dict:
+    """
+    并发保存多个头像，用于批量导入公众号
+
+    Returns:
+        dict: 头像URL -> 本地路径，未开启本地头像时为原URL，下载失败时为None
+    """
+    urls = list(dict.fromkeys(url for url in avatar_urls if url))
+    if not cfg.get("local_avatar",False):
+        return {url: url for url in urls}
+    import httpx
+    concurrency = max(1, int(concurrency or cfg.get("avatar.workers", 8)))
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+
+    async def save(client: httpx.AsyncClient, avatar_url: str):
+        entry = await asyncio.to_thread(_load_entry, avatar_url)
+        if _is_fresh(entry):
+            results[avatar_url] = _entry_path(entry)
+            return
+        try:
+            async with semaphore:
+                response = await client.get(avatar_url, headers=_conditional_headers(entry))
+            results[avatar_url] = await asyncio.to_thread(
+                _save_response, avatar_url, entry, response.status_code, response.content, response.headers)
+        except Exception as e:
+            print(f"保存头像失败: {avatar_url}, {str(e)}")
+            results[avatar_url] = _entry_path(entry) if entry else None
 
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(headers=DEFAULT_HEADERS, timeout=20, limits=limits, follow_redirects=True) as client:
+        await asyncio.gather(*(save(client, url) for url in urls if urlparse(url).scheme in ("http", "https")))
+    # 本地路径等非网络地址保持不变
+    for url in urls:
+        results.setdefault(url, url)
+    return results
@@ -0,0 +1,367 @@
+"""
+图片缓存
+
+导出、图片反向代理和头像共用的磁盘缓存，按内容哈希存储：
+    - blobs/<sha[:2]>/<sha>          图片内容，sha 为内容的 sha256，不同URL的相同图片只存一份
+    - index/<key[:2]>/<key>.json     URL索引，key 为去掉协议的URL的 sha256，记录 sha、类型、ETag等
+    - retain/<sha[:2]>/<sha>         保留标记，文件修改时间为保留截止时间
+缓存总大小超过上限时按最近访问时间淘汰图片，直到降到上限的90%，保留期内的图片最后淘汰。
+同一进程内并发下载同一URL时只下载一次，多进程同时写入同一文件时通过原子改名保证完整。
+
+配置:
+    - image_cache.dir: 缓存目录
+    - image_cache.max_size: 缓存大小上限(MB)
+    - image_cache.workers: 预取图片的并发数
+    - image_cache.timeout: 下载超时(秒)
+    - image_cache.max_image_size: 单张图片大小上限(MB)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, replace
+from typing import Iterable, Optional
+from urllib.parse import urlparse
+import requests
+from core.config import cfg
+from core.print import print_error, print_info, print_warning
+
+# 下载图片时使用的请求头
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+}
+# 命中时最多每隔多久更新一次访问时间(秒)，避免每次读取都写文件元数据
+TOUCH_INTERVAL = 3600
+# 图片代理允许访问的微信图片域名
+PROXY_HOSTS = ["mmbiz.qpic.cn","mmbiz.qlogo.cn","mmecoa.qpic.cn"]
+
+
+@dataclass
+class CachedImage:
+    url: str
+    sha: str
+    path: str
+    content_type: str = ""
+    size: int = 0
+    etag: str = ""
+    last_modified: str = ""
+    fetched_at: float = 0
+
+
+def url_key(url: str) -> str:
+    """URL的缓存键，http 和 https 视为同一地址，#后为缩放/转码后的图片参数"""
+    parsed = urlparse(url or "")
+    normalized = f"//{parsed.netloc}{parsed.path}"
+    if parsed.query:
+        normalized += f"?{parsed.query}"
+    if parsed.fragment:
+        normalized += f"#{parsed.fragment}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    def __init__(self, root: str, max_size: int = 1024 * 1024 * 1024, workers: int = 8,
+                 timeout: float = 20, max_image_size: int = 20 * 1024 * 1024):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.index_dir = os.path.join(root, "index")
+        self.retain_dir = os.path.join(root, "retain")
+        self.max_size = max_size
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_image_size = max_image_size
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._inflight: dict[str, threading.Lock] = {}
+        # 缓存总大小的估计值，首次写入时扫描目录得到
+        self._total: Optional[int] = None
+        self._stats = {"hits": 0, "misses": 0, "downloads": 0, "failed": 0, "evicted": 0}
+        self._session = None
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.blob_dir, sha[:2], sha)
+
+    def _retain_path(self, sha: str) -> str:
+        return os.path.join(self.retain_dir, sha[:2], sha)
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self.index_dir, key[:2], f"{key}.json")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def lookup(self, url: str, max_age: float = None) -> Optional[CachedImage]:
+        """查找已缓存的图片，max_age 为允许的最长缓存时间(秒)"""
+        index_path = self._index_path(url_key(url))
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data["path"] = self._blob_path(data["sha"])
+            entry = CachedImage(**data)
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        try:
+            mtime = os.path.getmtime(entry.path)
+        except OSError:
+            # 图片已被淘汰，索引失效
+            self._remove(index_path)
+            return None
+        if max_age is not None and time.time() - entry.fetched_at > max_age:
+            return None
+        if time.time() - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(entry.path)
+            except OSError:
+                pass
+        return entry
+
+    def touch(self, entry: CachedImage) -> None:
+        """重新校验未变化后更新获取时间"""
+        entry.fetched_at = time.time()
+        self._write_index(entry)
+
+    def store(self, url: str, data: bytes, content_type: str = "", etag: str = "",
+              last_modified: str = "") -> CachedImage:
+        """保存图片内容并建立URL索引"""
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha)
+        if not os.path.exists(path):
+            self._write_file(path, data)
+            self._grow(len(data))
+        entry = CachedImage(url=url, sha=sha, path=path, content_type=content_type or "",
+                            size=len(data), etag=etag or "", last_modified=last_modified or "",
+                            fetched_at=time.time())
+        self._write_index(entry)
+        return entry
+
+    def retain(self, entry: CachedImage, days: float) -> None:
+        """图片在 days 天内优先保留，容量不足时最后淘汰"""
+        until = time.time() + days * 86400
+        path = self._retain_path(entry.sha)
+        try:
+            if os.path.getmtime(path) >= until:
+                return
+        except OSError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+        os.utime(path, (until, until))
+
+    def _retained(self) -> set:
+        """保留期内的图片sha，同时删除过期的保留标记"""
+        retained = set()
+        now = time.time()
+        for root, _, names in os.walk(self.retain_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) > now:
+                        retained.add(name)
+                    else:
+                        os.remove(path)
+                except OSError:
+                    pass
+        return retained
+
+    def alias(self, url: str, entry: CachedImage) -> CachedImage:
+        """让另一个URL指向已缓存的图片，不复制内容"""
+        aliased = replace(entry, url=url, fetched_at=time.time())
+        self._write_index(aliased)
+        return aliased
+
+    def store_file(self, url: str, temp_path: str, content_type: str = "", etag: str = "",
+                   last_modified: str = "") -> CachedImage:
+        """把已写入的临时文件移入缓存，临时文件需与缓存在同一文件系统"""
+        digest = hashlib.sha256()
+        with open(temp_path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        sha = digest.hexdigest()
+        path = self._blob_path(sha)
+        size = os.path.getsize(temp_path)
+        if os.path.exists(path):
+            self._remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            self._grow(size)
+        entry = CachedImage(url=url, sha=sha, path=path, content_type=content_type or "",
+                            size=size, etag=etag or "", last_modified=last_modified or "",
+                            fetched_at=time.time())
+        self._write_index(entry)
+        return entry
+
+    def temp_path(self) -> str:
+        """缓存目录内的临时文件路径，用于边下载边写入"""
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        return os.path.join(tmp_dir, f"{os.getpid()}_{threading.get_ident()}_{time.time_ns()}")
+
+    def _write_index(self, entry: CachedImage) -> None:
+        data = asdict(entry)
+        data.pop("path")
+        self._write_file(self._index_path(url_key(entry.url)), json.dumps(data).encode("utf-8"))
+
+    def _write_file(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _get_session(self) -> requests.Session:
+        if self._session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers * 2)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            self._session = session
+        return self._session
+
+    def fetch(self, url: str, max_age: float = None) -> Optional[CachedImage]:
+        """返回缓存的图片，未缓存时下载，下载失败返回None"""
+        entry = self.lookup(url, max_age)
+        if entry is not None:
+            self._count("hits")
+            return entry
+        key = url_key(url)
+        with self._lock:
+            lock = self._inflight.setdefault(key, threading.Lock())
+        with lock:
+            # 等待其他线程下载同一图片后直接使用
+            entry = self.lookup(url, max_age)
+            if entry is not None:
+                self._count("hits")
+                return entry
+            self._count("misses")
+            try:
+                return self._download(url)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def _download(self, url: str) -> Optional[CachedImage]:
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            print_warning(f"无效的图片URL: {url}")
+            self._count("failed")
+            return None
+        try:
+            with self._get_session().get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(65536):
+                    size += len(chunk)
+                    if size > self.max_image_size:
+                        raise ValueError(f"图片超过 {self.max_image_size // (1024 * 1024)}MB")
+                    chunks.append(chunk)
+                headers = response.headers
+                entry = self.store(url, b"".join(chunks), headers.get("Content-Type", ""),
+                                   headers.get("ETag", ""), headers.get("Last-Modified", ""))
+            self._count("downloads")
+            return entry
+        except Exception as e:
+            self._count("failed")
+            print_error(f"下载图片失败: {url}, 错误: {str(e)}")
+            return None
+
+    def prefetch(self, urls: Iterable[str], max_age: float = None) -> dict[str, Optional[CachedImage]]:
+        """并发下载多张图片，返回 URL -> 缓存项(失败为None)"""
+        unique = list(dict.fromkeys(url for url in urls if url))
+        if not unique:
+            return {}
+        if len(unique) == 1:
+            return {unique[0]: self.fetch(unique[0], max_age)}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(unique)), thread_name_prefix="image_cache") as executor:
+            return dict(zip(unique, executor.map(lambda url: self.fetch(url, max_age), unique)))
+
+    def _scan(self) -> list:
+        """返回 [(访问时间, 大小, 路径)]"""
+        files = []
+        for root, _, names in os.walk(self.blob_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _grow(self, size: int) -> None:
+        with self._lock:
+            if self._total is None:
+                self._total = sum(f[1] for f in self._scan())
+            else:
+                self._total += size
+            over = self.max_size > 0 and self._total > self.max_size
+        if over:
+            threading.Thread(target=self.evict, name="image_cache_evict", daemon=True).start()
+
+    def evict(self) -> int:
+        """按最近访问时间淘汰图片，直到总大小降到上限的90%，返回删除的图片数"""
+        if not self._evict_lock.acquire(blocking=False):
+            return 0
+        try:
+            files = self._scan()
+            total = sum(f[1] for f in files)
+            target = int(self.max_size * 0.9)
+            removed = 0
+            if total > self.max_size:
+                retained = self._retained()
+                # 先淘汰不在保留期内的图片，各自按最近访问时间排序
+                files.sort(key=lambda f: (os.path.basename(f[2]) in retained, f[0]))
+                for _, size, path in files:
+                    if total <= target:
+                        break
+                    self._remove(path)
+                    total -= size
+                    removed += 1
+                print_info(f"图片缓存已淘汰 {removed} 张图片，当前 {total // (1024 * 1024)}MB")
+            # 清理中断的下载留下的临时文件
+            tmp_dir = os.path.join(self.root, "tmp")
+            if os.path.isdir(tmp_dir):
+                for name in os.listdir(tmp_dir):
+                    path = os.path.join(tmp_dir, name)
+                    try:
+                        if time.time() - os.path.getmtime(path) > TOUCH_INTERVAL:
+                            os.remove(path)
+                    except OSError:
+                        pass
+            with self._lock:
+                self._total = total
+                self._stats["evicted"] += removed
+            return removed
+        finally:
+            self._evict_lock.release()
+
+    def get_info(self) -> dict:
+        with self._lock:
+            return {
+                "dir": self.root,
+                "max_size": self.max_size,
+                "size": self._total,
+                **self._stats,
+            }
+
+
+image_cache = ImageCache(
+    root=cfg.get("image_cache.dir", "./data/cache/images"),
+    max_size=int(cfg.get("image_cache.max_size", 1024)) * 1024 * 1024,
+    workers=int(cfg.get("image_cache.workers", 8)),
+    timeout=float(cfg.get("image_cache.timeout", 20)),
+    max_image_size=int(cfg.get("image_cache.max_image_size", 20)) * 1024 * 1024,
+)
@@ -0,0 +1,164 @@
+"""
+图片缩放与转码
+
+图片代理按查询参数生成缩小、转码后的图片，结果以 (原图URL, 参数) 为键保存在图片缓存中：
+    - w: 最大宽度，按 WIDTHS 向上取整，避免生成过多尺寸
+    - q: 压缩质量 30-95
+    - fmt: webp / avif / jpeg / png / auto(按浏览器 Accept 选择)
+动图和无需处理的图片直接返回原图。
+
+配置(RSS和页面中的图片链接默认附加的参数):
+    - image_cache.resize_width: 默认宽度，0为原图
+    - image_cache.resize_quality: 默认质量
+    - image_cache.resize_format: 默认格式，为空时保持原格式
+"""
+import io
+from typing import Optional
+from urllib.parse import urlencode
+from core.config import cfg
+
+# 允许的输出宽度
+WIDTHS = (160, 320, 480, 640, 800, 1080, 1280, 1920)
+DEFAULT_QUALITY = 80
+# 输出格式 -> (Pillow格式, Content-Type)
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+# Pillow识别的原图格式 -> 输出格式
+SOURCE_FORMATS = {"JPEG": "jpeg", "MPO": "jpeg", "PNG": "png", "WEBP": "webp", "AVIF": "avif"}
+
+PROXY_PREFIX = "/static/res/logo/"
+# 图片链接默认附加的缩放/转码参数，启动时读取一次
+RESIZE_WIDTH = cfg.get("image_cache.resize_width", 0)
+RESIZE_QUALITY = cfg.get("image_cache.resize_quality", 0)
+RESIZE_FORMAT = cfg.get("image_cache.resize_format", "")
+
+_supported: Optional[set] = None
+
+
+def supported_formats() -> set:
+    """当前Pillow可以写入的格式"""
+    global _supported
+    if _supported is None:
+        try:
+            from PIL import Image, features
+            try:
+                # AVIF 需要 pillow-avif-plugin
+                import pillow_avif  # noqa: F401
+            except ImportError:
+                pass
+            Image.init()
+            _supported = {"jpeg", "png"}
+            if features.check("webp"):
+                _supported.add("webp")
+            if "AVIF" in Image.SAVE:
+                _supported.add("avif")
+        except ImportError:
+            _supported = set()
+    return _supported
+
+
+def normalize_params(width=None, quality=None, fmt: str = None, accept: str = "") -> Optional[dict]:
+    """校验并规范化转换参数，没有需要的转换时返回None"""
+    try:
+        width = int(width or 0)
+        quality = int(quality or 0)
+    except (TypeError, ValueError):
+        return None
+    fmt = (fmt or "").lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    supported = supported_formats()
+    if not supported:
+        return None
+    if fmt == "auto":
+        accept = accept or ""
+        fmt = next((f for f in ("avif", "webp") if f"image/{f}" in accept and f in supported), "")
+    elif fmt not in supported:
+        fmt = ""
+    if width > 0:
+        width = next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+    else:
+        width = 0
+    if not width and not fmt:
+        return None
+    quality = min(95, max(30, quality)) if quality else DEFAULT_QUALITY
+    return {"w": width, "q": quality, "fmt": fmt}
+
+
+def variant_url(url: str, params: dict) -> str:
+    """转换结果在图片缓存中的键"""
+    return f"{url}#{urlencode(sorted(params.items()))}"
+
+
+def transform_image(path: str, width: int = 0, quality: int = DEFAULT_QUALITY, fmt: str = "") -> Optional[tuple]:
+    """
+    缩放/转码图片
+
+    Returns:
+        (图片内容, Content-Type)，无需处理(动图、原图已足够小且格式相同)时返回None
+    """
+    from PIL import Image, ImageOps
+    with Image.open(path) as img:
+        if getattr(img, "is_animated", False):
+            return None
+        source = SOURCE_FORMATS.get(img.format)
+        target = fmt or source
+        if target is None:
+            return None
+        resize = bool(width) and img.width > width
+        if not resize and target == source:
+            return None
+        img = ImageOps.exif_transpose(img)
+        if resize:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        if target == "jpeg" and img.mode not in ("RGB", "L"):
+            # JPEG不支持透明度，使用白色背景
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+        pil_format, content_type = FORMATS[target]
+        options = {"quality": quality}
+        if target == "jpeg":
+            options.update(optimize=True, progressive=True)
+        elif target == "png":
+            options = {"optimize": True}
+        elif target == "webp":
+            options["method"] = 4
+        buffer = io.BytesIO()
+        img.save(buffer, pil_format, **options)
+        return buffer.getvalue(), content_type
+
+
+def _query_string(width, quality, fmt) -> str:
+    query = {}
+    if width and int(width) > 0:
+        query["w"] = int(width)
+    if fmt:
+        query["fmt"] = fmt
+    if query and quality and int(quality) > 0:
+        query["q"] = int(quality)
+    return urlencode(query)
+
+
+DEFAULT_QUERY = _query_string(RESIZE_WIDTH, RESIZE_QUALITY, RESIZE_FORMAT)
+
+
+def proxy_image_url(url: str, base_url: str = "", width=None, quality=None, fmt: str = None) -> str:
+    """图片的代理地址，未指定参数时使用配置的默认缩放参数"""
+    if width is None and quality is None and fmt is None:
+        query = DEFAULT_QUERY
+    else:
+        query = _query_string(RESIZE_WIDTH if width is None else width,
+                              RESIZE_QUALITY if quality is None else quality,
+                              RESIZE_FORMAT if fmt is None else fmt)
+    proxied = f"{base_url}{PROXY_PREFIX}{url}"
+    if not query:
+        return proxied
+    return f"{proxied}{'&' if '?' in url else '?'}{query}"
@@ -2,7 +2,7 @@ import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, timezone
 import os
 import json
-from core.content_format import format_content
+from core.article_content import article_content
 class RSS:
     cache_dir = os.path.normpath("data/cache/rss")
     content_cache_dir = os.path.normpath("data/cache/content")
@@ -90,9 +90,11 @@ class RSS:
             处理后的字符串，所有图片URL前添加了前缀
         """
         import re
+        from core.res.image_transform import proxy_image_url
         try:
             pattern = re.compile(r'(<img[^>]*src=["\'])(?!\/static\/res\/logo\/)([^"\']*)', re.IGNORECASE)
-            return pattern.sub(r'\1/static/res/logo/\2', text)
+            # 按配置附加缩放/转码参数，阅读器获取合适尺寸的图片
+            return pattern.sub(lambda m: m.group(1) + proxy_image_url(m.group(2)), text)
         except:
             return text
        
@@ -215,7 +217,7 @@ class RSS:
                 type=self.get_content_type()
                 # content = ET.SubElement(entry, "content", type=f"{str(type)}") 
                 # content.text = format_content(rss_item["content"],type)
-                content=format_content(rss_item["content"],type)
+                content=article_content(rss_item,type)
                 try:
                     if cfg.get("rss.cdata",False)==True:
                         content = f"<![CDATA[{content}]]>"  # 使用CDATA包裹内容
@@ -268,7 +270,7 @@ class RSS:
                     "description": item["description"],
                     "link": item["link"],
                     "updated": item["updated"].isoformat() if isinstance(item["updated"], datetime) else item["updated"],
-                    "content": format_content(item["content"],type),
+                    "content": article_content(item,type),
                     "channel_name": item.get("mp_name", ""),
                     "feed": item.get("feed")
                 } for item in rss_list
@@ -302,21 +304,45 @@ class RSS:
         """
         ext = ext.lower().strip('.')
         self.ext=ext
-        if ext in ('rss', 'xml'):
-            return self.generate_rss(rss_list, title=title, link=link, description=description,language=language,image_url=image_url)
-        elif ext in ('atom','md','txt'):
-            return self.generate_atom(rss_list, title=title, link=link, description=description,language=language,image_url=image_url)
-        elif ext in ('json','jmd'):
-            return self.generate_json(rss_list, title=title, link=link, description=description,language=language,image_url=image_url)
+        generator = self._format_generator(ext)
+        if generator is not None:
+            return generator(rss_list, title=title, link=link, description=description,language=language,image_url=image_url)
         elif template is not None:
             return self.generate_by_template(rss_list,template, title=title, link=link, description=description,language=language,image_url=image_url)
         else:
             raise ValueError(f"Unsupported extension: {ext}")
+    def _format_generator(self,ext:str):
+        """扩展名对应的内置格式生成方法，不是内置格式时返回None"""
+        if ext in ('rss', 'xml'):
+            return self.generate_rss
+        elif ext in ('atom','md','txt'):
+            return self.generate_atom
+        elif ext in ('json','jmd'):
+            return self.generate_json
+        return None
+    def generate_iter(self,rss_list: dict,ext=str, title: str = "Mp-We-Rss", 
+                    link: str = "https://github.com/rachelos/we-mp-rss",
+                    description: str = "RSS频道", language: str = "zh-CN",image_url:str="",template:str=None):
+        """与 generate 相同，返回输出块的迭代器
+        
+        使用自定义模板时流式渲染，文章较多时无需等待全部渲染完成；
+        内置格式立即生成完整内容，作为唯一的输出块
+        """
+        ext = ext.lower().strip('.')
+        if self._format_generator(ext) is None and template is not None:
+            self.ext=ext
+            return self.generate_by_template_iter(rss_list,template, title=title, link=link, description=description,language=language,image_url=image_url)
+        return iter((self.generate(rss_list,ext=ext, title=title, link=link, description=description,language=language,image_url=image_url,template=template),))
     def generate_by_template(self,rss_list: dict, template: str, title: str = "Mp-We-Rss",link: str = "https://github.com/rachelos/we-mp-rss",description: str = "RSS频道",language: str = "zh-CN",image_url:str=""):
             from core.lax import TemplateParser
             template = TemplateParser(template)
             return template.render({"articles": rss_list, "title": title,"link":link,"description":description,"language":language,"image_url":image_url})
             pass
+    def generate_by_template_iter(self,rss_list: dict, template: str, title: str = "Mp-We-Rss",link: str = "https://github.com/rachelos/we-mp-rss",description: str = "RSS频道",language: str = "zh-CN",image_url:str=""):
+            """按模板流式生成内容，返回输出块的迭代器"""
+            from core.lax import TemplateParser
+            template = TemplateParser(template)
+            return template.render_iter({"articles": rss_list, "title": title,"link":link,"description":description,"language":language,"image_url":image_url})
     def clear_cache(self,mp_id:str=""):
 
         """清除所有缓存文件
@@ -0,0 +1,23 @@
+"""
+文章全文检索
+
+标题、摘要和去除HTML后的正文按中文二元分词建立索引，检索后端可选：
+- fts5: SQLite FTS5 虚拟表
+- terms: 数据库倒排表，适用于 MySQL/PostgreSQL
+文章写入时通过 ORM 事件增量更新索引；历史文章回填完成前，检索回退为标题 LIKE 匹配
+"""
+from .tokenizer import tokenize, parse_query, html_to_text
+from .backends import SearchBackend, Fts5Backend, TermIndexBackend
+from .index import (
+    get_search_backend,
+    get_index_state,
+    is_search_ready,
+    set_search_ready,
+    like_condition,
+    search_rank,
+    search_condition,
+    search_articles,
+    build_document,
+    index_articles,
+    flush_search_index,
+)
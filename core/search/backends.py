@@ -0,0 +1,157 @@
+import hashlib
+from collections import Counter
+from typing import List
+from sqlalchemy import Float, String, case, column, delete, distinct, func, insert, or_, select, text, union_all
+from core.models.article_search import ArticleSearchTerm
+from .tokenizer import QueryWord
+
+# 各字段的权重：标题 > 摘要 > 正文
+TITLE_WEIGHT = 5
+DESCRIPTION_WEIGHT = 2
+BODY_WEIGHT = 1
+
+
+class SearchBackend:
+    """
+    全文检索后端
+
+    文档为 {"id", "title", "description", "body"}，各字段为分词后的词列表；
+    ranked() 返回包含 id、score 两列的子查询，score 越大越相关
+    """
+    name = ""
+
+    def setup(self, engine) -> None:
+        """创建索引所需的表，不支持时抛出异常"""
+
+    def index(self, session, docs: List[dict]) -> None:
+        raise NotImplementedError
+
+    def remove(self, session, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def clear(self, session) -> None:
+        raise NotImplementedError
+
+    def ranked(self, words: List[QueryWord]):
+        raise NotImplementedError
+
+
+class Fts5Backend(SearchBackend):
+    """SQLite FTS5 虚拟表，rowid 取文章ID的哈希，按文章ID更新时无需扫描"""
+    name = "fts5"
+    TABLE = "article_fts"
+
+    def setup(self, engine) -> None:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE} "
+                "USING fts5(id UNINDEXED, title, description, body, tokenize='unicode61')"
+            ))
+
+    @staticmethod
+    def _rowid(article_id: str) -> int:
+        return int(hashlib.sha1(str(article_id).encode('utf-8')).hexdigest()[:15], 16)
+
+    def index(self, session, docs: List[dict]) -> None:
+        if not docs:
+            return
+        self.remove(session, [doc["id"] for doc in docs])
+        session.execute(
+            text(f"INSERT INTO {self.TABLE}(rowid, id, title, description, body) VALUES (:rowid, :id, :title, :description, :body)"),
+            [{
+                "rowid": self._rowid(doc["id"]),
+                "id": doc["id"],
+                "title": " ".join(doc["title"]),
+                "description": " ".join(doc["description"]),
+                "body": " ".join(doc["body"]),
+            } for doc in docs]
+        )
+
+    def remove(self, session, ids: List[str]) -> None:
+        if ids:
+            session.execute(text(f"DELETE FROM {self.TABLE} WHERE rowid = :rowid"),
+                            [{"rowid": self._rowid(i)} for i in ids])
+
+    def clear(self, session) -> None:
+        session.execute(text(f"DELETE FROM {self.TABLE}"))
+
+    @staticmethod
+    def match_query(words: List[QueryWord]) -> str:
+        """关键词的每个片段为一个短语，片段之间为 AND，关键词之间为 OR"""
+        matches = []
+        for word in words:
+            phrases = []
+            for phrase in word.phrases:
+                quoted = '"' + " ".join(phrase.tokens) + '"'
+                phrases.append(f"{quoted} *" if phrase.prefix else quoted)
+            matches.append("(" + " AND ".join(phrases) + ")")
+        return " OR ".join(matches)
+
+    def ranked(self, words: List[QueryWord]):
+        return text(
+            f"SELECT id, -bm25({self.TABLE}, 0, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}, {BODY_WEIGHT}) AS score "
+            f"FROM {self.TABLE} WHERE {self.TABLE} MATCH :q"
+        ).bindparams(q=self.match_query(words)).columns(
+            column("id", String), column("score", Float)
+        ).subquery("search_rank")
+
+
+class TermIndexBackend(SearchBackend):
+    """
+    数据库倒排表，适用于 MySQL/PostgreSQL 等不支持 FTS5 的数据库
+
+    关键词所有片段的词都出现在文章中才算匹配，前缀词使用 LIKE 'x%' 走索引
+    """
+    name = "terms"
+
+    def setup(self, engine) -> None:
+        ArticleSearchTerm.__table__.create(engine, checkfirst=True)
+
+    def index(self, session, docs: List[dict]) -> None:
+        if not docs:
+            return
+        self.remove(session, [doc["id"] for doc in docs])
+        rows = []
+        for doc in docs:
+            weights = Counter()
+            for field, weight in (("title", TITLE_WEIGHT), ("description", DESCRIPTION_WEIGHT), ("body", BODY_WEIGHT)):
+                for token in doc[field]:
+                    weights[token] += weight
+            rows.extend({"term": term, "article_id": doc["id"], "weight": weight} for term, weight in weights.items())
+        if rows:
+            session.execute(insert(ArticleSearchTerm), rows)
+
+    def remove(self, session, ids: List[str]) -> None:
+        if ids:
+            session.execute(delete(ArticleSearchTerm).where(ArticleSearchTerm.article_id.in_(ids)))
+
+    def clear(self, session) -> None:
+        session.execute(delete(ArticleSearchTerm))
+
+    def ranked(self, words: List[QueryWord]):
+        T = ArticleSearchTerm
+        parts = []
+        for word in words:
+            exact = set()
+            prefixes = []
+            for phrase in word.phrases:
+                if phrase.prefix:
+                    exact.update(phrase.tokens[:-1])
+                    prefixes.append(T.term.like(f"{phrase.tokens[-1]}%"))
+                else:
+                    exact.update(phrase.tokens)
+            conditions = list(prefixes)
+            if exact:
+                conditions.append(T.term.in_(exact))
+            query = select(T.article_id.label("id"), func.sum(T.weight).label("score")).where(
+                or_(*conditions)
+            ).group_by(T.article_id)
+            # 关键词的所有词都出现在文章中，每个前缀至少匹配一个词
+            if exact:
+                query = query.having(func.count(distinct(case((T.term.in_(exact), T.term)))) == len(exact))
+            if len(conditions) > 1:
+                for prefix_match in prefixes:
+                    query = query.having(func.sum(case((prefix_match, 1), else_=0)) > 0)
+            parts.append(query)
+        matched = union_all(*parts).subquery("search_words") if len(parts) > 1 else parts[0].subquery("search_words")
+        return select(matched.c.id, func.sum(matched.c.score).label("score")).group_by(matched.c.id).subquery("search_rank")
@@ -0,0 +1,225 @@
+import atexit
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm.attributes import get_history
+from core.config import cfg
+from core.models.article import Article
+from core.models.article_search import SearchIndexState
+from core.print import print_error, print_info, print_warning
+from .backends import Fts5Backend, SearchBackend, TermIndexBackend
+from .tokenizer import html_to_text, parse_query, tokenize
+
+# 文章写入后合并建立索引的间隔(秒)
+FLUSH_DELAY = 5
+# 索引状态在进程内的缓存时间(秒)
+STATE_TTL = 60
+# 索引内容的版本，分词方式变化时加一，已有索引在后台按新方式重建，重建完成前检索回退为标题 LIKE
+INDEX_VERSION = 2
+
+_backend: Optional[SearchBackend] = None
+_backend_checked = False
+_backend_lock = threading.Lock()
+_ready: Optional[bool] = None
+_ready_checked = 0.0
+
+
+def get_search_backend() -> Optional[SearchBackend]:
+    """
+    按配置 search.backend 选择检索后端
+
+    auto: SQLite 使用 FTS5，其他数据库使用倒排表；like: 不建立索引
+    """
+    global _backend, _backend_checked
+    if _backend_checked:
+        return _backend
+    with _backend_lock:
+        if _backend_checked:
+            return _backend
+        from core.db import DB
+        name = str(cfg.get("search.backend", "auto") or "auto").lower()
+        candidates = []
+        if name in ("auto", "fts5") and DB.get_engine().dialect.name == "sqlite":
+            candidates.append(Fts5Backend())
+        if name in ("auto", "fts5", "terms"):
+            candidates.append(TermIndexBackend())
+        for backend in candidates:
+            try:
+                backend.setup(DB.get_engine())
+                _backend = backend
+                print_info(f"全文检索后端: {backend.name}")
+                break
+            except Exception as e:
+                print_warning(f"全文检索后端 {backend.name} 不可用: {e}")
+        _backend_checked = True
+        return _backend
+
+
+def get_index_state(session, backend: SearchBackend) -> SearchIndexState:
+    state_key = f"{backend.name}:v{INDEX_VERSION}"
+    state = session.query(SearchIndexState).filter(SearchIndexState.backend == state_key).first()
+    if state is None:
+        # 没有文章时不需要回填
+        has_articles = session.query(Article.id).first() is not None
+        state = SearchIndexState(backend=state_key, ready=0 if has_articles else 1, checkpoint='',
+                                 indexed_count=0, total_count=0, updated_at=datetime.now())
+        session.add(state)
+        session.commit()
+    return state
+
+
+def is_search_ready() -> bool:
+    """历史文章已全部建立索引"""
+    global _ready, _ready_checked
+    now = time.monotonic()
+    if _ready is not None and (_ready or now - _ready_checked < STATE_TTL):
+        return _ready
+    backend = get_search_backend()
+    if backend is None:
+        return False
+    from core.db import DB
+    try:
+        _ready = bool(get_index_state(DB.get_session(), backend).ready)
+    except Exception as e:
+        print_error(f"读取全文检索状态失败: {e}")
+        _ready = False
+    _ready_checked = now
+    return _ready
+
+
+def set_search_ready(ready: bool) -> None:
+    global _ready, _ready_checked
+    _ready = ready
+    _ready_checked = time.monotonic()
+
+
+def like_condition(keyword: str):
+    """索引不可用时按标题 LIKE 匹配"""
+    words = keyword.replace("-", " ").replace("|", " ").split(" ")
+    return or_(*[Article.title.like(f"%{w}%") for w in words])
+
+
+def search_rank(keyword: str):
+    """返回 (id, score) 子查询，索引不可用时返回None"""
+    words = parse_query(keyword)
+    if not words or not is_search_ready():
+        return None
+    return get_search_backend().ranked(words)
+
+
+def search_condition(keyword: str, rank=None):
+    """文章检索条件：使用全文索引匹配标题、摘要和正文"""
+    if rank is None:
+        rank = search_rank(keyword)
+    if rank is None:
+        return like_condition(keyword)
+    return Article.id.in_(select(rank.c.id))
+
+
+def search_articles(query, keyword: str):
+    """
+    按关键词筛选文章查询
+
+    索引可用时只保留匹配的文章并按相关度排序，调用方追加的排序作为次要排序；
+    否则按标题 LIKE 筛选
+    """
+    rank = search_rank(keyword)
+    if rank is None:
+        return query.filter(like_condition(keyword))
+    return query.join(rank, rank.c.id == Article.id).order_by(rank.c.score.desc())
+
+
+def build_document(article) -> dict:
+    """文章分词后的索引文档"""
+    # 优先使用写入时生成的纯文本
+    body = article.content_text if article.content_text is not None else html_to_text(article.content or "")
+    limit = int(cfg.get("search.body_limit", 5000) or 0)
+    if limit > 0:
+        body = body[:limit]
+    return {
+        "id": article.id,
+        # 标题中的英文单词同时索引后缀，支持单词中间的子串检索
+        "title": tokenize(article.title or "", infix=True),
+        "description": tokenize(article.description or ""),
+        "body": tokenize(body),
+    }
+
+
+def index_articles(session, articles: list) -> None:
+    backend = get_search_backend()
+    if backend is not None and articles:
+        backend.index(session, [build_document(article) for article in articles])
+
+
+# 等待建立索引的文章ID -> 是否删除
+_pending: dict = {}
+_lock = threading.Lock()
+_timer: Optional[threading.Timer] = None
+
+
+def _queue(article_id: str, removed: bool = False) -> None:
+    global _timer
+    if not article_id:
+        return
+    with _lock:
+        _pending[article_id] = removed
+        if _timer is None:
+            _timer = threading.Timer(FLUSH_DELAY, flush_search_index)
+            _timer.daemon = True
+            _timer.start()
+
+
+def flush_search_index() -> int:
+    """为最近写入的文章建立索引，返回处理的文章数量"""
+    global _timer
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _timer = None
+    if not pending:
+        return 0
+    backend = get_search_backend()
+    if backend is None:
+        return 0
+    from core.db import DB
+    session = DB.get_session()
+    try:
+        removed = [i for i, r in pending.items() if r]
+        changed = [i for i, r in pending.items() if not r]
+        backend.remove(session, removed)
+        if changed:
+            articles = session.query(Article).filter(Article.id.in_(changed)).all()
+            index_articles(session, articles)
+        session.commit()
+        return len(pending)
+    except Exception as e:
+        session.rollback()
+        with _lock:
+            for article_id, r in pending.items():
+                _pending.setdefault(article_id, r)
+        print_error(f"更新全文检索索引失败: {e}")
+        return 0
+
+
+atexit.register(flush_search_index)
+
+# 影响检索内容的字段
+_INDEXED_FIELDS = ('title', 'description', 'content')
+
+
+@event.listens_for(Article, 'after_insert')
+def _article_inserted(mapper, connection, target):
+    _queue(target.id)
+
+
+@event.listens_for(Article, 'after_update')
+def _article_updated(mapper, connection, target):
+    if any(get_history(target, key).has_changes() for key in _INDEXED_FIELDS):
+        _queue(target.id)
+
+
+@event.listens_for(Article, 'after_delete')
+def _article_deleted(mapper, connection, target):
+    _queue(target.id, removed=True)
@@ -0,0 +1,92 @@
+import unittest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+from core.models.article import Article
+from core.search import Fts5Backend, TermIndexBackend, parse_query, search_condition, tokenize
+
+ARTICLES = {
+    "a1": "公众号rss订阅教程",
+    "a2": "大模型api调用指南",
+    "a3": "openai发布新模型",
+    "a4": "今天天气不错",
+}
+
+
+class SearchBackendTestMixin:
+    """Index a few titles in an in-memory SQLite database and search them."""
+
+    backend_class = None
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        self.backend = self.backend_class()
+        self.backend.setup(self.engine)
+        self.session = Session(self.engine)
+        # search only reads articles.id and articles.title
+        self.session.execute(text("CREATE TABLE articles (id VARCHAR PRIMARY KEY, title VARCHAR)"))
+        self.session.execute(text("INSERT INTO articles (id, title) VALUES (:id, :title)"),
+                             [{"id": article_id, "title": title} for article_id, title in ARTICLES.items()])
+        self.backend.index(self.session, [
+            {"id": article_id, "title": tokenize(title, infix=True), "description": [], "body": []}
+            for article_id, title in ARTICLES.items()
+        ])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def search(self, keyword):
+        rank = self.backend.ranked(parse_query(keyword))
+        query = select(Article.id).where(search_condition(keyword, rank))
+        return sorted(self.session.execute(query).scalars())
+
+    def test_cjk_substring(self):
+        """Test CJK substrings match like the old title LIKE search."""
+        self.assertEqual(self.search("公众号"), ["a1"])
+        self.assertEqual(self.search("众号"), ["a1"])
+        self.assertEqual(self.search("模型"), ["a2", "a3"])
+
+    def test_mixed_cjk_latin(self):
+        """Test keywords mixing CJK and Latin text."""
+        self.assertEqual(self.search("公众号rss"), ["a1"])
+        self.assertEqual(self.search("大模型api"), ["a2"])
+        self.assertEqual(self.search("ai发布"), ["a3"])
+
+    def test_index_mixed_cjk_latin(self):
+        """Test the index alone matches mixed keywords without the LIKE fallback."""
+        for keyword, expected in (("公众号rss", ["a1"]), ("大模型api", ["a2"]), ("模型ap", ["a2"]), ("rss订阅", ["a1"])):
+            rank = self.backend.ranked(parse_query(keyword))
+            self.assertEqual(sorted(self.session.execute(select(rank.c.id)).scalars()), expected, keyword)
+
+    def test_latin_infix(self):
+        """Test Latin text in the middle of a word is matched by the index."""
+        self.assertEqual(self.search("pi"), ["a2"])
+        self.assertEqual(self.search("ai"), ["a3"])
+        self.assertEqual(self.search("ss订阅"), ["a1"])
+
+    def test_ranked_by_field(self):
+        """Test title matches rank above body matches."""
+        self.backend.index(self.session, [
+            {"id": "a5", "title": tokenize("周报"), "description": [], "body": tokenize("rss")},
+        ])
+        rank = self.backend.ranked(parse_query("rss"))
+        ids = self.session.execute(select(rank.c.id).order_by(rank.c.score.desc())).scalars().all()
+        self.assertEqual(ids, ["a1", "a5"])
+
+    def test_multiple_keywords(self):
+        """Test any keyword matching is enough."""
+        self.assertEqual(self.search("天气 rss"), ["a1", "a4"])
+        self.assertEqual(self.search("不存在"), [])
+
+
+class TestFts5Backend(SearchBackendTestMixin, unittest.TestCase):
+    backend_class = Fts5Backend
+
+
+class TestTermIndexBackend(SearchBackendTestMixin, unittest.TestCase):
+    backend_class = TermIndexBackend
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+中文二元分词
+
+汉字连续片段切分为相邻两字的词(最后一个字单独成词，便于单字前缀检索)，
+字母数字按单词切分并转为小写。
+查询时关键词按汉字/字母数字拆成多个片段，每个片段单独匹配、片段之间为 AND：
+汉字片段的二元词序列与索引中连续出现的词一致，等价于子串匹配；
+字母数字片段按单词前缀匹配；标题中的单词另外索引其所有后缀，
+单词中间的子串(如 "pi" 匹配 "api")即为某个后缀的前缀，同样走索引。
+"""
+import html
+import re
+import unicodedata
+from typing import List, NamedTuple
+
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[a-z0-9]+')
+_CJK_RE = re.compile(rf'[{_CJK}]')
+_TAG_RE = re.compile(r'<(script|style)[^>]*>.*?</\1>|<[^>]+>', re.S | re.I)
+# 单个词的最大长度，与倒排表字段长度一致
+MAX_TOKEN_LENGTH = 64
+# 超过该长度的单词(链接、编码等)不索引后缀
+MAX_INFIX_WORD_LENGTH = 32
+
+
+class QueryPhrase(NamedTuple):
+    """关键词中的一个汉字或字母数字片段，tokens 需在索引中连续出现"""
+    tokens: List[str]
+    # 按前缀匹配(英文单词或单个汉字)
+    prefix: bool
+
+
+class QueryWord(NamedTuple):
+    """查询中的一个关键词，所有片段都匹配才算匹配"""
+    phrases: List[QueryPhrase]
+
+
+def _normalize(text: str) -> str:
+    # 全角转半角并转为小写
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def tokenize(text: str, infix: bool = False) -> List[str]:
+    """
+    把文本切分为索引词
+
+    infix 为 True 时字母数字单词同时输出所有后缀，用于匹配单词中间的子串
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(_normalize(text)):
+        if _CJK_RE.match(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run[:MAX_TOKEN_LENGTH])
+            if infix and len(run) <= MAX_INFIX_WORD_LENGTH:
+                tokens.extend(run[i:] for i in range(1, len(run)))
+    return tokens
+
+
+def parse_query(keyword: str) -> List[QueryWord]:
+    """
+    解析检索关键词
+
+    与原 LIKE 检索一致，按空格、"-"、"|" 分隔为多个关键词，任一关键词匹配即可
+    """
+    words = []
+    for word in (keyword or '').replace("-", " ").replace("|", " ").split():
+        phrases = []
+        for run in _TOKEN_RE.findall(_normalize(word)):
+            if _CJK_RE.match(run) and len(run) > 1:
+                # 不含片段末尾的单字，索引中该片段后面可能紧接其他汉字
+                phrases.append(QueryPhrase([run[i:i + 2] for i in range(len(run) - 1)], False))
+            else:
+                phrases.append(QueryPhrase([run[:MAX_TOKEN_LENGTH]], True))
+        if phrases:
+            words.append(QueryWord(phrases))
+    return words
+
+
+def html_to_text(content: str) -> str:
+    """去除HTML标签，得到用于检索的正文"""
+    if not content:
+        return ''
+    return html.unescape(_TAG_RE.sub(' ', content))
@@ -54,7 +54,7 @@ def search_Biz(kw:str="",limit=5,offset=0):
         print(f"请求失败: {e}")
     return data
 
-from bs4 import BeautifulSoup
+from core.html_pipeline import HtmlDocument
 # 提取一篇文章的内容
 def content_extract(url):
     headers = {
@@ -64,24 +64,12 @@ def content_extract(url):
     r = requests.get(eval(url),headers=headers)
     if r.status_code == 200:
         text = r.text
-        soup = BeautifulSoup(text, 'html.parser')
         # 找到内容
-        js_content_div = soup.find('div', {'id': 'js_content'})
-        # 移除style属性中的visibility: hidden;
-        js_content_div.attrs.pop('style', None)
-        # 找到所有的img标签
-        img_tags = js_content_div.find_all('img')
-        # 遍历每个img标签并修改属性，设置宽度为1080p
-        for img_tag in img_tags:
-            if 'data-src' in img_tag.attrs:
-                img_tag['src'] = img_tag['data-src']
-                del img_tag['data-src']
-            if 'style' in img_tag.attrs:
-                style = img_tag['style']
-                # 使用正则表达式替换width属性
-                style = re.sub(r'width\s*:\s*\d+\s*px', 'width: 1080px', style)
-                img_tag['style'] = style
-        return js_content_div.prettify()
+        js_content_div = HtmlDocument.extract(text, 'js_content')
+        if js_content_div is None:
+            return ""
+        # 移除style属性中的visibility: hidden;，图片使用data-src并设置宽度为1080p
+        return js_content_div.apply("fix_images").outer_html()
     else:
         print("download error,status_code: ",r.status_code,"\n")
     return ""
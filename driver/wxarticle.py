@@ -7,7 +7,7 @@ import time
 import core.wait as Wait
 import base64
 import re
-from bs4 import BeautifulSoup
+from core.html_pipeline import HtmlDocument, html_description
 import os
 from datetime import datetime
 from core.config import cfg
@@ -433,72 +433,41 @@ class WXArticleFetcher:
     
     def fix_images(self,content:str)->str:
         try:
-            soup = BeautifulSoup(content, 'html.parser')
-            # 找到内容
-            js_content_div = soup
-            # 移除style属性中的visibility: hidden;
-            if js_content_div is None:
-                return ""
-            js_content_div.attrs.pop('style', None)
-            # 找到所有的img标签
-            img_tags = js_content_div.find_all('img')
-            # 遍历每个img标签并修改属性，设置宽度为1080p
-            for img_tag in img_tags:
-                if 'data-src' in img_tag.attrs:
-                    img_tag['src'] = img_tag['data-src']
-                    del img_tag['data-src']
-                if 'style' in img_tag.attrs:
-                    style = img_tag['style']
-                    # 使用正则表达式替换width属性
-                    style = re.sub(r'width\s*:\s*\d+\s*px', 'width: 1080px', style)
-                    img_tag['style'] = style
-            return  js_content_div.prettify()
+            # 使用data-src作为图片地址，设置宽度为1080p
+            return HtmlDocument(content).apply("fix_images").html()
         except Exception as e:
             print_error(f"修复图片失败: {str(e)}")
         return content
-    def get_image_url(self,url:str)->str:
+    def get_image_url(self,url:str,width:int=None)->str:
+        from core.res.image_transform import proxy_image_url
         base_url=cfg.get("server.base_url","")
-        return f"{base_url}/static/res/logo/{url}" 
+        # 按配置附加缩放/转码参数
+        return proxy_image_url(url,base_url,width=width)
     def get_description(self,content:str,length:int=200)->str:
-        soup = BeautifulSoup(content, 'html.parser')
-            # 找到内容
-        js_content_div = soup
-        if js_content_div is None:
-            return ""
-        content = js_content_div.get_text().strip().strip("\n").replace("\n"," ").replace("\r"," ")
-        return content[:length]+"..." if len(content)>length else content
+        return html_description(content,length)
 
     def proxy_images(self,content:str)->str:
+        from core.res.image_transform import proxy_image_url
+        # 每篇文章只读取一次配置
+        base_url=cfg.get("server.base_url","")
         try:
-            soup = BeautifulSoup(content, 'html.parser')
-            # 找到内容
-            js_content_div = soup
-            # 移除style属性中的visibility: hidden;
-            if js_content_div is None:
-                return ""
-            js_content_div.attrs.pop('style', None)
-            # 找到所有的img标签
-            img_tags = js_content_div.find_all('img')
-            # 遍历每个img标签并修改属性，设置宽度为1080p
-            for img_tag in img_tags:
-                if 'src' in img_tag.attrs:
-                    img_tag['src'] = self.get_image_url(img_tag['src'])
-                if 'style' in img_tag.attrs:
-                    style = img_tag['style']
-                    # 使用正则表达式替换width属性
-                    style = re.sub(r'width\s*:\s*\d+\s*px', 'width: 100%', style)
-                    img_tag['style'] = style
-            return  js_content_div.prettify()
+            return HtmlDocument(content).apply("proxy_images",url_func=lambda url: proxy_image_url(url,base_url)).html()
         except Exception as e:
             print_error(f"Proxy图片失败: {str(e)}")
         return content
    
     def clean_article_content(self,html_content: str):
         from tools.htmltools import htmltools
-        html_content=self.fix_images(html_content)
         if not cfg.get("gather.clean_html",False):
+            return self.fix_images(html_content)
+        # 修复图片和清理在同一棵树上完成，只解析和序列化一次
+        try:
+            doc=HtmlDocument(htmltools.remove_common_html_elements(str(html_content).strip()))
+            doc.apply("fix_images")
+        except Exception as e:
+            print_error(f"解析文章内容失败: {str(e)}")
             return html_content
-        return htmltools.clean_html(str(html_content).strip(),
+        htmltools.clean_document(doc,
                                  remove_selectors=[
                                      "link",
                                      "head",
@@ -508,9 +477,9 @@ class WXArticleFetcher:
                                      {"name":"style","value":"display: none;"},
                                      {"name":"style","value":"display:none;"},
                                      {"name":"aria-hidden","value":"true"},
-                                 ],
-                                 remove_normal_tag=True
+                                 ]
                                  )
+        return doc.html()
    
 
 
@@ -0,0 +1,118 @@
+import threading
+import time
+from sqlalchemy import or_, and_
+from core.config import cfg
+import core.db as db
+from core.models.article import Article
+from core.content_pool import content_pool
+from core.print import print_error, print_info, print_success
+from core.article_content import save_derived_content
+from tools.fix import FIX_HTML_VERSION, save_content_html
+
+DB = db.Db(tag="文章HTML")
+
+
+def prerender_content_html() -> int:
+    """
+    后台为文章生成 content_html
+
+    content_html 默认在首次读取时生成，开启 article.content_html_prerender 后
+    按文章ID顺序分批转换未生成或版本过期(FIX_HTML_VERSION 变化)的文章，
+    每批之后按本批耗时休眠(article.content_html_throttle 倍)，不影响采集和接口。
+
+    Returns:
+        int: 生成的文章数
+    """
+    batch_size = max(1, int(cfg.get("article.content_html_batch", 20)))
+    throttle = max(0.0, float(cfg.get("article.content_html_throttle", 2.0)))
+    session = DB.get_session()
+    stale = or_(Article.content_html_version.is_(None), Article.content_html_version != FIX_HTML_VERSION)
+    query = session.query(Article.id, Article.content).filter(stale, Article.content != None, Article.content != '')
+    if query.first() is None:
+        return 0
+    print_info(f"开始生成文章HTML(版本 {FIX_HTML_VERSION})")
+    count = 0
+    last_id = ''
+    while True:
+        started = time.monotonic()
+        rows = query.filter(Article.id > last_id).order_by(Article.id.asc()).limit(batch_size).all()
+        if not rows:
+            break
+        results = content_pool.map("fix_html", [content for _, content in rows])
+        for (article_id, content), html in zip(rows, results):
+            if isinstance(html, Exception):
+                print_error(f"生成文章HTML失败({article_id}): {html}")
+                continue
+            if save_content_html(article_id, content, html):
+                count += 1
+        last_id = rows[-1][0]
+        time.sleep(max(0.05, (time.monotonic() - started) * throttle))
+    print_success(f"文章HTML生成完成，共 {count} 篇")
+    return count
+
+
+def derive_pending_content() -> int:
+    """
+    后台为文章生成纯文本、Markdown和摘要
+
+    写入文章时不再生成派生内容，按文章ID顺序分批转换未生成的文章(包括升级前的历史文章)，
+    节流方式与 prerender_content_html 相同。
+
+    Returns:
+        int: 生成的文章数
+    """
+    batch_size = max(1, int(cfg.get("article.derive_batch", 50)))
+    throttle = max(0.0, float(cfg.get("article.content_html_throttle", 2.0)))
+    session = DB.get_session()
+    # 只生成过纯文本(article_content 按需转换)的文章还需要补齐Markdown
+    pending = and_(or_(Article.content_text.is_(None), Article.content_markdown.is_(None)),
+                   Article.content != None, Article.content != '')
+    query = session.query(Article.id, Article.content).filter(pending)
+    count = 0
+    last_id = ''
+    while True:
+        started = time.monotonic()
+        rows = query.filter(Article.id > last_id).order_by(Article.id.asc()).limit(batch_size).all()
+        if not rows:
+            break
+        results = content_pool.map("derive_content", [content for _, content in rows])
+        for (article_id, content), derived in zip(rows, results):
+            if isinstance(derived, Exception):
+                print_error(f"生成文章派生内容失败({article_id}): {derived}")
+                continue
+            if save_derived_content(article_id, content, derived):
+                count += 1
+        last_id = rows[-1][0]
+        time.sleep(max(0.05, (time.monotonic() - started) * throttle))
+    if count:
+        print_success(f"文章派生内容生成完成，共 {count} 篇")
+    return count
+
+
+def _derive_loop() -> None:
+    interval = max(1, int(cfg.get("article.derive_interval", 60)))
+    while True:
+        try:
+            derive_pending_content()
+        except Exception as e:
+            print_error(f"生成文章派生内容失败: {e}")
+        time.sleep(interval)
+
+
+def start_derive_content_job() -> None:
+    """后台定时为新写入和历史文章生成纯文本和Markdown"""
+    threading.Thread(target=_derive_loop, name="derive-content", daemon=True).start()
+
+
+def _run() -> None:
+    try:
+        prerender_content_html()
+    except Exception as e:
+        print_error(f"生成文章HTML失败: {e}")
+
+
+def start_content_html_job() -> None:
+    """按配置在后台预生成文章HTML"""
+    if not cfg.get("article.content_html_prerender", False):
+        return
+    threading.Thread(target=_run, name="content-html", daemon=True).start()
@@ -0,0 +1,30 @@
+import threading
+from core.config import cfg
+from core.feed_stats import ensure_feed_stats, reconcile_feed_stats
+from core.print import print_success, print_warning
+from core.task import TaskScheduler
+
+scheduler = TaskScheduler()
+
+
+def start_feed_stats_job():
+    """
+    启动公众号文章统计定时校正任务
+
+    feed_stats 由文章写入事件增量维护，批量SQL删除/更新不会触发事件，
+    定时按 articles 表全量重新统计修正偏差。
+
+    配置:
+        - article.stats_reconcile_interval: 校正间隔(分钟)，1-59，0为不校正
+    """
+    # 首次升级时 feed_stats 为空，后台初始化
+    threading.Thread(target=ensure_feed_stats, daemon=True).start()
+    interval = int(cfg.get("article.stats_reconcile_interval", 30))
+    if interval <= 0:
+        print_warning("未开启公众号文章统计校正任务")
+        return
+    interval = min(interval, 59)
+    job_id = scheduler.add_cron_job(reconcile_feed_stats, cron_expr=f"*/{interval} * * * *")
+    print_success(f"已添加公众号文章统计校正任务: {job_id}")
+    scheduler.start()
+
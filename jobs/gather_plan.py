@@ -0,0 +1,86 @@
+import threading
+from typing import Callable, Optional
+from core.models.feed import Feed
+from core.models.message_task import MessageTask
+from core.print import print_info, print_success
+
+
+class GatherPlan:
+    """采集计划：公众号ID -> (公众号, 需要通知的任务列表)"""
+
+    def __init__(self):
+        self.items: dict[str, tuple[Feed, list[MessageTask]]] = {}
+
+    def add(self, feeds: list[Feed], task: MessageTask) -> None:
+        """把一个任务覆盖的公众号合并进计划，同一公众号只保留一份"""
+        for feed in feeds or []:
+            if feed.id not in self.items:
+                self.items[feed.id] = (feed, [])
+            tasks = self.items[feed.id][1]
+            if all(t.id != task.id for t in tasks):
+                tasks.append(task)
+
+    def task_count(self) -> int:
+        return len({t.id for _, tasks in self.items.values() for t in tasks})
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class GatherPlanner:
+    """
+    采集任务规划器
+
+    在 window 秒的时间窗口内收集所有到期的消息任务，
+    合并为去重后的公众号集合，每个公众号只采集一次，
+    采集结果再分发给覆盖该公众号的每个任务。
+    """
+
+    def __init__(self, dispatch: Callable[[Feed, list[MessageTask]], None], window: float = 5.0):
+        """
+        :param dispatch: 计划执行时对每个公众号调用的函数 dispatch(feed, tasks)
+        :param window: 合并时间窗口(秒)，小于等于0时立即执行
+        """
+        self._dispatch = dispatch
+        self.window = window
+        self._lock = threading.Lock()
+        self._plan = GatherPlan()
+        self._timer: Optional[threading.Timer] = None
+
+    def submit(self, feeds: list[Feed], task: MessageTask) -> None:
+        """提交一个到期任务，窗口结束后统一执行"""
+        with self._lock:
+            self._plan.add(feeds, task)
+            if self.window <= 0:
+                immediate = True
+            else:
+                immediate = False
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if immediate:
+            self.flush()
+
+    def flush(self) -> int:
+        """立即执行当前计划，返回采集的公众号数量"""
+        with self._lock:
+            plan, self._plan = self._plan, GatherPlan()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if len(plan) == 0:
+            return 0
+        print_info(f"采集计划: {plan.task_count()}个任务合并为{len(plan)}个公众号")
+        for feed, tasks in plan.items.values():
+            self._dispatch(feed, tasks)
+        print_success(f"采集计划已提交，共{len(plan)}个公众号")
+        return len(plan)
+
+    def clear(self) -> None:
+        """丢弃尚未执行的计划"""
+        with self._lock:
+            self._plan = GatherPlan()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
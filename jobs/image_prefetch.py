@@ -0,0 +1,128 @@
+import html
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import get_history
+from core.config import cfg
+from core.models.article import Article
+from core.res.image_cache import image_cache, PROXY_HOSTS
+from core.print import print_error, print_info
+
+_IMG_SRC_RE = re.compile(r'<img\b[^>]*?\s(?:data-src|src)\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+# 待预取的图片URL列表，每项为一篇文章的图片
+_queue: queue.Queue = None
+_stats = {"queued": 0, "prefetched": 0, "failed": 0, "dropped": 0}
+_stats_lock = threading.Lock()
+_thread: threading.Thread = None
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+def extract_image_urls(content: str, pic_url: str = None, limit: int = 100) -> list:
+    """
+    提取文章中需要预取的图片地址
+
+    只保留图片代理允许的微信图片，与代理一样使用http并去掉查询参数(代理按不带参数的地址缓存)
+    """
+    urls = []
+    candidates = [pic_url] if pic_url else []
+    candidates.extend(_IMG_SRC_RE.findall(content or ""))
+    for url in candidates:
+        url = html.unescape(url).strip().split("?")[0].replace("https://", "http://")
+        parsed = urlparse(url)
+        if parsed.scheme in ("http", "https") and parsed.netloc in PROXY_HOSTS and url not in urls:
+            urls.append(url)
+            if len(urls) >= limit:
+                break
+    return urls
+
+
+def enqueue_article_images(content: str, pic_url: str = None) -> int:
+    """加入预取队列，队列已满时丢弃，返回加入的图片数"""
+    if _queue is None:
+        return 0
+    urls = extract_image_urls(content, pic_url, int(cfg.get("image_cache.prefetch_max_images", 100)))
+    if not urls:
+        return 0
+    try:
+        _queue.put_nowait(urls)
+    except queue.Full:
+        _count("dropped", len(urls))
+        return 0
+    _count("queued", len(urls))
+    return len(urls)
+
+
+def _after_insert(mapper, connection, target):
+    enqueue_article_images(target.content, target.pic_url)
+
+
+def _after_update(mapper, connection, target):
+    if get_history(target, 'content').added:
+        enqueue_article_images(target.content, target.pic_url)
+
+
+def _prefetch(url: str, retain_days: float) -> None:
+    try:
+        entry = image_cache.fetch(url)
+        if entry is None:
+            _count("failed")
+            return
+        image_cache.retain(entry, retain_days)
+        _count("prefetched")
+    except Exception as e:
+        _count("failed")
+        print_error(f"预取图片失败: {url}, 错误: {e}")
+
+
+def _worker() -> None:
+    workers = max(1, int(cfg.get("image_cache.prefetch_workers", 4)))
+    # 每秒最多开始下载的图片数
+    rate = max(0.1, float(cfg.get("image_cache.prefetch_rate", 5)))
+    retain_days = float(cfg.get("image_cache.retain_days", 90))
+    slots = threading.BoundedSemaphore(workers)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image_prefetch") as executor:
+        next_start = time.monotonic()
+        while True:
+            urls = _queue.get()
+            for url in urls:
+                # 按速率限制开始下载，并发数不超过 workers
+                delay = next_start - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_start = max(next_start, time.monotonic()) + 1.0 / rate
+                slots.acquire()
+                future = executor.submit(_prefetch, url, retain_days)
+                future.add_done_callback(lambda _: slots.release())
+
+
+def start_image_prefetch_job() -> None:
+    """开启 image_cache.prefetch 后，新写入的文章图片在后台预取到图片缓存"""
+    global _queue, _thread
+    if not cfg.get("image_cache.prefetch", False):
+        return
+    if _thread is not None and _thread.is_alive():
+        return
+    _queue = queue.Queue(maxsize=max(1, int(cfg.get("image_cache.prefetch_queue", 1000))))
+    if not event.contains(Article, 'after_insert', _after_insert):
+        event.listen(Article, 'after_insert', _after_insert)
+        event.listen(Article, 'after_update', _after_update)
+    _thread = threading.Thread(target=_worker, name="image_prefetch", daemon=True)
+    _thread.start()
+    print_info("文章图片预取已启动")
+
+
+def get_image_prefetch_info() -> dict:
+    with _stats_lock:
+        info = dict(_stats)
+    info["enabled"] = _thread is not None and _thread.is_alive()
+    info["pending"] = _queue.qsize() if _queue is not None else 0
+    return info
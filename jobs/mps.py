@@ -37,8 +37,11 @@ from core.models.message_task import MessageTask
 from .webhook import web_hook
 interval=int(cfg.get("interval",60)) # 每隔多少秒执行一次
 def do_job(mp=None,task:MessageTask=None,isTest=False):
+        return do_gather_job(mp,[task],isTest)
+
+def do_gather_job(mp=None,tasks:list[MessageTask]=None,isTest=False):
+        """采集单个公众号一次，并把结果分发给覆盖该公众号的所有任务"""
         # TaskQueue.add_task(test,info=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        # print("执行任务", task.mps_id)
         print(f"执行任务 (测试模式: {isTest})")
         all_count=0
         if isTest:
@@ -66,40 +69,59 @@ def do_job(mp=None,task:MessageTask=None,isTest=False):
                 mock_articles = wx.articles
                 all_count+=count
 
-        from jobs.webhook import MessageWebHook
-        tms=MessageWebHook(task=task,feed=mp,articles=mock_articles)
-        web_hook(tms, is_test=isTest)
-        print_success(f"任务({task.id})[{mp.mp_name}]执行成功,{count}成功条数")
-        
-        # 级联节点：上报任务执行结果到父节点
-        from jobs.cascade_sync import cascade_sync_service
-        if not isTest and mock_articles:
-            import asyncio
+        from jobs.webhook import MessageWebHook, prepare_articles_content
+        if not isTest:
+            # 正文格式转换在分发前做一次，所有任务共用
+            try:
+                prepare_articles_content(mock_articles, tasks)
+            except Exception as e:
+                print_error(f"准备文章正文失败: {e}")
+        for task in tasks:
             try:
-                result_data = [{
-                    "mp_id": mp.id,
-                    "mp_name": mp.mp_name,
-                    "article_count": len(mock_articles) if not isTest else 1,
-                    "success_count": count if not isTest else 1,
-                    "timestamp": datetime.now().isoformat()
-                }]
-                # 异步上报，不阻塞主流程
-                asyncio.create_task(cascade_sync_service.report_task_result(task.id, result_data))
+                tms=MessageWebHook(task=task,feed=mp,articles=list(mock_articles))
+                web_hook(tms, is_test=isTest)
+                print_success(f"任务({task.id})[{mp.mp_name}]执行成功,{count}成功条数")
             except Exception as e:
-                print_error(f"上报任务结果失败: {str(e)}")
+                # 单个任务通知失败不影响其他任务
+                print_error(f"任务({task.id})[{mp.mp_name}]通知失败: {e}")
+                if len(tasks)==1:
+                    raise
+
+            # 级联节点：上报任务执行结果到父节点
+            from jobs.cascade_sync import cascade_sync_service
+            if not isTest and mock_articles:
+                import asyncio
+                try:
+                    result_data = [{
+                        "mp_id": mp.id,
+                        "mp_name": mp.mp_name,
+                        "article_count": len(mock_articles) if not isTest else 1,
+                        "success_count": count if not isTest else 1,
+                        "timestamp": datetime.now().isoformat()
+                    }]
+                    # 异步上报，不阻塞主流程
+                    asyncio.create_task(cascade_sync_service.report_task_result(task.id, result_data))
+                except Exception as e:
+                    print_error(f"上报任务结果失败: {str(e)}")
 
 from core.queue import TaskQueue
+from .gather_plan import GatherPlanner
+def _dispatch_gather(feed:Feed,tasks:list[MessageTask]):
+    TaskQueue.add_task(do_gather_job,feed,tasks,False)
+    print(f"{feed.mp_name}，加入队列成功({len(tasks)}个任务)")
+# 同一时间窗口内到期的任务合并采集，每个公众号只采集一次
+gather_planner=GatherPlanner(_dispatch_gather,window=float(cfg.get("gather.plan_window",5)))
 def add_job(feeds:list[Feed]=None,task:MessageTask=None,isTest=False):
     if isTest:
         TaskQueue.clear_queue()
-    for feed in feeds:
-        TaskQueue.add_task(do_job,feed,task,isTest)
-        if isTest:
+        for feed in feeds:
+            TaskQueue.add_task(do_job,feed,task,isTest)
             print(f"测试任务，{feed.mp_name}，加入队列成功")
             reload_job()
             break
-        print(f"{feed.mp_name}，加入队列成功")
-    print_success(TaskQueue.get_queue_info())
+        print_success(TaskQueue.get_queue_info())
+        return
+    gather_planner.submit(feeds,task)
     pass
 import json
 def get_feeds(task:MessageTask=None):
@@ -113,6 +135,7 @@ scheduler=TaskScheduler()
 def reload_job():
     print_success("重载任务")
     scheduler.clear_all_jobs()
+    gather_planner.clear()
     TaskQueue.clear_queue()
     start_job()
 
@@ -128,6 +151,10 @@ def run(job_id:str=None,isTest=False):
             print_warning(f"{task.name} 添加到队列运行")
             add_job(get_feeds(task),task,isTest=isTest)
             pass
+    if not isTest:
+        # 手动执行时不等待合并窗口
+        gather_planner.flush()
+        print_success(TaskQueue.get_queue_info())
     return tasks
 def start_job(job_id:str=None):
     from .taskmsg import get_message_task
@@ -1,6 +1,7 @@
 from core.config import cfg
 def sys_notice(text:str="",title:str="",tag:str='系统通知',type=""):
-    from core.notice import notice
+    from core.notice.delivery import delivery
+    notice = delivery.notice
     markdown_text = f"### {title} {type} {tag}\n{text}"
     notice_cfg = cfg.get('notice', {}) or {}
     webhook = notice_cfg.get('dingding', '')
@@ -0,0 +1,113 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import func
+from core.config import cfg
+import core.db as db
+from core.models.article import Article
+from core.search import get_search_backend, get_index_state, index_articles, set_search_ready
+from core.print import print_error, print_info, print_success
+
+DB = db.Db(tag="检索索引")
+
+_thread: threading.Thread = None
+_running = threading.Event()
+_stop = threading.Event()
+
+
+def backfill_search_index() -> bool:
+    """
+    为历史文章建立全文检索索引
+
+    按文章ID顺序(keyset)分批读取，不使用 OFFSET，也不会长时间锁表；
+    每批完成后把最后的文章ID写入 search_index_state.checkpoint，重启后从断点继续。
+    每批之后按本批耗时休眠(search.backfill_throttle 倍)，数据库繁忙时自动放慢。
+    新写入的文章由 ORM 事件实时建立索引，回填完成后检索切换为全文索引。
+
+    Returns:
+        bool: 是否已全部完成
+    """
+    backend = get_search_backend()
+    if backend is None:
+        return False
+    batch_size = max(1, int(cfg.get("search.backfill_batch", 200)))
+    throttle = max(0.0, float(cfg.get("search.backfill_throttle", 1.0)))
+    session = DB.get_session()
+    state = get_index_state(session, backend)
+    if state.ready:
+        set_search_ready(True)
+        return True
+    state.total_count = session.query(func.count(Article.id)).scalar() or 0
+    session.commit()
+    last_id = state.checkpoint or ''
+    print_info(f"开始建立全文检索索引({backend.name})，已完成 {state.indexed_count}/{state.total_count}")
+    while not _stop.is_set():
+        started = time.monotonic()
+        articles = session.query(Article).filter(Article.id > last_id).order_by(Article.id.asc()).limit(batch_size).all()
+        if not articles:
+            break
+        index_articles(session, articles)
+        last_id = articles[-1].id
+        state.checkpoint = last_id
+        state.indexed_count = (state.indexed_count or 0) + len(articles)
+        state.updated_at = datetime.now()
+        session.commit()
+        # 释放本批文章占用的内存
+        session.expunge_all()
+        state = get_index_state(session, backend)
+        _stop.wait(max(0.05, (time.monotonic() - started) * throttle))
+    if _stop.is_set():
+        return False
+    state.ready = 1
+    state.total_count = max(state.total_count or 0, state.indexed_count or 0)
+    state.updated_at = datetime.now()
+    session.commit()
+    set_search_ready(True)
+    print_success(f"全文检索索引建立完成，共 {state.indexed_count} 篇文章")
+    return True
+
+
+def _run() -> None:
+    _running.set()
+    try:
+        backfill_search_index()
+    except Exception as e:
+        print_error(f"建立全文检索索引失败: {e}")
+    finally:
+        _running.clear()
+
+
+def start_search_index_job() -> None:
+    """后台回填全文检索索引，已完成时直接返回"""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="search-index", daemon=True)
+    _thread.start()
+
+
+def stop_search_index_job() -> None:
+    _stop.set()
+
+
+def get_search_index_progress() -> dict:
+    """全文检索索引回填进度"""
+    backend = get_search_backend()
+    if backend is None:
+        return {"backend": "like", "ready": False, "running": False}
+    try:
+        state = get_index_state(DB.get_session(), backend)
+        total = state.total_count or 0
+        indexed = state.indexed_count or 0
+        return {
+            "backend": backend.name,
+            "ready": bool(state.ready),
+            "running": _running.is_set(),
+            "indexed": indexed,
+            "total": total,
+            "percent": 100.0 if state.ready else round(indexed * 100.0 / total, 2) if total else 0.0,
+            "updated_at": state.updated_at.strftime('%Y-%m-%d %H:%M:%S') if state.updated_at else "",
+        }
+    except Exception as e:
+        return {"backend": backend.name, "ready": False, "running": _running.is_set(), "error": str(e)}
@@ -2,15 +2,57 @@ from core.models.message_task import MessageTask
 from core.models.feed import Feed
 from core.models.article import Article
 from core.print import print_success
-from core.notice import notice
+from core.notice.delivery import delivery, DeliveryJob
 from dataclasses import dataclass
 from core.lax import TemplateParser
 from datetime import datetime
 from core.log import logger
 from core.config import cfg
 from bs4 import BeautifulSoup
-from core.content_format import format_content
+from core.article_content import article_content, save_derived_content
+from core.content_pool import content_pool
 import re
+
+# 未配置消息模板时使用的默认模板
+DEFAULT_MESSAGE_TEMPLATE = """
+### {{feed.mp_name}} 订阅消息：
+{% if articles %}
+{% for article in articles %}
+- [**{{ article.title }}**]({{article.url}}) ({{ article.publish_time }})\n
+{% endfor %}
+{% else %}
+- 暂无文章\n
+{% endif %}
+    """
+
+DEFAULT_WEBHOOK_TEMPLATE = """{
+  "feed": {
+    "id": "{{ feed.id }}",
+    "name": "{{ feed.mp_name }}"
+  },
+  "articles": [
+    {% if articles %}
+     {% for article in articles %}
+        {
+          "id": "{{ article.id }}",
+          "mp_id": "{{ article.mp_id }}",
+          "title": "{{ article.title }}",
+          "pic_url": "{{ article.pic_url }}",
+          "url": "{{ article.url }}",
+          "description": "{{ article.description }}",
+          "publish_time": "{{ article.publish_time }}"
+        }{% if not loop.last %},{% endif %}
+      {% endfor %}
+    {% endif %}
+  ],
+  "task": {
+    "id": "{{ task.id }}",
+    "name": "{{ task.name }}"
+  },
+  "now": "{{ now }}"
+}
+"""
+
 @dataclass
 class MessageWebHook:
     task: MessageTask
@@ -18,26 +60,67 @@ class MessageWebHook:
     articles: list[Article]
     pass
 
-def send_message(hook: MessageWebHook) -> str:
+def _needs_content(task: MessageTask) -> bool:
+    """webhook 模板是否使用文章正文"""
+    if task.message_type != 1:
+        return False
+    template = task.message_template if task.message_template else DEFAULT_WEBHOOK_TEMPLATE
+    return "content" in template.lower()
+
+
+def prepare_articles_content(articles: list, tasks: list) -> None:
+    """
+    分发给各任务前准备一次正文的纯文本/Markdown
+
+    按数据库中的文章ID读取已生成的结果，未生成的只转换一次并保存，
+    之后各任务的 call_webhook 直接使用，不再逐个任务重复转换
+    """
+    content_format = cfg.get("webhook.content_format", "html")
+    if content_format not in ("text", "markdown") or not any(_needs_content(task) for task in tasks):
+        return
+    field = "content_markdown" if content_format == "markdown" else "content_text"
+    by_id = {}
+    for article in articles:
+        if isinstance(article, dict) and article.get("content") and article.get(field) is None \
+                and article.get("id") and article.get("mp_id"):
+            # 与 Db.add_article 保存的文章ID一致
+            by_id[f"{article['mp_id']}-{article['id']}".replace("MP_WXS_", "")] = article
+    if not by_id:
+        return
+    from core.db import DB
+    session = DB.get_session()
+    rows = session.query(Article.id, Article.content, Article.content_text, Article.content_markdown) \
+        .filter(Article.id.in_(list(by_id))).all()
+    for article_id, content, content_text, content_markdown in rows:
+        article = by_id[article_id]
+        if content == article["content"]:
+            article["content_text"] = content_text
+            article["content_markdown"] = content_markdown
+    missing = [(article_id, article) for article_id, article in by_id.items() if article.get(field) is None]
+    if not missing:
+        return
+    results = content_pool.map("derive_content" if content_format == "markdown" else "derive_text",
+                               [article["content"] for _, article in missing])
+    for (article_id, article), derived in zip(missing, results):
+        if isinstance(derived, Exception):
+            logger.error(f"转换文章正文失败({article_id}): {derived}")
+            continue
+        save_derived_content(article_id, article["content"], derived)
+        article.update({name: value for name, value in derived.items() if name != "description"})
+
+
+def send_message(hook: MessageWebHook, is_test: bool = False) -> str:
     """
     发送格式化消息
     
     参数:
         hook: MessageWebHook对象，包含任务、订阅源和文章信息
+        is_test: 是否为测试模式，测试模式下同步发送以便返回错误
         
     返回:
         str: 格式化后的消息内容
     """
-    template = hook.task.message_template if hook.task.message_template else """
-### {{feed.mp_name}} 订阅消息：
-{% if articles %}
-{% for article in articles %}
-- [**{{ article.title }}**]({{article.url}}) ({{ article.publish_time }})\n
-{% endfor %}
-{% else %}
-- 暂无文章\n
-{% endif %}
-    """
+    template = hook.task.message_template if hook.task.message_template else DEFAULT_MESSAGE_TEMPLATE
     parser = TemplateParser(template)
     data = {
         "feed": hook.feed,
@@ -49,7 +132,13 @@ def send_message(hook: MessageWebHook) -> str:
     # 这里可以添加发送消息的具体实现
     print("发送消息:", message)
     try:
-        notice(hook.task.web_hook_url, hook.task.name, message)
+        job = DeliveryJob(kind="notice", url=hook.task.web_hook_url, title=hook.task.name, text=message,
+                          task_id=hook.task.id, mps_id=getattr(hook.feed, "id", ""))
+        if is_test:
+            delivery.deliver(job)
+        else:
+            # 交给投递线程池发送，不阻塞采集队列
+            delivery.submit(job)
     except Exception as e:
         logger.error(f"发送消息失败: {e}")
         raise ValueError(f"发送消息失败: {e}")
@@ -69,36 +158,10 @@ def call_webhook(hook: MessageWebHook, is_test: bool = False) -> str:
     异常:
         ValueError: 当webhook调用失败时抛出
     """
-    template = hook.task.message_template if hook.task.message_template else """{
-  "feed": {
-    "id": "{{ feed.id }}",
-    "name": "{{ feed.mp_name }}"
-  },
-  "articles": [
-    {% if articles %}
-     {% for article in articles %}
-        {
-          "id": "{{ article.id }}",
-          "mp_id": "{{ article.mp_id }}",
-          "title": "{{ article.title }}",
-          "pic_url": "{{ article.pic_url }}",
-          "url": "{{ article.url }}",
-          "description": "{{ article.description }}",
-          "publish_time": "{{ article.publish_time }}"
-        }{% if not loop.last %},{% endif %}
-      {% endfor %}
-    {% endif %}
-  ],
-  "task": {
-    "id": "{{ task.id }}",
-    "name": "{{ task.name }}"
-  },
-  "now": "{{ now }}"
-}
-"""
+    template = hook.task.message_template if hook.task.message_template else DEFAULT_WEBHOOK_TEMPLATE
 
     # 检查template是否需要content
-    template_needs_content = "content" in template.lower()
+    template_needs_content = _needs_content(hook.task)
 
     # 根据content_format处理内容
     content_format = cfg.get("webhook.content_format", "html")
@@ -126,7 +189,7 @@ def call_webhook(hook: MessageWebHook, is_test: bool = False) -> str:
                 processed_article = article.copy()
                 # 只有template需要content时才进行格式转换
                 if template_needs_content:
-                    processed_article["content"] = format_content(processed_article["content"], content_format)
+                    processed_article["content"] = article_content(processed_article, content_format)
                 processed_articles.append(processed_article)
             else:
                 processed_articles.append(article)
@@ -167,7 +230,6 @@ def call_webhook(hook: MessageWebHook, is_test: bool = False) -> str:
         logger.error("web_hook_url为空")
         return
     # 发送webhook请求
-    import requests
     import json
 
     # 构建请求头
@@ -192,14 +254,14 @@ def call_webhook(hook: MessageWebHook, is_test: bool = False) -> str:
 
     # print_success(f"发送webhook请求{payload}")
     try:
-        response = requests.post(
-            hook.task.web_hook_url,
-            data=payload,
-            headers=headers,
-            cookies=cookies
-        )
-        response.raise_for_status()
-        return "Webhook调用成功"
+        job = DeliveryJob(kind="webhook", url=hook.task.web_hook_url, text=payload, headers=headers, cookies=cookies,
+                          task_id=hook.task.id, mps_id=getattr(hook.feed, "id", ""))
+        if is_test:
+            delivery.deliver(job)
+            return "Webhook调用成功"
+        # 交给投递线程池发送，失败重试及死信记录由投递线程处理
+        delivery.submit(job)
+        return "Webhook已加入投递队列"
     except Exception as e:
         raise ValueError(f"Webhook调用失败: {str(e)}")
 
@@ -271,7 +333,7 @@ def web_hook(hook:MessageWebHook, is_test:bool = False):
         hook.articles = processed_articles
 
         if hook.task.message_type == 0:  # 发送消息
-            return send_message(hook)
+            return send_message(hook, is_test)
         elif hook.task.message_type == 1:  # 调用webhook
             return call_webhook(hook, is_test)
         else:
@@ -63,6 +63,16 @@ if __name__ == '__main__':
         print_success("已开启自动修正文章任务")
     else:
         print_warning("未开启自动修正文章任务")
+    from jobs.feed_stats import start_feed_stats_job
+    start_feed_stats_job()
+    # 后台为文章生成纯文本和Markdown
+    from jobs.content_html import start_content_html_job, start_derive_content_job
+    start_derive_content_job()
+    start_content_html_job()
+    from jobs.search_index import start_search_index_job
+    start_search_index_job()
+    from jobs.image_prefetch import start_image_prefetch_job
+    start_image_prefetch_job()
     print("启动服务器")
     AutoReload=cfg.get("server.auto_reload",False)
     thread=cfg.get("server.threads",1)
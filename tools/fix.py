@@ -1,14 +1,51 @@
 import copy
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
 from core.models.article import Article
+from core.print import print_error
+# fix_html 输出的版本，转换逻辑变化时加1，已保存的 content_html 会重新生成
+FIX_HTML_VERSION = 1
 def fix_html(content:str):
-    from core.content_format import format_content
+    from core.html_pipeline import HtmlDocument
     from tools.mdtools.md2html import convert_markdown_to_html
     from tools.htmltools import htmltools
-    htmltools.clean_html(content,remove_attributes= [{'src': ''}],remove_ids=['content_bottom_interaction','activity-name','meta_content'])
-    content=format_content(content,content_format='markdown')
+    # 清理和转换Markdown在同一棵树上完成
+    doc=htmltools.clean_document(HtmlDocument(content or ''),remove_ids=['content_bottom_interaction','activity-name','meta_content'])
+    content=doc.markdown()
     content=convert_markdown_to_html(content)
     return content
+def content_html_is_current(article) -> bool:
+    return article.content_html is not None and article.content_html_version == FIX_HTML_VERSION
+def save_content_html(article_id:str, content:str, html:str) -> bool:
+    """保存生成的 content_html，正文已被修改时放弃"""
+    from core.db import DB
+    try:
+        with DB.engine.begin() as conn:
+            result = conn.execute(update(Article.__table__)
+                                  .where(Article.__table__.c.id == article_id, Article.__table__.c.content == content)
+                                  .values(content_html=html, content_html_version=FIX_HTML_VERSION))
+        return result.rowcount > 0
+    except Exception as e:
+        print_error(f"保存文章HTML失败({article_id}): {e}")
+        return False
+def get_content_html(article) -> str:
+    """
+    返回文章的 content_html
+
+    写入文章时不再生成，首次读取时转换并保存；
+    版本与 FIX_HTML_VERSION 不一致时重新生成
+    """
+    if content_html_is_current(article):
+        return article.content_html
+    from core.content_pool import content_pool
+    content = article.content or ''
+    html = content_pool.run("fix_html", content)
+    save_content_html(article.id, content, html)
+    # 直接更新已加载的值，不把对象标记为已修改
+    set_committed_value(article, 'content_html', html)
+    set_committed_value(article, 'content_html_version', FIX_HTML_VERSION)
+    return html
 def fix_article(article):
     art=article.to_dict()
-    art['content']=fix_html(art['content'])
+    art['content']=art['content_html']=get_content_html(article)
     return art
\ No newline at end of file
@@ -1,4 +1,5 @@
 from core.print import print_error,print_info,print_warning
+from core.html_pipeline import HtmlDocument
 import re
 class HtmlTools:
     def remove_html_region(self, html_content: str, patterns: list) -> str:
@@ -90,49 +91,49 @@ class HtmlTools:
         Returns:
             清理后的HTML内容
         """
+        # 正则表达式按文本处理，在解析前执行
         cleaned_content = html_content
-        
+        if remove_regx:
+            cleaned_content=self.remove_html_region(cleaned_content,remove_regx)
+        if remove_normal_tag:
+            cleaned_content=self.remove_common_html_elements(cleaned_content)
+        if not cleaned_content:
+            return cleaned_content
+        try:
+            doc = HtmlDocument(cleaned_content)
+            self.clean_document(doc, remove_ids=remove_ids, remove_classes=remove_classes,
+                                remove_selectors=remove_selectors, remove_xpaths=remove_xpaths,
+                                remove_attributes=remove_attributes)
+            return doc.html()
+        except Exception as e:
+            print_error(f"HTML清理失败: {e}")
+            return cleaned_content
+
+    def clean_document(self, doc: HtmlDocument,
+                             remove_ids: list = [],
+                             remove_classes: list = [],
+                             remove_selectors: list = [],
+                             remove_xpaths: list = [],
+                             remove_attributes: list = []) -> HtmlDocument:
+        """在已解析的文档上移除不需要的元素，参数同 clean_html"""
         # 构建统一的选择器列表
         all_selectors = []
-        
-        # 添加id选择器
-        if remove_ids:
-            for selector in remove_ids:
-                all_selectors.append({'selector': selector, 'type': 'id'})
-        
-        # 添加class选择器
-        if remove_classes:
-            for selector in remove_classes:
-                all_selectors.append({'selector': selector, 'type': 'class'})
-        
-        # 添加CSS选择器
-        if remove_selectors:
-            for selector in remove_selectors:
-                all_selectors.append({'selector': selector, 'type': 'css'})
-        
-        # 添加XPath选择器
-        if remove_xpaths:
-            for selector in remove_xpaths:
-                all_selectors.append({'selector': selector, 'type': 'xpath'})
+        all_selectors += [{'selector': selector, 'type': 'id'} for selector in remove_ids or []]
+        all_selectors += [{'selector': selector, 'type': 'class'} for selector in remove_classes or []]
+        all_selectors += [{'selector': selector, 'type': 'css'} for selector in remove_selectors or []]
+        all_selectors += [{'selector': selector, 'type': 'xpath'} for selector in remove_xpaths or []]
         
         # 一次性移除所有元素
         if all_selectors:
-            cleaned_content = self.remove_html_elements(cleaned_content, all_selectors)
+            doc.apply("remove_elements", selectors=all_selectors)
         
         # 根据属性移除元素
         if remove_attributes:
-            cleaned_content = self.remove_elements_by_attributes(cleaned_content, remove_attributes)
+            doc.apply("remove_by_attributes", attributes=remove_attributes)
         
-        # 根据正则表达式移除元素
-        if remove_regx:
-            cleaned_content=self.remove_html_region(cleaned_content,remove_regx)
-        if remove_normal_tag:
-            cleaned_content=self.remove_common_html_elements(cleaned_content)
         # 移除空文本元素（排除媒体标签）
-        cleaned_content = self.remove_empty_text_elements(cleaned_content)
-        
-
-        return cleaned_content
+        doc.apply("remove_empty")
+        return doc
 
     def remove_elements_by_attributes(self, html_content: str, attributes: list) -> str:
         """根据属性移除HTML元素
@@ -146,53 +147,10 @@ class HtmlTools:
         Returns:
             清理后的HTML内容
         """
+        if not html_content or not attributes:
+            return html_content
         try:
-            if not html_content or not attributes:
-                return html_content
-                
-            # 导入BeautifulSoup用于HTML解析
-            try:
-                from bs4 import BeautifulSoup
-            except ImportError:
-                print_error("BeautifulSoup未安装，无法进行属性过滤")
-                return html_content
-            
-            soup = BeautifulSoup(html_content, 'html.parser')
-            removed_count = 0
-            
-            for attr_config in attributes:
-                if not isinstance(attr_config, dict):
-                    continue
-                    
-                attr_name = attr_config.get('name')
-                attr_value = attr_config.get('value')
-                eq = attr_config.get('eq')
-                
-                if not attr_name:
-                    continue
-                
-                if attr_value:
-                    if eq:
-                        # 精确模糊
-                        elements = soup.find_all(attrs={attr_name: attr_value})
-                    else:
-                        # 模糊匹配属性值
-                        elements = soup.select(f'[{attr_name}*="{attr_value}"]')
-                else:
-                    # 只匹配属性名，不关心属性值
-                    elements = soup.find_all(attrs={attr_name: True})
-                
-                # 移除找到的元素
-                for element in elements:
-                    if element:
-                        element.decompose()
-                        removed_count += 1
-            
-            if removed_count > 0:
-                print_info(f"根据属性成功移除 {removed_count} 个HTML元素")
-            
-            return str(soup)
-            
+            return HtmlDocument(html_content).apply("remove_by_attributes", attributes=attributes).html()
         except Exception as e:
             print_error(f"根据属性移除元素失败: {e}")
             return html_content
@@ -206,66 +164,13 @@ class HtmlTools:
         Returns:
             清理后的HTML内容
         """
+        if not html_content:
+            return html_content
         try:
-            if not html_content:
-                return html_content
-                
-            # 导入BeautifulSoup用于HTML解析
-            try:
-                from bs4 import BeautifulSoup
-            except ImportError:
-                print_error("BeautifulSoup未安装，无法进行空文本过滤")
-                return html_content
-            
-            soup = BeautifulSoup(html_content, 'html.parser')
-            removed_count = 0
-            
-            # 媒体标签列表（这些标签即使没有文本内容也应该保留）
-            media_tags = ['img', 'video', 'audio', 'picture', 'source', 'track', 'canvas', 'svg', 'iframe', 'embed', 'object']
-            
-            # 查找所有可能包含文本的元素
-            all_elements = soup.find_all()
-            
-            for element in all_elements:
-                # 跳过媒体标签
-                if element.name in media_tags:
-                    continue
-                
-                # 检查元素是否只包含空白文本或没有文本内容
-                if element.string is None:
-                    # 检查子元素
-                    has_visible_content = False
-                    for child in element.descendants:
-                        if child.name is None:  # 文本节点
-                            text_content = str(child).strip()
-                            if text_content:
-                                has_visible_content = True
-                                break
-                        elif child.name not in media_tags:  # 非媒体元素
-                            # 检查非媒体元素是否有属性或内容
-                            if child.attrs or child.contents:
-                                has_visible_content = True
-                                break
-                    
-                    if not has_visible_content:
-                        element.decompose()
-                        removed_count += 1
-                else:
-                    # 元素直接包含文本
-                    text_content = element.get_text(strip=True)
-                    if not text_content:
-                        element.decompose()
-                        removed_count += 1
-            
-            if removed_count > 0:
-                print_info(f"成功移除 {removed_count} 个空文本元素")
-            
-            return str(soup)
-            
+            return HtmlDocument(html_content).apply("remove_empty").html()
         except Exception as e:
             print_error(f"移除空文本元素失败: {e}")
             return html_content
-        
 
     def _normalize_html(self, html_string: str) -> str:
         """标准化HTML字符串用于比较
@@ -298,91 +203,10 @@ class HtmlTools:
         Returns:
             清理后的HTML内容
         """
+        if not html_content or not selectors:
+            return html_content
         try:
-            if not html_content or not selectors:
-                return html_content
-                
-            # 导入BeautifulSoup用于HTML解析
-            try:
-                from bs4 import BeautifulSoup
-            except ImportError:
-                print_error("BeautifulSoup未安装，无法进行HTML清理")
-                return html_content
-            
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            removed_count = 0
-            
-            for selector_item in selectors:
-                try:
-                    # 解析选择器类型
-                    if isinstance(selector_item, dict):
-                        selector = selector_item.get('selector', '')
-                        selector_type = selector_item.get('type', 'id')
-                    elif isinstance(selector_item, tuple) and len(selector_item) >= 2:
-                        selector = selector_item[0]
-                        selector_type = selector_item[1]
-                    else:
-                        # 默认处理字符串，使用id选择器
-                        selector = selector_item
-                        selector_type = 'id'
-                    
-                    if not selector:
-                        continue
-                        
-                    # 根据选择器类型查找元素
-                    if selector_type == "css":
-                        elements = soup.select(selector)
-                    elif selector_type == "xpath":
-                        # 注意：BeautifulSoup不支持xpath，需要lxml支持
-                        try:
-                            from lxml import html
-                            # 将BeautifulSoup转换为lxml树
-                            lxml_tree = html.fromstring(str(soup))
-                            elements = lxml_tree.xpath(selector)
-                            
-                            # 直接使用lxml移除元素，然后重新构建BeautifulSoup
-                            for element in elements:
-                                if hasattr(element, 'tag'):
-                                    # 直接从lxml树中移除元素
-                                    parent = element.getparent()
-                                    if parent is not None:
-                                        parent.remove(element)
-                            
-                            # 将修改后的lxml树转换回BeautifulSoup
-                            modified_html = html.tostring(lxml_tree, encoding='unicode', pretty_print=False)
-                            soup = BeautifulSoup(modified_html, 'html.parser')
-                            elements = []  # 元素已在lxml中移除，不需要再处理
-                            
-                        except ImportError:
-                            print_warning("lxml未安装，无法使用xpath选择器")
-                            continue
-                        except Exception as e:
-                            print_error(f"XPath处理失败: {e}")
-                            continue
-                    elif selector_type == "id":
-                        elements = soup.find_all(id=selector)
-                    elif selector_type == "class":
-                        elements = soup.find_all(class_=selector)
-                    else:
-                        print_warning(f"不支持的选择器类型: {selector_type}")
-                        continue
-                    
-                    # 移除找到的元素
-                    for element in elements:
-                        if element:
-                            element.decompose()
-                            removed_count += 1
-                            
-                except Exception as e:
-                    print_error(f"移除元素失败 (选择器: {selector}, 类型: {selector_type}): {e}")
-                    continue
-            
-            if removed_count > 0:
-                print_info(f"成功移除 {removed_count} 个HTML元素")
-            
-            return str(soup)
-            
+            return HtmlDocument(html_content).apply("remove_elements", selectors=selectors).html()
         except Exception as e:
             print_error(f"HTML清理失败: {e}")
             return html_content
@@ -1,146 +1,249 @@
-from .md2doc import MarkdownToWordConverter
 from core.models import Article
 from core.db import DB
+from core.config import cfg
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from sqlalchemy import or_, and_, func
+import threading
+import tempfile
+import time
 import json
 import csv
+import io
 import zipfile
 import os
 from core.print import print_success,print_error
 from jobs.notice import sys_notice
 
-def process_single_article(art, add_title, remove_images, remove_links, export_md, 
-                          export_docx, export_json, export_csv, export_pdf, 
-                          docx_path, writer):
+# 公众号ID -> 导出进度
+_progress: dict[str, dict] = {}
+_progress_lock = threading.Lock()
+
+
+def get_export_progress(mp_id: str) -> dict:
+    """导出进度，没有导出任务时返回None"""
+    with _progress_lock:
+        progress = _progress.get(mp_id)
+        if progress is None:
+            return None
+        progress = dict(progress)
+    elapsed = (progress["finished_at"] or time.time()) - progress["started_at"]
+    done = progress["done"] + progress["failed"]
+    total = progress["total"]
+    progress["elapsed"] = round(elapsed, 1)
+    progress["percent"] = round(done * 100.0 / total, 2) if total else 100.0
+    # 按已完成文章的平均耗时估算剩余时间
+    progress["eta"] = round(elapsed / done * (total - done), 1) if done and progress["status"] == "running" else 0
+    return progress
+
+
+def _update_progress(mp_id: str, **values) -> None:
+    with _progress_lock:
+        _progress.setdefault(mp_id, {}).update(values)
+
+
+def is_exporting(mp_id: str) -> bool:
+    with _progress_lock:
+        progress = _progress.get(mp_id)
+        return progress is not None and progress.get("status") == "running"
+
+
+class _ZipSink:
+    """直接写入zip，先写入 .part 文件，完成后改名，导出列表不会看到未完成的文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.temp_path = f"{path}.part"
+        self.zipf = zipfile.ZipFile(self.temp_path, 'w', zipfile.ZIP_DEFLATED)
+
+    def write(self, name: str, data) -> None:
+        self.zipf.writestr(name, data)
+
+    def close(self, ok: bool = True) -> None:
+        self.zipf.close()
+        if ok:
+            os.replace(self.temp_path, self.path)
+        elif os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class _DirSink:
+    """不打包时直接写入导出目录"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = []
+
+    def write(self, name: str, data) -> None:
+        file_path = os.path.join(self.path, name)
+        with open(file_path, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+        print_success(f"导出文件: {file_path}")
+        self.files.append(file_path)
+
+    def close(self, ok: bool = True) -> None:
+        pass
+
+
+def iter_export_articles(session, mp_id=None, doc_id=None, limit=0, batch_size=50):
     """
-    处理单篇文章的导出逻辑
-    返回是否成功处理
+    按 (publish_time, id) 倒序分批读取待导出的文章
+
+    使用 keyset 分页，不使用 OFFSET，只读取导出需要的字段，
+    每批读取后释放，导出全部文章时内存占用与文章总数无关
     """
-    from core.content_format import format_content
-    from core.common.file_tools import sanitize_filename
-    
-    markdown_content = format_content(art.content, "markdown")
-    
-    # 转换为文档对象（不保存文件）
-    # 只有在需要导出docx时才进行转换
-    document = None
+    columns = (Article.id, Article.title, Article.url, Article.pic_url, Article.description, Article.status,
+               Article.publish_time, Article.content, Article.content_markdown)
+    query = session.query(*columns).filter(Article.content != None).where(Article.status == 1)
+    if mp_id:
+        query = query.where(Article.mp_id.in_(mp_id.split(",")))
+    if doc_id:
+        query = query.where(Article.id.in_(doc_id))
+    count = 0
+    last = None
+    while limit == 0 or count < limit:
+        page = query
+        if last is not None:
+            last_time, last_id = last
+            page = page.filter(or_(Article.publish_time < last_time,
+                                   and_(Article.publish_time == last_time, Article.id < last_id)))
+        size = batch_size if limit == 0 else min(batch_size, limit - count)
+        rows = page.order_by(Article.publish_time.desc(), Article.id.desc()).limit(size).all()
+        if not rows:
+            break
+        for row in rows:
+            yield dict(row._mapping)
+        count += len(rows)
+        last = (rows[-1].publish_time, rows[-1].id)
+        if len(rows) < size:
+            break
+
+
+def render_article(art: dict, add_title, remove_images, remove_links, export_md,
+                   export_docx, export_json, export_pdf) -> list:
+    """
+    生成单篇文章的导出文件
+
+    返回 [(文件名后缀, 内容)]，Markdown转Word在正文转换进程池中执行
+    """
+    from core.article_content import article_content
+    from core.content_pool import content_pool
+
+    files = []
+    markdown_content = article_content(art, "markdown")
+    if (export_docx or export_pdf) and add_title:
+        markdown_content = f"# {art['title']}\n\n{markdown_content}"
+    if export_json:
+        files.append((".json", json.dumps({
+            "id": art["id"],
+            "url": art["url"],
+            "title": art["title"],
+            "pic_url": art["pic_url"],
+            "description": art["description"],
+            "status": art["status"],
+            "publish_time": art["publish_time"]
+        })))
+    if export_md:
+        files.append((".md", markdown_content))
     if export_docx or export_pdf:
-        md = MarkdownToWordConverter({
+        docx = content_pool.run("md2docx_bytes", markdown_content, config={
             'remove_links': remove_links,
             'remove_images': remove_images,
             'default_font': 'SimSun'
         })
-        if add_title:
-            markdown_content = f"# {art.title}\n\n{markdown_content}"
-        document = md.convert_to_document(markdown_content, None)
-        
-    # 检查是否需要导出任何格式的文件
-    if export_docx and document or export_md or export_json or export_csv or export_pdf:
-        print(art.id, art.title, art.id)
-        name = datetime.fromtimestamp(art.publish_time).strftime("%Y%m%d") + "_" + art.title
-        filename = sanitize_filename(name) + ".docx"
-        json_filename = sanitize_filename(name) + ".json"
-        md_filename = sanitize_filename(name) + ".md"
-        pdf_filename = sanitize_filename(name) + ".pdf"
-        json_content = {
-            "id": art.id,
-            "url": art.url,
-            "title": art.title,
-            "pic_url": art.pic_url,
-            "description": art.description,
-            "status": art.status,
-            "publish_time": art.publish_time
-        }
-        try:
-            # 保存json文件（仅在需要时）
-            if export_json:
-                with open(f"{docx_path}{json_filename}", "w", encoding="utf-8") as f:
-                    f.write(json.dumps(json_content))
-            
-            # 保存md文件（仅在需要时）
-            if export_md:
-                with open(f"{docx_path}{md_filename}", "w", encoding="utf-8") as f:
-                    f.write(markdown_content)
-
-            # 保存为PDF文档（仅在需要时）
-            if export_pdf and document:
-                # 先保存为临时docx文件，然后转换为PDF
-                temp_docx = f'{docx_path}{filename}'
-                document.save(temp_docx)
-                try:
-                    from doc2pdf.dpdf import docx_to_pdf
-                    docx_to_pdf(temp_docx, f'{docx_path}{pdf_filename}')
-                    # 删除临时docx文件
-                    os.remove(temp_docx)
-                except Exception as e:
-                    print_error(f"PDF转换失败: {e}")
-                    # 删除临时文件
-                    if os.path.exists(temp_docx):
-                        os.remove(temp_docx)
-            
-            # 保存为Word文档（仅在需要时）
-            if export_docx and document:
-                document.save(f'{docx_path}{filename}')
-                
-            # 纪录导出文章列表（仅在需要时）
-            if export_csv and writer:
-                writer.writerow([art.title, art.url, datetime.fromtimestamp(art.publish_time).strftime("%Y-%m-%d %H:%M:%S")])
-            
-            exported_files = []
-            if export_json: exported_files.append("JSON")
-            if export_md: exported_files.append("MD")
-            if export_docx and document: exported_files.append("DOCX")
-            if export_pdf and document: exported_files.append("PDF")
-            if export_csv: exported_files.append("CSV")
-            
-            print_success(f"文件已保存: {', '.join(exported_files)} - {name}")
-            return True
-        except Exception as e:
-            print_error(f"保存文档失败: {e}")
-            return False
-    return False
+        if not docx:
+            raise ValueError("生成Word文档失败")
+        if export_docx:
+            files.append((".docx", docx))
+        if export_pdf:
+            pdf = _docx_to_pdf(docx)
+            if pdf:
+                files.append((".pdf", pdf))
+    return files
+
+
+def _docx_to_pdf(docx: bytes) -> bytes:
+    """doc2pdf 只支持文件路径，在临时目录中转换"""
+    try:
+        from doc2pdf.dpdf import docx_to_pdf
+        with tempfile.TemporaryDirectory() as tmp:
+            docx_file = os.path.join(tmp, "article.docx")
+            pdf_file = os.path.join(tmp, "article.pdf")
+            with open(docx_file, "wb") as f:
+                f.write(docx)
+            docx_to_pdf(docx_file, pdf_file)
+            with open(pdf_file, "rb") as f:
+                return f.read()
+    except Exception as e:
+        print_error(f"PDF转换失败: {e}")
+        return None
+
 
 def process_articles(session, mp_id=None,doc_id=None, page_size=10, page_count=1, add_title=True, document_id=None,
-                    remove_images=False, remove_links=False, export_md=True, 
+                    remove_images=False, remove_links=False, export_md=True,
                     export_docx=True, export_json=True, export_csv=True, export_pdf=True,
-                    docx_path="./data/docs/", writer=None):
+                    sink=None, workers=None, progress_key=None):
     """
     处理文章数据的核心函数
+
+    文章按 keyset 流式读取，由线程池并行生成导出文件(Word在进程池中转换)，
+    生成结果按顺序由当前线程写入 sink(zip或目录)，在途文章数不超过线程数的2倍
     返回处理的文章数量
     """
+    from core.common.file_tools import sanitize_filename
+    workers = max(1, int(workers or cfg.get("export.workers", 4)))
+    limit = 0 if doc_id or page_count == 0 else page_size * page_count
+    csv_buffer = None
+    writer = None
+    if export_csv:
+        csv_buffer = io.StringIO()
+        writer = csv.writer(csv_buffer)
+        writer.writerow(["标题", "链接", "发布时间"])
+
     record_count = 0
-    i = 0
-    is_break=False
-    while True:
-        if is_break:
-            break
-        if page_count != 0 and i >= page_count:
-            break
-            
-        query = session.query(Article).filter(Article.content != None).where(Article.status == 1)
-        if mp_id:
-            query = query.where(Article.mp_id.in_(mp_id.split(",")))
-        if doc_id:
-            query = query.where(Article.id.in_(doc_id))
-            is_break=True   
-
-        query = query.order_by(Article.publish_time.desc(), Article.id.desc())
-        if is_break==False:
-            query=query.offset(i * page_size).limit(page_size)
-        i = i + 1
-        arts = query.all()
-        
-        if arts is None or len(arts) == 0:
-            break
-            
-        for art in arts:
-            if process_single_article(art, add_title, remove_images, remove_links, 
-                                    export_md, export_docx, export_json, export_csv, 
-                                    export_pdf, docx_path, writer):
-                record_count += 1
-    
+    failed = 0
+    names = set()
+
+    def collect(art, future):
+        nonlocal record_count, failed
+        try:
+            files = future.result()
+        except Exception as e:
+            failed += 1
+            print_error(f"导出文章失败 {art['title']}: {e}")
+        else:
+            name = sanitize_filename(datetime.fromtimestamp(art["publish_time"]).strftime("%Y%m%d") + "_" + (art["title"] or ""))
+            # 同名文章追加序号，避免覆盖
+            base, n = name, 1
+            while name in names:
+                n += 1
+                name = f"{base}_{n}"
+            names.add(name)
+            for suffix, data in files:
+                sink.write(name + suffix, data)
+            if writer:
+                writer.writerow([art["title"], art["url"], datetime.fromtimestamp(art["publish_time"]).strftime("%Y-%m-%d %H:%M:%S")])
+            record_count += 1
+            print_success(f"文件已保存: {', '.join(s.strip('.').upper() for s, _ in files) or 'CSV'} - {name}")
+        if progress_key:
+            _update_progress(progress_key, done=record_count, failed=failed)
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as executor:
+        for art in iter_export_articles(session, mp_id=mp_id, doc_id=doc_id, limit=limit):
+            pending.append((art, executor.submit(render_article, art, add_title, remove_images, remove_links,
+                                                 export_md, export_docx, export_json, export_pdf)))
+            if len(pending) >= workers * 2:
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+
+    if csv_buffer is not None and record_count > 0:
+        sink.write("articles.csv", csv_buffer.getvalue())
     return record_count
 
+
 def export_md_to_doc(mp_id:str=None,doc_id:list=None,page_size:int=10,page_count:int=1,add_title=True,remove_images:bool=True,remove_links:bool=False
                      ,export_md:bool=False,export_docx:bool=False,export_json:bool=False,export_csv:bool=False,export_pdf:bool=True,domain="",zip_filename=None,zip_file=True):
     session = DB.get_session()
@@ -149,83 +252,68 @@ def export_md_to_doc(mp_id:str=None,doc_id:list=None,page_size:int=10,page_count
     docx_path = f"./data/docs/{mp_id}/"
     if not os.path.exists(docx_path):
         os.makedirs(docx_path)
-    csv_filename = f"{docx_path}articles.csv"
-    
-    # 初始化CSV文件和writer（仅在需要导出CSV时）
-    csv_file = None
-    writer = None
-    if export_csv:
-        csv_file = open(csv_filename, "w", newline="", encoding="utf-8")
-        writer = csv.writer(csv_file)
-        writer.writerow(["标题", "链接", "发布时间"])
-    
-    # 调用独立的文章处理函数
-    record_count = process_articles(
-        session=session,
-        mp_id=mp_id,
-        doc_id=doc_id,
-        page_size=page_size,
-        page_count=page_count,
-        add_title=add_title,
-        remove_images=remove_images,
-        remove_links=remove_links,
-        export_md=export_md,
-        export_docx=export_docx,
-        export_json=export_json,
-        export_csv=export_csv,
-        export_pdf=export_pdf,
-        docx_path=docx_path,
-        writer=writer
-    )
-    
-    # 关闭CSV文件（如果打开了）
-    if csv_file:
-        csv_file.close()
-        print_success(f"CSV 文件已保存为 {csv_filename}")
-    
-    # 打包所有导出的文件为zip并删除源文件
+    if not zip_filename:
+        zip_filename = f"{docx_path}exported_articles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    else:
+        zip_filename = f"{docx_path}{zip_filename}"
+        if not zip_filename.endswith('.zip'):
+            zip_filename += '.zip'
+
+    # 统计待导出文章数，用于计算进度
+    query = session.query(func.count(Article.id)).filter(Article.content != None).where(Article.status == 1)
+    query = query.where(Article.mp_id.in_(mp_id.split(",")))
+    if doc_id:
+        query = query.where(Article.id.in_(doc_id))
+    total = query.scalar() or 0
+    if not doc_id and page_count != 0:
+        total = min(total, page_size * page_count)
+    with _progress_lock:
+        _progress[mp_id] = {
+            "status": "running",
+            "total": total,
+            "done": 0,
+            "failed": 0,
+            "started_at": time.time(),
+            "finished_at": None,
+            "file": os.path.basename(zip_filename) if zip_file else "",
+            "error": "",
+        }
+
+    sink = _ZipSink(zip_filename) if zip_file else _DirSink(docx_path)
+    record_count = 0
+    try:
+        record_count = process_articles(
+            session=session,
+            mp_id=mp_id,
+            doc_id=doc_id,
+            page_size=page_size,
+            page_count=page_count,
+            add_title=add_title,
+            remove_images=remove_images,
+            remove_links=remove_links,
+            export_md=export_md,
+            export_docx=export_docx,
+            export_json=export_json,
+            export_csv=export_csv,
+            export_pdf=export_pdf,
+            sink=sink,
+            progress_key=mp_id
+        )
+        sink.close(ok=record_count > 0)
+        _update_progress(mp_id, status="completed", finished_at=time.time())
+    except Exception as e:
+        sink.close(ok=False)
+        _update_progress(mp_id, status="failed", error=str(e), finished_at=time.time())
+        print_error(f"导出失败: {e}")
+        raise
+
     if record_count > 0:
-        if not zip_filename:
-            zip_filename = f"{docx_path}exported_articles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        else:
-            zip_filename = f"{docx_path}{zip_filename}"
-            if not zip_filename.endswith('.zip'):
-                zip_filename += '.zip'
         if zip_file==False:
-            exported_files=[]
-            for root, dirs, files in os.walk(docx_path):
-                    for file in files:
-                        print_success(f"导出文件: {os.path.join(root, file)}")
-                        exported_files.append(os.path.join(root, file))
-            return exported_files
-        try:
-            if os.path.exists(zip_filename):
-                os.remove(zip_filename)
-            with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # 遍历导出目录中的所有文件
-                for root, dirs, files in os.walk(docx_path):
-                    for file in files:
-                        # 跳过所有zip文件，包括正在创建的zip文件
-                        if file.endswith('.zip'):
-                            continue
-                        file_path = os.path.join(root, file)
-                        # 添加文件到zip，使用相对路径
-                        arc_name = os.path.relpath(file_path, docx_path)
-                        zipf.write(file_path, arc_name)
-                        # 删除源文件
-                        try:
-                            os.remove(file_path)
-                        except Exception as e:
-                            print_error(f"删除文件失败 {file_path}: {e}")
-            
-            print_success(f"所有文件已打包为: {zip_filename}")
-            print_success(f"源文件已删除")
-            
-            # 发送系统通知，包含下载链接
-            download_link = domain + docx_path + zip_filename.split('/')[-1]
-            print_success(f"转换完成{download_link}")
-            sys_notice(f"文章导出完成！共处理 {record_count} 篇文章。下载链接: [点击下载]({download_link})")
-        except Exception as e:
-            print_error(f"打包文件失败: {e}")
-    
-    print_success(f"导出完成，共处理 {record_count} 篇文章")
\ No newline at end of file
+            return sink.files
+        print_success(f"所有文件已打包为: {zip_filename}")
+        # 发送系统通知，包含下载链接
+        download_link = domain + docx_path + zip_filename.split('/')[-1]
+        print_success(f"转换完成{download_link}")
+        sys_notice(f"文章导出完成！共处理 {record_count} 篇文章。下载链接: [点击下载]({download_link})")
+
+    print_success(f"导出完成，共处理 {record_count} 篇文章")
@@ -30,7 +30,6 @@ Author: AI Assistant
 Date: 2025/10/13
 """
 
-from hashlib import sha256
 import os
 import re
 import logging
@@ -40,7 +39,6 @@ import time
 import random
 from typing import Optional, Dict, Any, List
 from pathlib import Path
-from urllib.parse import urlparse
 import platform
 
 try:
@@ -210,6 +208,11 @@ class MarkdownToWordConverter:
                 title_paragraph.runs[0].font.size = Pt(24)
                 title_paragraph.runs[0].font.bold = True
             
+            # 并发预取文章中的所有图片，逐张插入时直接读取缓存
+            if not self.config.get('remove_images', False):
+                from core.res.image_cache import image_cache
+                image_cache.prefetch(url for _, url in re.findall(r'!\[(.*?)\]\((.*?)\)', markdown_text))
+
             # 解析 Markdown 内容
             lines = markdown_text.split('\n')
             i = 0
@@ -663,12 +666,6 @@ class MarkdownToWordConverter:
                 desc_paragraph = self.document.add_paragraph(alt_text)
                 desc_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 
-            # 删除临时文件
-            try:
-                os.remove(local_path)
-            except Exception as e:
-                self.logger.warning(f"删除临时图片文件失败: {local_path}, 错误: {str(e)}")
-                
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
@@ -694,10 +691,9 @@ class MarkdownToWordConverter:
                 
                 # 如果是WebP或其他不兼容格式，转换为JPEG
                 if original_format in ['WEBP', 'AVIF', 'HEIC', 'HEIF']:
-                    # 创建新的临时文件
-                    temp_dir = tempfile.gettempdir()
-                    base_name = os.path.splitext(os.path.basename(image_path))[0]
-                    new_path = os.path.join(temp_dir, f"{base_name}_converted.jpg")
+                    # 创建新的临时文件，原图在图片缓存中，可能被其他线程同时转换
+                    fd, new_path = tempfile.mkstemp(suffix="_converted.jpg")
+                    os.close(fd)
                     
                     # 转换为RGB模式（JPEG不支持透明度）
                     if img.mode in ('RGBA', 'LA', 'P'):
@@ -724,56 +720,55 @@ class MarkdownToWordConverter:
         
     def _download_image(self, url: str) -> Optional[str]:
         """
-        下载远程图片到临时文件
+        从图片缓存获取远程图片，未缓存时下载
         
         Args:
             url: 图片URL
             
         Returns:
-            str: 临时文件路径，下载失败返回None
+            str: 缓存文件路径(只读，不能删除)，下载失败时抛出ValueError
         """
-        try:
-          
-            
-            # 验证URL
-            parsed = urlparse(url)
-            if not all([parsed.scheme, parsed.netloc]):
-                self.logger.warning(f"无效的图片URL: {url}")
-                raise ValueError("Invalid URL")
-                return None
-                
-            # 创建临时文件
-            temp_dir = tempfile.gettempdir()
-            filename = sha256(parsed.path.encode()).hexdigest() +".webp"
-            temp_path = os.path.join(temp_dir, filename)
-            
-            # 设置请求头，模拟浏览器访问
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            }
-            
-            # 下载图片
-            response = requests.get(url, stream=True, timeout=20, headers=headers)
-            response.raise_for_status()
-            
-            with open(temp_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-                    
-            self.logger.debug(f"图片下载成功: {url} -> {temp_path}")
-            if not os.path.exists(temp_path):
-                raise ValueError(f"图片下载失败: {url} -> {temp_path}")
-            return temp_path
-            
-        except Exception as e:
-            self.logger.error(f"下载图片失败: {url}, 错误: {str(e)}")
-            raise ValueError(f"下载图片失败: {url}, 错误: {str(e)}")
-            return None
+        from core.res.image_cache import image_cache
+        entry = image_cache.fetch(url)
+        if entry is None:
+            raise ValueError(f"下载图片失败: {url}")
+        self.logger.debug(f"图片已缓存: {url} -> {entry.path}")
+        return entry.path
+
+
+def convert_markdown_to_docx(markdown_content: str, output_file: str, config: Optional[Dict[str, Any]] = None,
+                             document_title: Optional[str] = None) -> bool:
+    """
+    便捷函数：将 Markdown 内容转换为 Word 文件
+    
+    Args:
+        markdown_content: Markdown 内容
+        output_file: 输出的 Word 文件路径
+        config: 配置选项
+        document_title: 文档标题
+        
+    Returns:
+        bool: 转换是否成功
+    """
+    converter = MarkdownToWordConverter(config)
+    return converter.convert_content_to_file(markdown_content, output_file, document_title)
+
+
+def convert_markdown_to_docx_bytes(markdown_content: str, config: Optional[Dict[str, Any]] = None,
+                                   document_title: Optional[str] = None) -> Optional[bytes]:
+    """
+    便捷函数：将 Markdown 内容转换为 Word 文件内容，不写入磁盘
+    
+    Returns:
+        bytes: docx 文件内容，转换失败时返回 None
+    """
+    import io
+    document = MarkdownToWordConverter(config).convert_to_document(markdown_content, document_title)
+    if document is None:
+        return None
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
 
 
 def main():
@@ -5,7 +5,8 @@ Markdown 转 HTML 工具
 
 import markdown
 from markdown.extensions import codehilite, tables, toc, fenced_code
-from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+from core.html_pipeline import HtmlDocument
 import re
 from typing import Dict, List, Optional, Any
 
@@ -156,98 +157,94 @@ class MarkdownToHtmlConverter:
             处理后的 HTML 内容
         """
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            doc = HtmlDocument(html_content)
+            root = doc.root
             
             # 移除图片
             if self.remove_images:
-                for img in soup.find_all('img'):
-                    img.decompose()
+                for img in list(root.iter('img')):
+                    img.drop_tree()
             
             # 移除链接
             if self.remove_links:
-                for a in soup.find_all('a'):
+                for a in list(root.iter('a')):
                     # 保留链接文本，移除链接属性
-                    a.unwrap()
+                    a.drop_tag()
             
             # 添加 CSS 类
             if self.add_css_class:
-                self._add_css_classes(soup)
+                self._add_css_classes(root)
             
             # 处理代码块
-            self._process_code_blocks(soup)
+            self._process_code_blocks(root)
             
             # 处理表格
-            self._process_tables(soup)
+            self._process_tables(root)
             
             # 处理图片
-            self._process_images(soup)
+            self._process_images(root)
             
-            return str(soup)
+            return doc.html()
             
         except Exception as e:
             print_error(f"HTML 后处理失败: {e}")
             return html_content
     
-    def _add_css_classes(self, soup: BeautifulSoup):
+    @staticmethod
+    def _add_class(el, *names: str):
+        el.set('class', ' '.join((el.get('class') or '').split() + list(names)))
+    
+    def _add_css_classes(self, root):
         """添加 CSS 类名"""
-        # 为代码块添加类
-        for pre in soup.find_all('pre'):
-            if not pre.get('class'):
-                pre['class'] = pre.get('class', []) + ['code-block']
-        
-        # 为表格添加类
-        for table in soup.find_all('table'):
-            if not table.get('class'):
-                table['class'] = table.get('class', []) + ['table', 'table-striped']
-        
-        # 为引用添加类
-        for blockquote in soup.find_all('blockquote'):
-            if not blockquote.get('class'):
-                blockquote['class'] = blockquote.get('class', []) + ['blockquote']
-        
-        # 为列表添加类
-        for ul in soup.find_all('ul'):
-            if not ul.get('class'):
-                ul['class'] = ul.get('class', []) + ['list-unstyled']
-        
-        for ol in soup.find_all('ol'):
-            if not ol.get('class'):
-                ol['class'] = ol.get('class', []) + ['list-numbered']
+        # 为代码块、表格、引用和列表添加类
+        for tag, names in (('pre', ['code-block']),
+                           ('table', ['table', 'table-striped']),
+                           ('blockquote', ['blockquote']),
+                           ('ul', ['list-unstyled']),
+                           ('ol', ['list-numbered'])):
+            for el in root.iter(tag):
+                if not el.get('class'):
+                    self._add_class(el, *names)
     
-    def _process_code_blocks(self, soup: BeautifulSoup):
+    def _process_code_blocks(self, root):
         """处理代码块"""
-        for code in soup.find_all('code'):
+        for code in root.iter('code'):
             # 为内联代码添加类
             if not code.get('class'):
-                code['class'] = code.get('class', []) + ['inline-code']
+                self._add_class(code, 'inline-code')
     
-    def _process_tables(self, soup: BeautifulSoup):
+    def _process_tables(self, root):
         """处理表格"""
-        for table in soup.find_all('table'):
+        for table in list(root.iter('table')):
             # 添加响应式包装
-            if not table.find_parent('div', class_='table-responsive'):
-                wrapper = soup.new_tag('div', **{'class': 'table-responsive'})
-                table.wrap(wrapper)
+            parent = table.getparent()
+            wrapped = any(p.tag == 'div' and 'table-responsive' in (p.get('class') or '').split()
+                          for p in table.iterancestors())
+            if not wrapped and parent is not None:
+                wrapper = lxml_html.Element('div', {'class': 'table-responsive'})
+                wrapper.tail, table.tail = table.tail, None
+                parent.replace(table, wrapper)
+                wrapper.append(table)
             
             # 添加表头样式
             thead = table.find('thead')
-            if thead:
-                thead['class'] = thead.get('class', []) + ['table-header']
+            if thead is not None:
+                self._add_class(thead, 'table-header')
     
-    def _process_images(self, soup: BeautifulSoup):
+    def _process_images(self, root):
         """处理图片"""
-        for img in soup.find_all('img'):
+        for img in root.iter('img'):
             # 添加响应式类
             if not img.get('class'):
-                img['class'] = img.get('class', []) + ['img-responsive', 'img-fluid']
+                self._add_class(img, 'img-responsive', 'img-fluid')
             
             # 添加 alt 属性
             if not img.get('alt'):
-                img['alt'] = '图片'
+                img.set('alt', '图片')
             
             # 添加 loading="lazy"
             if not img.get('loading'):
-                img['loading'] = 'lazy'
+                img.set('loading', 'lazy')
     
     def _wrap_html(self, html_content: str,only_body:bool=True) -> str:
         """
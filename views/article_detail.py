@@ -5,7 +5,7 @@ import os
 from datetime import datetime
 import re
 import json
-from views.base import process_content_images, _render_template_with_error
+from views.base import process_content_images, _render_template_with_error, render_template_response
 from core.db import DB
 from core.models.article import Article
 from core.models.feed import Feed
@@ -14,11 +14,13 @@ from apis.base import format_search_kw
 from core.lax.template_parser import TemplateParser
 from views.config import base
 from driver.wxarticle import Web
-from core.cache import cache_view, clear_cache_pattern, data_cache
+from core.article_content import article_description
+from core.cache import cache_view, clear_cache_pattern, data_cache, add_cache_tags, cache_tag
+from core.article_reads import mark_article_read
+from core.article_neighbors import get_feed_neighbors
 # 创建路由器
 router = APIRouter(tags=["文章详情"])
 @router.get("/article/{article_id}", response_class=HTMLResponse, summary="文章详情页")
-@cache_view("article_detail", ttl=3600)  # 缓存1小时
 async def article_detail_view(
     request: Request,
     article_id: str
@@ -26,6 +28,19 @@ async def article_detail_view(
     """
     文章详情页面
     """
+    response = await _article_detail_page(request=request, article_id=article_id)
+    # 文章存在且页面正常返回(包括缓存命中)后标记为已读，由后台批量写入；文章不存在时上面抛出404
+    if getattr(response, "status_code", 200) < 400:
+        mark_article_read(article_id)
+    return response
+
+
+@cache_view("article_detail", ttl=3600)  # 缓存1小时
+async def _article_detail_page(
+    request: Request,
+    article_id: str
+):
+    """渲染文章详情页面，只读取数据"""
     session = DB.get_session()
     try:
         # 查询文章信息
@@ -39,48 +54,20 @@ async def article_detail_view(
         if len(article_query) != 2:
             raise HTTPException(status_code=500, detail="数据查询错误")
         article, feed = article_query
+        # 相关文章和上一篇/下一篇取决于同公众号的文章
+        add_cache_tags(cache_tag("article", article.id), cache_tag("mp", article.mp_id))
         
-        # 标记为已读（可选）
-        if not article.is_read:
-            article.is_read = 1
-            session.commit()
-        
-        # 获取相关文章（同公众号的其他文章）
-        related_articles = session.query(Article).filter(
-            Article.mp_id == article.mp_id,
-            Article.id != article_id,
-            Article.status == 1
-        ).order_by(Article.publish_time.desc()).limit(5).all()
-        
-        # 获取上一个和下一个文章ID
-        prev_article = session.query(Article.id,Article.title).filter(
-            Article.mp_id == article.mp_id,
-            Article.publish_time < article.publish_time,
-            Article.status == 1
-        ).order_by(Article.publish_time.desc()).first()
-        
-        next_article = session.query(Article.id,Article.title).filter(
-            Article.mp_id == article.mp_id,
-            Article.publish_time > article.publish_time,
-            Article.status == 1
-        ).order_by(Article.publish_time.asc()).first()
-        
-        related_list = []
-        for rel_article in related_articles:
-            rel_data = {
-                "id": rel_article.id,
-                "title": rel_article.title,
-                "description": rel_article.description or Web.get_description(rel_article.content),
-                "pic_url": Web.get_image_url(rel_article.pic_url),
-                "publish_time": datetime.fromtimestamp(rel_article.publish_time).strftime('%Y-%m-%d %H:%M') if rel_article.publish_time else ""
-            }
-            related_list.append(rel_data)
+        # 相关文章（同公众号的其他文章）和上一篇/下一篇从公众号邻接索引获取
+        neighbors = get_feed_neighbors(session, article.mp_id)
+        related_list = neighbors.related(article_id)
+        prev_article = neighbors.prev(article.publish_time)
+        next_article = neighbors.next(article.publish_time)
         
         # 处理文章数据
         article_data = {
             "id": article.id,
             "title": article.title,
-            "description": article.description or Web.get_description(article.content),
+            "description": article_description(article),
             "pic_url": Web.get_image_url(article.pic_url),
             "url": article.url,
             "publish_time": datetime.fromtimestamp(article.publish_time).strftime('%Y-%m-%d %H:%M') if article.publish_time else "",
@@ -104,7 +91,7 @@ async def article_detail_view(
             template_content = f.read()
         
         parser = TemplateParser(template_content, template_dir=base.public_dir)
-        html_content = parser.render({
+        return render_template_response(parser, {
             "site": base.site,
             "article": article_data,
             "related_articles": related_list,
@@ -113,8 +100,6 @@ async def article_detail_view(
             "breadcrumb": breadcrumb,
         })
         
-        return HTMLResponse(content=html_content)
-        
     except HTTPException:
         raise
     except Exception as e:
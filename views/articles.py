@@ -5,16 +5,18 @@ import os
 from datetime import datetime
 import re
 import json
-from views.base import _render_template_with_error
+from views.base import _render_template_with_error, render_template_response
 from core.db import DB
 from core.models.article import Article
 from core.models.feed import Feed
 from core.models.tags import Tags
 from apis.base import format_search_kw
+from core.search import search_rank as search_rank_query
 from core.lax.template_parser import TemplateParser
 from views.config import base
 from driver.wxarticle import Web
-from core.cache import cache_view, clear_cache_pattern, data_cache
+from core.article_content import article_description
+from core.cache import cache_view, clear_cache_pattern, data_cache, add_cache_tags, cache_tag
 
 
 
@@ -30,7 +32,7 @@ async def articles_view(
     mp_id: Optional[str] = Query(None, description="公众号ID筛选"),
     tag_id: Optional[str] = Query(None, description="标签ID筛选"),
     keyword: Optional[str] = Query(None, description="关键词搜索"),
-    sort: str = Query("publish_time", description="排序方式: publish_time, created_at"),
+    sort: str = Query("publish_time", description="排序方式: publish_time, created_at, relevance(按关键词相关度)"),
     order: str = Query("desc", description="排序顺序: asc, desc")
 ):
     """
@@ -39,7 +41,7 @@ async def articles_view(
     session = DB.get_session()
     try:
         # 验证排序参数
-        valid_sort_fields = {"publish_time", "created_at"}
+        valid_sort_fields = {"publish_time", "created_at", "relevance"}
         valid_orders = {"asc", "desc"}
         
         if sort not in valid_sort_fields:
@@ -58,13 +60,21 @@ async def articles_view(
                 except (json.JSONDecodeError, TypeError):
                     mps_ids = []
         
+        # 按相关度排序时使用全文索引的得分，索引不可用时按发布时间排序
+        search_rank = None
+        if sort == "relevance":
+            if keyword and keyword.strip():
+                search_rank = search_rank_query(keyword.strip())
+            if search_rank is None:
+                sort = "publish_time"
+
         # 构建基础查询条件
         base_conditions = [Article.status == 1]
         if mp_id:
             base_conditions.append(Article.mp_id == mp_id)
         if mps_ids:
             base_conditions.append(Article.mp_id.in_(mps_ids))
-        if keyword and keyword.strip():
+        if keyword and keyword.strip() and search_rank is None:
             search_filter = format_search_kw(keyword.strip())
             if search_filter is not None:
                 base_conditions.append(search_filter)
@@ -73,7 +83,9 @@ async def articles_view(
         from sqlalchemy import and_
         
         # 构建排序
-        if sort == "publish_time":
+        if search_rank is not None:
+            order_clause = search_rank.c.score.desc()
+        elif sort == "publish_time":
             order_clause = Article.publish_time.desc() if order == "desc" else Article.publish_time.asc()
         else:  # created_at
             order_clause = Article.created_at.desc() if order == "desc" else Article.created_at.asc()
@@ -81,7 +93,10 @@ async def articles_view(
         # 主查询：一次性获取文章和Feed信息
         query = session.query(Article, Feed).join(
             Feed, Article.mp_id == Feed.id, isouter=True
-        ).filter(and_(*base_conditions)).order_by(order_clause)
+        )
+        if search_rank is not None:
+            query = query.join(search_rank, search_rank.c.id == Article.id)
+        query = query.filter(and_(*base_conditions)).order_by(order_clause)
         
         # 获取总数
         total = query.count()
@@ -89,6 +104,15 @@ async def articles_view(
         # 分页查询
         offset = (page - 1) * limit
         articles_data = query.offset(offset).limit(limit).all()
+
+        # 页面依赖本页文章和筛选范围内的公众号，未筛选时任何公众号新增文章都会影响
+        add_cache_tags(*(cache_tag("article", article.id) for article, _ in articles_data))
+        if tag_id:
+            add_cache_tags(cache_tag("tag", tag_id), *(cache_tag("mp", id) for id in mps_ids))
+        if mp_id:
+            add_cache_tags(cache_tag("mp", mp_id))
+        if not tag_id and not mp_id:
+            add_cache_tags("articles")
         
         # 处理文章数据
         article_list = []
@@ -101,7 +125,7 @@ async def articles_view(
             article_data = {
                 "id": article.id,
                 "title": article.title,
-                "description": article.description or Web.get_description(article.content),
+                "description": article_description(article),
                 "pic_url": Web.get_image_url(article.pic_url),
                 "url": article.url,
                 "publish_time": datetime.fromtimestamp(article.publish_time).strftime('%Y-%m-%d %H:%M') if article.publish_time else "",
@@ -128,17 +152,13 @@ async def articles_view(
         from core.cache import data_cache
         
         # 尝试从缓存获取标签选项
-        cache_key_tags = "tag_options_all"
-        tag_options = data_cache.get(cache_key_tags)
-        if tag_options is None:
+        def load_tag_options():
             tags = session.query(Tags.id, Tags.name).filter(Tags.status == 1).order_by(Tags.name).all()
-            tag_options = [{"id": tag.id, "name": tag.name} for tag in tags]
-            data_cache.set(cache_key_tags, tag_options)  # 使用默认TTL（1小时）
+            return [{"id": tag.id, "name": tag.name} for tag in tags]
+        tag_options = data_cache.get_or_set("tag_options_all", load_tag_options)  # 使用默认TTL（1小时）
         
         # 尝试从缓存获取热门公众号
-        cache_key_popular = "popular_mps_top10"
-        mp_options = data_cache.get(cache_key_popular)
-        if mp_options is None:
+        def load_popular_mps():
             from sqlalchemy import func
             
             popular_mps = session.query(
@@ -155,8 +175,8 @@ async def articles_view(
                 func.count(Article.id).desc()
             ).limit(10).all()
             
-            mp_options = [{"id": str(row[0]), "name": row[1]} for row in popular_mps]
-            data_cache.set(cache_key_popular, mp_options)  # 使用默认TTL（1小时）
+            return [{"id": str(row[0]), "name": row[1]} for row in popular_mps]
+        mp_options = data_cache.get_or_set("popular_mps_top10", load_popular_mps)  # 使用默认TTL（1小时）
         
         # 计算分页信息
         total_pages = (total + limit - 1) // limit
@@ -182,7 +202,7 @@ async def articles_view(
         } if feed_info else {}
         
         parser = TemplateParser(template_content, template_dir=base.public_dir)
-        html_content = parser.render({
+        return render_template_response(parser, {
             "site": base.site,
             "articles": article_list,
             "current_page": page,
@@ -208,8 +228,6 @@ async def articles_view(
             "breadcrumb": breadcrumb
         })
         
-        return HTMLResponse(content=html_content)
-        
     except Exception as e:
         print(f"获取文章列表错误: {str(e)}")
         return _render_template_with_error(
@@ -1,14 +1,39 @@
 from math import e
 from fastapi import APIRouter, Request, Depends, Query, HTTPException
 from core.lax.template_parser import TemplateParser
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, Response
+from itertools import chain
 from core.db import DB
 from core.models.feed import Feed
 from core.models.article import Article
 from driver.wxarticle import Web
 from datetime import datetime
 from core.models.tags import Tags
+from core.cache import view_cache, add_cache_tags, cache_tag
+from sqlalchemy import func
 import json
+
+def count_articles_by_mp(session, mp_ids) -> dict:
+    """一次分组查询统计多个公众号的有效文章数量，返回 {公众号ID: 文章数}"""
+    mp_ids = list({str(mp_id) for mp_id in mp_ids if mp_id})
+    if not mp_ids:
+        return {}
+    rows = session.query(Article.mp_id, func.count(Article.id)).filter(
+        Article.mp_id.in_(mp_ids),
+        Article.status == 1
+    ).group_by(Article.mp_id).all()
+    return {str(mp_id): count for mp_id, count in rows}
+
+def parse_tag_mps_ids(tag) -> list:
+    """解析标签关联的公众号ID列表"""
+    if not tag.mps_id:
+        return []
+    try:
+        mps_data = json.loads(tag.mps_id)
+        return [str(mp['id']) for mp in mps_data] if isinstance(mps_data, list) else []
+    except (json.JSONDecodeError, TypeError):
+        return []
+
 #获取公众号视图数据
 def get_mps_view(
     page: int ,
@@ -26,25 +51,20 @@ def get_mps_view(
         # 查询公众号列表
         feeds = session.query(Feed).filter(Feed.status == 1).order_by(Feed.created_at.desc()).offset(offset).limit(limit).all()
         
+        # 一次查询统计本页所有公众号的文章数量
+        article_counts = count_articles_by_mp(session, [feed.id for feed in feeds])
+        add_cache_tags("mps", *(cache_tag("mp", feed.id) for feed in feeds))
+
         # 处理公众号数据
         feed_list = []
         for feed in feeds:
-            # 对于 Feed 表，id 就是公众号的 ID
-            mp_id = feed.id
-            
-            # 统计该公众号的文章数量
-            article_count = session.query(Article).filter(
-                Article.mp_id == mp_id,
-                Article.status == 1
-            ).count()
-            
             feed_data = {
                 "id": feed.id,
                 "name": feed.mp_name,
                 "cover": Web.get_image_url(feed.mp_cover) if feed.mp_cover else "",
                 "intro": feed.mp_intro,
                 "mp_count": 1,  # Feed 本身就是一个公众号
-                "article_count": article_count,
+                "article_count": article_counts.get(str(feed.id), 0),
                 "sync_time": datetime.fromtimestamp(feed.sync_time).strftime('%Y-%m-%d %H:%M') if feed.sync_time else "未同步",
                 "created_at": feed.created_at.strftime('%Y-%m-%d') if feed.created_at else ""
             }
@@ -98,25 +118,17 @@ def get_tags_view(
         # 查询标签列表
         tags = session.query(Tags).filter(Tags.status == 1).order_by(Tags.created_at.desc()).offset(offset).limit(limit).all()
         
+        # 解析每个标签关联的公众号，一次查询统计所有公众号的文章数量
+        tag_mps = [(tag, parse_tag_mps_ids(tag)) for tag in tags]
+        article_counts = count_articles_by_mp(session, [mp_id for _, mps_ids in tag_mps for mp_id in mps_ids])
+        add_cache_tags("tags", *(cache_tag("tag", tag.id) for tag, _ in tag_mps))
+        add_cache_tags(*(cache_tag("mp", mp_id) for _, mps_ids in tag_mps for mp_id in mps_ids))
+
         # 处理标签数据
         tag_list = []
-        for tag in tags:
-            # 解析mps_id JSON
-            mps_ids = []
-            if tag.mps_id:
-                try:
-                    mps_data = json.loads(tag.mps_id)
-                    mps_ids = [str(mp['id']) for mp in mps_data] if isinstance(mps_data, list) else []
-                except (json.JSONDecodeError, TypeError):
-                    mps_ids = []
-            
+        for tag, mps_ids in tag_mps:
             # 统计文章数量
-            article_count = 0
-            if mps_ids:
-                article_count = session.query(Article).filter(
-                    Article.mp_id.in_(mps_ids),
-                    Article.status == 1
-                ).count()
+            article_count = sum(article_counts.get(mp_id, 0) for mp_id in set(mps_ids))
             
             # 获取关联的公众号数量
             mp_count = len(mps_ids) if mps_ids else 0
@@ -160,6 +172,20 @@ def get_tags_view(
         session.close()
     return data
 
+def render_template_response(parser: TemplateParser, context: dict) -> Response:
+    """
+    渲染模板并返回响应
+
+    未启用视图缓存时流式输出，长列表页面可以边渲染边发送；
+    启用视图缓存时返回完整的HTMLResponse，以便cache_view缓存
+    """
+    if view_cache.enabled:
+        return HTMLResponse(content=parser.render(context))
+    chunks = parser.render_iter(context)
+    # 先渲染第一块，模板和上下文错误仍由视图捕获并显示错误页
+    first = next(chunks, "")
+    return StreamingResponse(chain((first,), chunks), media_type="text/html; charset=utf-8")
+
 def _render_template_with_error(template_path: str, error_msg: str, breadcrumb: list) -> HTMLResponse:
     """渲染错误页面的辅助函数"""
     try:
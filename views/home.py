@@ -5,7 +5,7 @@ from apis.tags import get_tags
 from core.lax.template_parser import TemplateParser
 from views.config import base
 from core.cache import cache_view, clear_cache_pattern
-from views.base import get_tags_view,get_mps_view
+from views.base import get_tags_view,get_mps_view, render_template_response
 # 创建路由器
 router = APIRouter(tags=["首页"])
 
@@ -28,9 +28,7 @@ async def home_view(
         
         # 使用模板引擎渲染
         parser = TemplateParser(template_content, template_dir=base.public_dir)
-        html_content = parser.render(data)
-        
-        return HTMLResponse(content=html_content)
+        return render_template_response(parser, data)
         
     except Exception as e:
         print(f"获取首页数据错误: {str(e)}")
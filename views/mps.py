@@ -6,7 +6,7 @@ from core.db import DB
 from core.lax.template_parser import TemplateParser
 from views.config import base
 from core.cache import cache_view, clear_cache_pattern
-from views.base import get_mps_view
+from views.base import get_mps_view, render_template_response
 # 创建路由器
 router = APIRouter(tags=["公众号"])
 
@@ -36,9 +36,7 @@ async def mps_view(
 
         # 使用模板引擎渲染
         parser = TemplateParser(template_content, template_dir=base.public_dir)
-        html_content = parser.render(data)
-        
-        return HTMLResponse(content=html_content)
+        return render_template_response(parser, data)
         
     except Exception as e:
         print(f"获取首页数据错误: {str(e)}")
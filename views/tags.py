@@ -11,8 +11,11 @@ from core.models.feed import Feed
 from core.models.article import Article
 from core.lax.template_parser import TemplateParser
 from views.config import base
+from views.base import render_template_response, count_articles_by_mp, parse_tag_mps_ids
+from apis.base import format_search_kw
 from driver.wxarticle import Web
-from core.cache import cache_view, clear_cache_pattern
+from core.article_content import article_description
+from core.cache import cache_view, clear_cache_pattern, add_cache_tags, cache_tag
 # 创建路由器
 router = APIRouter(tags=["标签"])
 
@@ -37,25 +40,17 @@ async def tags_view(
         # 查询标签列表
         tags = session.query(Tags).filter(Tags.status == 1).order_by(Tags.created_at.desc()).offset(offset).limit(limit).all()
         
+        # 解析每个标签关联的公众号，一次查询统计所有公众号的文章数量
+        tag_mps = [(tag, parse_tag_mps_ids(tag)) for tag in tags]
+        article_counts = count_articles_by_mp(session, [mp_id for _, mps_ids in tag_mps for mp_id in mps_ids])
+        add_cache_tags("tags", *(cache_tag("tag", tag.id) for tag, _ in tag_mps))
+        add_cache_tags(*(cache_tag("mp", mp_id) for _, mps_ids in tag_mps for mp_id in mps_ids))
+
         # 处理标签数据
         tag_list = []
-        for tag in tags:
-            # 解析mps_id JSON
-            mps_ids = []
-            if tag.mps_id:
-                try:
-                    mps_data = json.loads(tag.mps_id)
-                    mps_ids = [str(mp['id']) for mp in mps_data] if isinstance(mps_data, list) else []
-                except (json.JSONDecodeError, TypeError):
-                    mps_ids = []
-            
+        for tag, mps_ids in tag_mps:
             # 统计文章数量
-            article_count = 0
-            if mps_ids:
-                article_count = session.query(Article).filter(
-                    Article.mp_id.in_(mps_ids),
-                    Article.status == 1
-                ).count()
+            article_count = sum(article_counts.get(mp_id, 0) for mp_id in set(mps_ids))
             
             # 获取关联的公众号数量
             mp_count = len(mps_ids) if mps_ids else 0
@@ -104,9 +99,7 @@ async def tags_view(
             "base_url": "/views/tags",
             "item_name": "个标签"
         }
-        html_content = parser.render(render_context)
-        
-        return HTMLResponse(content=html_content)
+        return render_template_response(parser, render_context)
         
     except Exception as e:
         print(f"获取首页数据错误: {str(e)}")
@@ -167,8 +160,7 @@ async def tag_detail_view(
         
         # 添加关键字搜索条件
         if keyword and keyword.strip():
-            search_term = f"%{keyword.strip()}%"
-            base_conditions.append(Article.title.like(search_term))
+            base_conditions.append(format_search_kw(keyword.strip()))
         
         # 查询文章总数
         total = 0
@@ -189,7 +181,7 @@ async def tag_detail_view(
                 article_data = {
                     "id": article.id,
                     "title": article.title,
-                    "description": article.description or Web.get_description(article.content),
+                    "description": article_description(article),
                     "pic_url": Web.get_image_url(article.pic_url),
                     "mp_cover": Web.get_image_url(feed.mp_cover) if feed else "",
                     "url": article.url,
@@ -227,7 +219,7 @@ async def tag_detail_view(
             template_content = f.read()
         
         parser = TemplateParser(template_content, template_dir=base.public_dir)
-        html_content = parser.render({
+        return render_template_response(parser, {
             "site": base.site,
             "tag": tag_data,
             "articles": articles,
@@ -245,8 +237,6 @@ async def tag_detail_view(
             "next_page": page + 1
         })
         
-        return HTMLResponse(content=html_content)
-        
     except HTTPException:
         raise
     except Exception as e: